@@ -0,0 +1,140 @@
+# Load test for pick submissions at lock time: many members post their
+# week 1 picks at the same moment through separate threads.
+#
+# Usage (from the repository root):
+#     python benchmarks/concurrent_picks.py [--members 50] [--rounds 3]
+#     python benchmarks/concurrent_picks.py --no-profile   # SQLite defaults
+#     python benchmarks/concurrent_picks.py --queue        # Batched writer thread
+#
+# Every request must succeed, the script exits with an error otherwise.
+# --no-profile uses SQLite's rollback journal and the 5 second timeout of
+# the sqlite3 module for comparison.
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from werkzeug.security import generate_password_hash
+from website import create_app, db
+from website.models import User, Link
+
+from render_routes import ROUNDS, roundForm
+
+
+def seedMembers(app, client, members):
+    # Output: List of logged in test clients, one per member.
+    client.post('/sign-up', data={'email': 'admin@example.com', 'firstName': 'Admin',
+                                  'password1': 'password', 'password2': 'password'})
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@example.com').first()
+        admin.is_admin = True
+        db.session.commit()
+    client.post('/admin/enter_teams',
+                data=dict(('teamName' + str(i), 'Team ' + str(i)) for i in range(1, 65)))
+    client.post('/create-pool', data={'poolName': 'Office Pool'})
+
+    password = generate_password_hash('password', method='sha256')
+    with app.app_context():
+        for i in range(members):
+            user = User(email='member' + str(i) + '@example.com',
+                        first_name='Member ' + str(i), password=password)
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Link(user_id=user.id, pool_id=1))
+        db.session.commit()
+
+    clients = []
+    for i in range(members):
+        member = app.test_client()
+        member.post('/login', data={'email': 'member' + str(i) + '@example.com',
+                                    'password': 'password'})
+        clients.append(member)
+    return clients
+
+
+def submitAll(clients, roundNumber):
+    # Posts one round of picks from every client at once.
+    # Output: (list of response times in ms, list of failures)
+    firstGame, games = ROUNDS[roundNumber - 1]
+    url = '/make-picks?pool_id=1&round_number=' + str(roundNumber)
+    start = threading.Barrier(len(clients))
+    times = []
+    failures = []
+    lock = threading.Lock()
+
+    def submit(index, client):
+        choice = 'team1' if index % 2 == 0 else 'team2'
+        start.wait()
+        began = time.perf_counter()
+        try:
+            response = client.post(url, data=roundForm(firstGame, games, choice))
+            failed = response.status_code >= 500
+            error = 'HTTP ' + str(response.status_code)
+        except Exception as exception:
+            failed = True
+            error = str(exception).splitlines()[0]
+        with lock:
+            times.append((time.perf_counter() - began) * 1000)
+            if failed:
+                failures.append(error)
+
+    threads = [threading.Thread(target=submit, args=(i, client)) for i, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return times, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--members', type=int, default=50, help='members posting at once')
+    parser.add_argument('--rounds', type=int, default=3, help='times every member posts')
+    parser.add_argument('--no-profile', action='store_true',
+                        help='use the SQLite defaults instead of the production pragmas')
+    parser.add_argument('--queue', action='store_true',
+                        help='save picks through the write coalescing queue (PICK_QUEUE)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'bench.db')}
+        if args.no_profile:
+            config['SQLITE_PRAGMAS'] = {'journal_mode': 'DELETE', 'synchronous': 'FULL',
+                                        'busy_timeout': 5000}
+        if args.queue:
+            config['PICK_QUEUE'] = True
+        app = create_app(config)
+        clients = seedMembers(app, app.test_client(), args.members)
+
+        all_times = []
+        all_failures = []
+        began = time.perf_counter()
+        for i in range(args.rounds):
+            times, failures = submitAll(clients, 1 + (i % 2))
+            all_times += times
+            all_failures += failures
+        elapsed = time.perf_counter() - began
+        writer = app.extensions.get('pick_writer')
+        if writer is not None:
+            print('writer commits %d for %d updates' % (writer.batches, writer.updates))
+
+        all_times.sort()
+        print('requests %d, failed %d, %.1f requests/s'
+              % (len(all_times), len(all_failures), len(all_times) / elapsed))
+        print('median %.1f ms, p95 %.1f ms, max %.1f ms'
+              % (statistics.median(all_times), all_times[int(len(all_times) * 0.95) - 1],
+                 all_times[-1]))
+        for error in sorted(set(all_failures)):
+            print('  ' + str(all_failures.count(error)) + ' x ' + error)
+        if len(all_failures) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
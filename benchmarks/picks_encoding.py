@@ -0,0 +1,58 @@
+# Compares the legacy pickled Picks.winners list with the compact encoding
+# in website/picks.py: bytes stored per bracket and time to read one pick.
+#
+# Usage (from the repository root):
+#     python benchmarks/picks_encoding.py [--repeat 100000]
+
+import argparse
+import os
+import pickle
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from website import picks
+from website.bracket import BracketSnapshot, MatchupState, TeamState
+
+
+def buildSnapshot():
+    # The Round of 64 of a made up season.  Team ids are 1 - 64.
+    teams = [TeamState(slot + 1, slot, 'Team ' + str(slot + 1), None, None) for slot in range(64)]
+    matchups = []
+    for game in range(1, 33):
+        matchups.append(MatchupState(game, game, None, None, None, 2*game - 1, 2*game, None))
+    return BracketSnapshot(2000, matchups, teams)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=100000)
+    args = parser.parse_args()
+
+    snapshot = buildSnapshot()
+    random.seed(1)
+    slots = random.getrandbits(picks.GAMES)
+    picked = (1 << 48) - 1 # Week 1 (games 1 - 48) picked.
+    winners = picks.decodeWinners(slots, picked, snapshot)
+    blob = pickle.dumps(winners)
+
+    class Row:
+        pass
+    row = Row()
+    row.slots = slots
+    row.picked = picked
+
+    print('stored bytes: pickled list %d, compact %d' % (len(blob), 16))
+    legacy = timeit.timeit(lambda: pickle.loads(blob)[40], number=args.repeat)
+    compact = timeit.timeit(lambda: picks.getPick(row, 41), number=args.repeat)
+    names = timeit.timeit(lambda: picks.decodeWinners(slots, picked, snapshot), number=args.repeat)
+    print('read one pick: unpickle %.3f us, compact %.3f us'
+          % (legacy / args.repeat * 1e6, compact / args.repeat * 1e6))
+    print('decode all 63 team names from the compact encoding: %.3f us'
+          % (names / args.repeat * 1e6))
+
+
+if __name__ == '__main__':
+    main()
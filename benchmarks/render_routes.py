@@ -0,0 +1,105 @@
+# Measures how long each page takes to render through the Flask test client.
+#
+# Usage (from the repository root):
+#     python benchmarks/render_routes.py [--members 200] [--repeat 200]
+#
+# The app is built against a temporary SQLite database which is seeded with
+# a full season: 64 teams, every admin round submitted, one pool with the
+# entered number of members and a complete set of picks for the admin user.
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from website import create_app, db
+from website.models import User, Link
+
+ROUNDS = [(1, 32), (33, 16), (49, 8), (57, 4), (61, 2), (63, 1)] # (first game, games) per round
+
+
+def roundForm(firstGame, games, choice='team1'):
+    return dict(('game' + str(firstGame + i), choice) for i in range(games))
+
+
+def seed(app, client, members):
+    client.post('/sign-up', data={'email': 'admin@example.com', 'firstName': 'Admin',
+                                  'password1': 'password', 'password2': 'password'})
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@example.com').first()
+        admin.is_admin = True
+        db.session.commit()
+
+    client.post('/admin/enter_teams',
+                data=dict(('teamName' + str(i), 'Team ' + str(i)) for i in range(1, 65)))
+    client.post('/create-pool', data={'poolName': 'Office Pool'})
+
+    with app.app_context():
+        for i in range(members):
+            user = User(email='member' + str(i) + '@example.com',
+                        first_name='Member ' + str(i), password='x')
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Link(user_id=user.id, pool_id=1))
+        db.session.commit()
+
+    # Week 1 picks, then play the bracket through to the Final 4 so every
+    # make_picks round has matchups to show.
+    for round_number in [1, 2]:
+        firstGame, games = ROUNDS[round_number - 1]
+        client.get('/make-picks?pool_id=1&round_number=' + str(round_number))
+        client.post('/make-picks?pool_id=1&round_number=' + str(round_number),
+                    data=roundForm(firstGame, games))
+    for round_number in range(1, 5):
+        firstGame, games = ROUNDS[round_number - 1]
+        client.post('/admin/round' + str(round_number), data=roundForm(firstGame, games))
+    for round_number in range(3, 7):
+        firstGame, games = ROUNDS[round_number - 1]
+        client.post('/make-picks?pool_id=1&round_number=' + str(round_number),
+                    data=roundForm(firstGame, games))
+
+
+def timeRoute(client, url, repeat):
+    # Output: List of response times in milliseconds.
+    # Streamed pages (/admin/test) render while their body is read, so each
+    # body is read inside the timing and the response closed after it.
+    with client.get(url) as response: # Warm up.
+        response.get_data()
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        with client.get(url) as response:
+            response.get_data()
+            times.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, url + ' returned ' + str(response.status_code)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--members', type=int, default=200, help='members in the pool')
+    parser.add_argument('--repeat', type=int, default=200, help='requests per route')
+    args = parser.parse_args()
+
+    routes = ['/', '/pools', '/view-pool?id=1', '/admin/lock', '/admin/round1',
+              '/admin/test']
+    routes += ['/make-picks?pool_id=1&round_number=' + str(i) for i in range(1, 7)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'bench.db'),
+                          'SQLALCHEMY_TRACK_MODIFICATIONS': False})
+        client = app.test_client()
+        seed(app, client, args.members)
+
+        print('%-40s %10s %10s' % ('route', 'mean ms', 'median ms'))
+        for url in routes:
+            times = timeRoute(client, url, args.repeat)
+            print('%-40s %10.3f %10.3f' % (url, statistics.mean(times), statistics.median(times)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+# Drives a whole season through the app and reports latency, throughput and
+# SQL queries per route as JSON, so runs from two commits can be compared.
+#
+# Usage (from the repository root):
+#     python benchmarks/user_flow.py [--users 100] [--pools 4] [--workers 1]
+#     python benchmarks/user_flow.py --server --workers 8    # Real local HTTP server
+#     python benchmarks/user_flow.py --output after.json --compare before.json
+#
+# The app is built with create_app against a temporary SQLite database.  An
+# admin enters the field and creates the pools, then every user signs up,
+# joins a pool, picks the six rounds and views the pool while the admin
+# enters the results of each round:
+#
+#     sign up, join pool, picks rounds 1 - 2, admin rounds 1 - 2,
+#     picks rounds 3 - 4, admin rounds 3 - 4, picks rounds 5 - 6,
+#     admin rounds 5 - 6, view pool
+#
+# Users are split between --workers threads.  By default each thread uses
+# its own Flask test client; with --server the requests go over HTTP to a
+# threaded werkzeug server on a random local port.
+#
+# Latency is measured by the client.  Queries are counted on the engine and
+# charged to the endpoint of the request that ran them.
+
+import argparse
+import contextlib
+import http.cookiejar
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from werkzeug.serving import make_server
+from website import create_app, db
+from website.models import User, Pool
+
+from render_routes import ROUNDS, roundForm
+
+PASSWORD = 'password'
+
+
+class TestClientSession:
+    # Sends requests through a Flask test client.
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, url):
+        return self.client.get(url).status_code
+
+    def post(self, url, data):
+        return self.client.post(url, data=data).status_code
+
+
+class HttpSession:
+    # Sends requests to a running server, keeping the session cookie.
+
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args):
+            return None
+
+    def __init__(self, baseUrl):
+        self.base_url = baseUrl
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), self.NoRedirect())
+
+    def send(self, url, body=None):
+        try:
+            with self.opener.open(self.base_url + url, body) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code
+
+    def get(self, url):
+        return self.send(url)
+
+    def post(self, url, data):
+        return self.send(url, urllib.parse.urlencode(data).encode())
+
+
+class Recorder:
+    # Collects response times per endpoint and queries per endpoint.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.times = {}
+        self.errors = {}
+        self.queries = {}
+
+    def countQuery(self, *args):
+        endpoint = request.endpoint if has_request_context() else '(background)'
+        with self.lock:
+            self.queries[endpoint] = self.queries.get(endpoint, 0) + 1
+
+    def call(self, session, endpoint, url, data=None):
+        began = time.perf_counter()
+        status = session.get(url) if data is None else session.post(url, data)
+        elapsed = (time.perf_counter() - began) * 1000
+        with self.lock:
+            self.times.setdefault(endpoint, []).append(elapsed)
+            if status >= 400:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def percentile(values, fraction):
+    # Output: Nearest rank percentile of sorted values.
+    return values[max(0, min(len(values) - 1, int(round(fraction * len(values))) - 1))]
+
+
+def setupSeason(app, session, recorder, pools):
+    # Signs up the admin, enters the field and creates the pools.
+    # Output: List of pool (id, password).
+    recorder.call(session, 'auth.sign_up', '/sign-up',
+                  {'email': 'admin@example.com', 'firstName': 'Admin',
+                   'password1': PASSWORD, 'password2': PASSWORD})
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@example.com').first()
+        admin.is_admin = True
+        db.session.commit()
+    recorder.call(session, 'views.enter_teams', '/admin/enter_teams',
+                  dict(('teamName' + str(i), 'Team ' + str(i)) for i in range(1, 65)))
+    for i in range(pools):
+        recorder.call(session, 'views.create_pool', '/create-pool', {'poolName': 'Pool ' + str(i)})
+    with app.app_context():
+        return [(pool.id, pool.password) for pool in Pool.query.order_by(Pool.id).all()]
+
+
+def joinUsers(recorder, pools):
+    def join(index, session):
+        recorder.call(session, 'auth.sign_up', '/sign-up',
+                      {'email': 'user' + str(index) + '@example.com',
+                       'firstName': 'User ' + str(index),
+                       'password1': PASSWORD, 'password2': PASSWORD})
+        recorder.call(session, 'views.join_pool', '/join-pool',
+                      {'poolPassword': pools[index % len(pools)][1]})
+    return join
+
+
+def pickRounds(roundNumbers, recorder, pools):
+    def pick(index, session):
+        pool_id = pools[index % len(pools)][0]
+        choice = 'team1' if index % 2 == 0 else 'team2'
+        for round_number in roundNumbers:
+            firstGame, games = ROUNDS[round_number - 1]
+            url = '/make-picks?pool_id=' + str(pool_id) + '&round_number=' + str(round_number)
+            recorder.call(session, 'views.make_picks', url)
+            recorder.call(session, 'views.make_picks', url, roundForm(firstGame, games, choice))
+    return pick
+
+
+def viewPool(recorder, pools):
+    def view(index, session):
+        pool_id = pools[index % len(pools)][0]
+        recorder.call(session, 'views.pools', '/pools')
+        recorder.call(session, 'views.view_pool', '/view-pool?id=' + str(pool_id))
+    return view
+
+
+def runPhase(sessions, workers, task):
+    # Runs task(index, session) for every user across the worker threads.
+    # Output: Seconds taken.
+    def work(worker):
+        for index in range(worker, len(sessions), workers):
+            task(index, sessions[index])
+
+    began = time.perf_counter()
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - began
+
+
+def enterResults(adminSession, recorder, roundNumbers):
+    began = time.perf_counter()
+    for round_number in roundNumbers:
+        firstGame, games = ROUNDS[round_number - 1]
+        recorder.call(adminSession, 'views.round' + str(round_number),
+                      '/admin/round' + str(round_number),
+                      roundForm(firstGame, games))
+    return time.perf_counter() - began
+
+
+def summarize(recorder):
+    routes = {}
+    for endpoint, times in sorted(recorder.times.items()):
+        times = sorted(times)
+        routes[endpoint] = {'requests': len(times),
+                            'errors': recorder.errors.get(endpoint, 0),
+                            'mean_ms': round(sum(times) / len(times), 3),
+                            'p50_ms': round(percentile(times, 0.50), 3),
+                            'p95_ms': round(percentile(times, 0.95), 3),
+                            'p99_ms': round(percentile(times, 0.99), 3),
+                            'queries': recorder.queries.get(endpoint, 0),
+                            'queries_per_request': round(recorder.queries.get(endpoint, 0)
+                                                         / len(times), 2)}
+    return routes
+
+
+def gitCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    # Prints the change in p95 and queries per request for each route.
+    print('%-22s %12s %12s %10s %10s' % ('route', 'p95 before', 'p95 after', 'q before', 'q after'))
+    for endpoint, after in report['routes'].items():
+        before = baseline['routes'].get(endpoint)
+        if before is None:
+            continue
+        print('%-22s %12.2f %12.2f %10.2f %10.2f'
+              % (endpoint, before['p95_ms'], after['p95_ms'],
+                 before['queries_per_request'], after['queries_per_request']))
+    print('requests/s %.1f -> %.1f' % (baseline['requests_per_second'], report['requests_per_second']))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100, help='users who sign up and pick')
+    parser.add_argument('--pools', type=int, default=4, help='pools the users are spread over')
+    parser.add_argument('--workers', type=int, default=1, help='threads sending requests')
+    parser.add_argument('--server', action='store_true', help='send requests to a local HTTP server')
+    parser.add_argument('--queue', action='store_true',
+                        help='save picks through the write coalescing queue (PICK_QUEUE)')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--compare', help='JSON report of an earlier run to compare with')
+    args = parser.parse_args()
+
+    # The app prints as it works, keep stdout for the report.
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(sys.stderr):
+        config = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'bench.db')}
+        if args.queue:
+            config['PICK_QUEUE'] = True
+        app = create_app(config)
+        recorder = Recorder()
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', recorder.countQuery)
+
+        server = None
+        if args.server:
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = 'http://127.0.0.1:' + str(server.server_port)
+            newSession = lambda: HttpSession(base_url)
+        else:
+            newSession = lambda: TestClientSession(app)
+
+        admin = newSession()
+        pools = setupSeason(app, admin, recorder, args.pools)
+        sessions = [newSession() for i in range(args.users)]
+
+        phases = []
+        def phase(name, seconds, requests):
+            phases.append({'name': name, 'seconds': round(seconds, 3), 'requests': requests,
+                           'requests_per_second': round(requests / seconds, 1)})
+
+        workers = max(1, min(args.workers, args.users))
+        began = time.perf_counter()
+        phase('sign up and join', runPhase(sessions, workers, joinUsers(recorder, pools)),
+              args.users * 2)
+        for week in range(3):
+            roundNumbers = [week * 2 + 1, week * 2 + 2]
+            requests = args.users * 4
+            phase('picks rounds ' + str(roundNumbers[0]) + ' - ' + str(roundNumbers[1]),
+                  runPhase(sessions, workers, pickRounds(roundNumbers, recorder, pools)), requests)
+            phase('admin rounds ' + str(roundNumbers[0]) + ' - ' + str(roundNumbers[1]),
+                  enterResults(admin, recorder, roundNumbers), 2)
+        phase('view pool', runPhase(sessions, workers, viewPool(recorder, pools)), args.users * 2)
+        elapsed = time.perf_counter() - began
+
+        if server is not None:
+            server.shutdown()
+
+    routes = summarize(recorder)
+    requests = sum(each['requests'] for each in phases)
+    report = {'commit': gitCommit(),
+              'config': {'users': args.users, 'pools': args.pools, 'workers': workers,
+                         'server': args.server, 'queue': args.queue},
+              'requests': requests,
+              'errors': sum(route['errors'] for route in routes.values()),
+              'seconds': round(elapsed, 3),
+              'requests_per_second': round(requests / elapsed, 1),
+              'background_queries': recorder.queries.get('(background)', 0),
+              'phases': phases,
+              'routes': routes}
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
+    if report['errors'] > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
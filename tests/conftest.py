@@ -0,0 +1,35 @@
+import os
+import sys
+
+# The tests import the website package from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+from website import create_app, db
+from website.models import User, Pool, Link
+from website import bracket
+import pytest
+
+
+@pytest.fixture()
+def app(tmp_path):
+    # An app on an empty SQLite database with user 1 (the owner) in pool 1.
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'),
+                      'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        bracket.invalidateBracket()
+        db.session.add(User(id=1, email='owner@example.com', first_name='Owner',
+                            password=generate_password_hash('password')))
+        db.session.add(Pool(id=1, pool_name='Office', password='AAAAAAAAAAAA'))
+        db.session.add(Link(user_id=1, pool_id=1))
+        db.session.commit()
+    return app
+
+
+@pytest.fixture()
+def client(app):
+    # A test client logged in as the owner.
+    client = app.test_client()
+    client.post('/login', data={'email': 'owner@example.com', 'password': 'password'})
+    client.get('/') # Shows the login message so later pages aren't flashed.
+    return client
@@ -0,0 +1,44 @@
+from website import db
+from website.models import User, Link, Picks
+from website import elimination
+from website import importer
+from website import picks
+from website import scoring
+from website.users import invalidateUser
+
+# The still alive analysis loads the pool's picks once per change to the
+# season or the pool, not on every view of the pool page.
+
+
+def test_still_alive_loads_picks_once_per_change(app, client, monkeypatch):
+    with app.app_context():
+        importer.importField([importer.teamEntry('Team ' + str(n)) for n in range(1, 65)])
+        User.query.filter_by(id=1).one().is_admin = True
+        db.session.add(User(id=2, email='two@example.com', first_name='Two'))
+        db.session.add(Link(user_id=2, pool_id=1))
+        db.session.flush()
+        for link in Link.query.all():
+            db.session.add(Picks(link_id=link.id, slots=link.user_id - 1, picked=picks.ALL_GAMES))
+        db.session.commit()
+        invalidateUser(1)
+    # Team 1 wins every game of the first two rounds, leaving 15 games.
+    client.post('/admin/round1', data=dict(('game' + str(n), 'team1') for n in range(1, 33)))
+    client.post('/admin/round2', data=dict(('game' + str(n), 'team1') for n in range(33, 49)))
+
+    loads = []
+    loadPoolTeams = scoring.loadPoolTeams
+    monkeypatch.setattr(scoring, 'loadPoolTeams',
+                        lambda *args: loads.append(args) or loadPoolTeams(*args))
+    for i in range(3):
+        assert client.get('/view-pool?id=1').status_code == 200
+    assert len(loads) == 1
+    with app.app_context():
+        alive = elimination.getStillAlive(1)
+    assert alive[1] == (1 << 15, 1 << 15) # Only user 2 missed game 1.
+    assert alive[2][0] < alive[2][1]
+
+    # Saving picks bumps the pool's counter, so the next view recounts.
+    response = client.post('/api/pools/1/picks', json={'picks': [1] + [0] * 59 + [None] * 3})
+    assert response.status_code == 200
+    client.get('/view-pool?id=1')
+    assert len(loads) == 2
@@ -0,0 +1,39 @@
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from website import db
+from website import metrics
+from website.models import User
+from website.users import invalidateUser
+import logging
+import pytest
+
+# Query timing keeps no state on pooled connections and logs slow queries
+# through the app's logger.
+
+
+def test_failed_statements_leave_no_start_times(app):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            for i in range(3):
+                with pytest.raises(OperationalError):
+                    connection.execute(text('SELECT * FROM missing_table'))
+            connection.execute(text('SELECT 1'))
+            assert connection.info.get('metrics_started') == []
+
+
+def test_slow_queries_are_logged(app, caplog, monkeypatch):
+    monkeypatch.setattr(metrics._metrics, 'slow_query_ms', 0)
+    with app.app_context(), caplog.at_level(logging.WARNING):
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+    assert any(record.getMessage().startswith('Slow query') for record in caplog.records)
+
+
+def test_metrics_show_the_user_cache(app, client):
+    with app.app_context():
+        User.query.filter_by(id=1).one().is_admin = True
+        db.session.commit()
+        invalidateUser(1)
+    stats = client.get('/admin/metrics.json').get_json()['user_cache']
+    assert stats['hits'] + stats['misses'] > 0
+    assert 'User cache:' in client.get('/admin/metrics').get_data(as_text=True)
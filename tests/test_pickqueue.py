@@ -0,0 +1,40 @@
+from website import db
+from website.models import Lock
+from website import importer
+from website import pickqueue
+import time
+import pytest
+
+# When the pick queue's writer is backed up, saving picks fails with a
+# message instead of a server error.
+
+
+@pytest.fixture()
+def slowWriter(app, monkeypatch):
+    with app.app_context():
+        importer.importField([importer.teamEntry('Team ' + str(n)) for n in range(1, 65)])
+        for week in [1, 2, 3]:
+            db.session.add(Lock(week=week, is_locked=False))
+        db.session.commit()
+    app.config.update(PICK_QUEUE=True, PICK_QUEUE_TIMEOUT=0.05)
+    writeUpdates = pickqueue.writeUpdates
+
+    def slowWriteUpdates(updates):
+        time.sleep(0.3)
+        return writeUpdates(updates)
+
+    monkeypatch.setattr(pickqueue, 'writeUpdates', slowWriteUpdates)
+
+
+def test_api_returns_503_when_the_queue_times_out(client, slowWriter):
+    response = client.post('/api/pools/1/picks', json={'picks': [0] * 48 + [None] * 15})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert 'error' in response.get_json()
+
+
+def test_make_picks_flashes_when_the_queue_times_out(client, slowWriter):
+    url = '/make-picks?pool_id=1&round_number=1'
+    response = client.post(url, data=dict(('game' + str(n), 'team1') for n in range(1, 33)))
+    assert response.headers['Location'].endswith('round_number=1')
+    assert 'Saving your picks is taking too long.' in client.get(url).get_data(as_text=True)
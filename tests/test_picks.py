@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+from website import db
+from website.models import Link, Picks, currentSeason
+from website import bracket
+from website import importer
+from website import picks
+import random
+
+# The compact encoding is the stored format of every bracket, so each
+# mapping between names, lists and the two integers should round trip.
+
+
+def makeSnapshot():
+    # A bracket of 64 teams named 'Team 1' - 'Team 64' with the Round of 64
+    # and the first games of weeks 2 and 3 created.
+    teams = [SimpleNamespace(id=n, slot=n - 1, name='Team ' + str(n), seed=None, region=None)
+             for n in range(1, 65)]
+    pairs = dict((gameNumber, (2*gameNumber - 1, 2*gameNumber)) for gameNumber in range(1, 33))
+    pairs.update((48 + k, (8*(k - 1) + 1, 8*(k - 1) + 5)) for k in range(1, 9))
+    pairs.update({61: (1, 17), 62: (33, 49)})
+    matchups = [SimpleNamespace(id=gameNumber, game=gameNumber, team1_id=team1, team2_id=team2,
+                                winner_id=None)
+                for gameNumber, (team1, team2) in pairs.items()]
+    return bracket.BracketSnapshot(2026, matchups, teams)
+
+
+def test_week_first_games():
+    assert picks.WEEK_FIRST_GAMES == set(range(1, 33)) | set(range(49, 57)) | {61, 62}
+    assert [picks.gameWeek(n) for n in (1, 48, 49, 60, 61, 63)] == [1, 1, 2, 2, 3, 3]
+    assert picks.childGames(33) == (1, 2)
+    assert picks.childGames(57) == (49, 50)
+    assert picks.childGames(63) == (61, 62)
+
+
+def test_slot_bit_picks_team2():
+    snapshot = makeSnapshot()
+    picked = (1 << 0) | (1 << 1) | (1 << 32)
+    winners = picks.decodeWinners(0, picked, snapshot)
+    assert winners[:2] == ['Team 1', 'Team 3']
+    assert winners[32] == 'Team 1'
+    slots = (1 << 0) | (1 << 32)
+    winners = picks.decodeWinners(slots, picked, snapshot)
+    assert winners[:2] == ['Team 2', 'Team 3']
+    assert winners[32] == 'Team 3' # Bottom team of game 33 is the winner of game 2.
+    assert picks.getPick(SimpleNamespace(slots=slots, picked=picked), 1) == 1
+    assert picks.getPick(SimpleNamespace(slots=slots, picked=picked), 2) == 0
+    assert picks.getPick(SimpleNamespace(slots=slots, picked=picked), 3) is None
+
+
+def test_full_bracket_round_trips():
+    snapshot = makeSnapshot()
+    rng = random.Random(4)
+    for i in range(20):
+        slots = rng.getrandbits(picks.GAMES)
+        winners = picks.decodeWinners(slots, picks.ALL_GAMES, snapshot)
+        assert 'None' not in winners
+        assert picks.encodeWinners(winners, snapshot) == (slots, picks.ALL_GAMES)
+        assert picks.fromList(picks.toList(slots, picks.ALL_GAMES), snapshot) \
+            == ((slots, picks.ALL_GAMES), None)
+
+
+def test_partial_bracket_round_trips():
+    snapshot = makeSnapshot()
+    picked = sum(1 << (n - 1) for n in [1, 2, 3, 33, 49, 50, 57, 61])
+    slots = sum(1 << (n - 1) for n in [2, 33, 50, 61])
+    winners = picks.decodeWinners(slots, picked, snapshot)
+    assert winners.count('None') == picks.GAMES - 8
+    assert winners[33] == 'None' # Game 34 needs game 4, which isn't picked.
+    assert picks.encodeWinners(winners, snapshot) == (slots, picked)
+    values = picks.toList(slots, picked)
+    assert values[:4] == [0, 1, 0, None]
+    assert picks.fromList(values, snapshot) == ((slots, picked), None)
+
+
+def test_update_only_changes_masked_games():
+    row = SimpleNamespace(slots=0b0101, picked=0b0111)
+    picks.applyUpdate(row, 0b0011, 0b1110, 0b1011)
+    assert (row.slots, row.picked) == (0b0110, 0b0111)
+
+
+def test_legacy_row_is_migrated(app):
+    snapshot = makeSnapshot()
+    slots = sum(1 << (n - 1) for n in range(1, 33, 3)) | (1 << 32)
+    picked = sum(1 << (n - 1) for n in range(1, 33)) | (1 << 32)
+    winners = picks.decodeWinners(slots, picked, snapshot)
+    with app.app_context():
+        importer.importField([importer.teamEntry('Team ' + str(n)) for n in range(1, 65)])
+        link = Link.query.filter_by(user_id=1, pool_id=1).one()
+        # Rows from before the encoding have no slots or picked.
+        db.session.execute(Picks.__table__.insert().values(link_id=link.id, season=currentSeason(),
+                                                           slots=None, picked=None,
+                                                           winners=winners))
+        db.session.commit()
+
+    with app.app_context():
+        row = Picks.query.one()
+        assert row.picked is None and row.winners == winners
+        assert picks.migratePicks(row, bracket.getBracket())
+        db.session.commit()
+        assert not picks.migratePicks(row, bracket.getBracket())
+
+    with app.app_context():
+        row = Picks.query.one()
+        assert (row.slots, row.picked, row.winners) == (slots, picked, None)
+        assert picks.decodeWinners(row.slots, row.picked, bracket.getBracket()) == winners
@@ -0,0 +1,63 @@
+from sqlalchemy import event
+from website import db
+from website.models import User, Pool, Link, Picks
+from website import standings
+
+# /pools and /view-pool load pools, members and standings with joined
+# queries, so the number of statements a page runs doesn't grow with the
+# number of pools or members.
+
+
+def countQueries(app, client, url):
+    # Output: Number of statements the page runs once its caches are warm.
+    assert client.get(url).status_code == 200
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return len(statements)
+
+
+def addMembers(app, count, start):
+    # Adds users with empty picks to pool 1.
+    with app.app_context():
+        for userId in range(start, start + count):
+            db.session.add(User(id=userId, email='user' + str(userId) + '@example.com',
+                                first_name='User ' + str(userId)))
+            link = Link(user_id=userId, pool_id=1)
+            db.session.add(link)
+            db.session.flush()
+            db.session.add(Picks(link_id=link.id, slots=0, picked=0))
+        db.session.commit()
+        standings.rebuildStandings()
+
+
+def addPools(app, count, start):
+    # Adds pools with the owner in each of them.
+    with app.app_context():
+        for poolId in range(start, start + count):
+            db.session.add(Pool(id=poolId, pool_name='Pool ' + str(poolId),
+                                password=str(poolId).zfill(12)))
+            db.session.add(Link(user_id=1, pool_id=poolId))
+        db.session.commit()
+
+
+def test_pools_query_count_does_not_grow_with_pools(app, client):
+    few = countQueries(app, client, '/pools')
+    addPools(app, 25, 2)
+    assert countQueries(app, client, '/pools') == few
+
+
+def test_view_pool_query_count_does_not_grow_with_members(app, client):
+    addMembers(app, 2, 2)
+    few = countQueries(app, client, '/view-pool?id=1')
+    addMembers(app, 50, 4)
+    assert countQueries(app, client, '/view-pool?id=1') == few
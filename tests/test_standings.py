@@ -0,0 +1,80 @@
+from website import db
+from website.models import User, Link, Picks, Standing
+from website import importer
+from website import picks
+from website import standings
+from website.users import invalidateUser
+import random
+import pytest
+
+# Entering results updates the Standing rows with per-game deltas
+# (standings.applyBracketChange), which should always give the same rows
+# as recalculating the season from scratch.
+
+ROUNDS = [(1, 32), (33, 16), (49, 8), (57, 4), (61, 2), (63, 1)] # First game and games per round.
+
+
+@pytest.fixture()
+def pool(app):
+    # 64 teams, an admin owner and 20 members in pool 1 with random brackets.
+    rng = random.Random(6)
+    with app.app_context():
+        importer.importField([importer.teamEntry('Team ' + str(n)) for n in range(1, 65)])
+        User.query.filter_by(id=1).one().is_admin = True
+        for userId in range(2, 22):
+            db.session.add(User(id=userId, email='user' + str(userId) + '@example.com',
+                                first_name='User ' + str(userId)))
+            db.session.add(Link(user_id=userId, pool_id=1))
+        db.session.flush()
+        for link in Link.query.all():
+            db.session.add(Picks(link_id=link.id, slots=rng.getrandbits(picks.GAMES),
+                                 picked=picks.ALL_GAMES))
+        db.session.commit()
+        invalidateUser(1)
+        standings.rebuildStandings()
+    return rng
+
+
+def standingRows(app):
+    with app.app_context():
+        return sorted((row.link_id, row.pool_id, row.round1, row.round2, row.round3, row.round4,
+                       row.round5, row.round6, row.total) for row in Standing.query.all())
+
+
+def assertRebuildMatches(app):
+    updated = standingRows(app)
+    with app.app_context():
+        standings.rebuildStandings()
+    assert updated == standingRows(app)
+
+
+def enterResults(client, roundNumber, winners):
+    first, count = ROUNDS[roundNumber - 1]
+    form = dict(('game' + str(first + i), winners[i]) for i in range(count))
+    assert client.post('/admin/round' + str(roundNumber), data=form).status_code == 302
+
+
+def test_results_update_standings_like_a_rebuild(app, client, pool):
+    rng = pool
+    results = {}
+    for roundNumber in range(1, 7):
+        count = ROUNDS[roundNumber - 1][1]
+        results[roundNumber] = [rng.choice(['team1', 'team2']) for i in range(count)]
+        enterResults(client, roundNumber, results[roundNumber])
+        assertRebuildMatches(app)
+    assert max(row[-1] for row in standingRows(app)) > 0
+
+    # Change a Round of 32 winner, which moves a team in the later rounds,
+    # and then change it back.
+    changed = list(results[2])
+    changed[0] = 'team1' if changed[0] == 'team2' else 'team2'
+    enterResults(client, 2, changed)
+    assertRebuildMatches(app)
+    enterResults(client, 2, results[2])
+    assertRebuildMatches(app)
+
+    # Clear a Round of 64 result and enter it again.
+    enterResults(client, 1, ['none'] + results[1][1:])
+    assertRebuildMatches(app)
+    enterResults(client, 1, results[1])
+    assertRebuildMatches(app)
@@ -0,0 +1,7 @@
+# generate-data checks its options before writing anything.
+
+
+def test_generate_data_needs_a_pool_for_its_users(app):
+    result = app.test_cli_runner().invoke(args=['generate-data', '--users', '5', '--pools', '0'])
+    assert result.exit_code != 0
+    assert 'generate-data needs at least one pool for its users.' in result.output
@@ -1,40 +1,60 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from os import path
+from sqlalchemy import inspect
 from flask_login import LoginManager
+from .database import configureDatabase, registerPragmas
+from .metrics import configureMetrics
 
 db = SQLAlchemy()
-DB_NAME = "database.db"
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'hjshjhdjah kjshkjdhjs'
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_NAME}'
+    if config is not None:
+        # Used by the benchmarks to run against a temporary database.
+        app.config.update(config)
+    configureDatabase(app)
     db.init_app(app)
+    registerPragmas(app, db)
+    configureMetrics(app, db)
 
     from .views import views
     from .auth import auth
+    from .api import api
 
     app.register_blueprint(views, url_prefix='/')
     app.register_blueprint(auth, url_prefix='/')
+    app.register_blueprint(api, url_prefix='/api')
 
-    from .models import User, Note, Picks, Matchup, Pool, Link
+    from .models import User, Note, Picks, Matchup, Team, Pool, Link, Lock
 
     create_database(app)
 
+    from .migrations import migrate
+    migrate(app)
+
+    from .commands import commands
+    for command in commands:
+        app.cli.add_command(command)
+
     login_manager = LoginManager()
     login_manager.login_view = 'auth.login'
     login_manager.init_app(app)
 
+    from .users import loadUser, configureUserCache
+    configureUserCache(app)
+
     @login_manager.user_loader
     def load_user(id):
-        return User.query.get(int(id))
+        return loadUser(id)
 
     return app
 
 
 def create_database(app):
-    if not path.exists('website/' + DB_NAME):
-        db.create_all(app=app)
-        print('Created Database!')
+    # Creates every table when the configured database is empty.
+    with app.app_context():
+        if len(inspect(db.engine).get_table_names()) == 0:
+            db.create_all(app=app)
+            print('Created Database!')
@@ -0,0 +1,97 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from .models import Picks, currentSeason
+from . import db
+from . import bracket
+from . import picks
+from . import standings
+from . import pickqueue
+from . import queries
+from . import versions
+from . import pickcounts
+from . import locks
+
+# JSON API used by the one page bracket in static/index.js.  A bracket is
+# loaded with one GET and saved with one POST of all 63 picks.
+#
+# Picks are sent as a list of 63 values indexed by game number - 1:
+# 0 for team1, 1 for team2 and null for a game that hasn't been picked
+# (see picks.py).
+
+api = Blueprint('api', __name__)
+
+RETRY_AFTER = 5 # Seconds a client waits before saving again when the pick queue is backed up.
+
+
+@api.route('/pools/<int:pool_id>/bracket', methods=['GET'])
+@login_required
+def get_bracket(pool_id):
+    etag = versions.pageEtag([versions.seasonKey(), versions.memberKey(pool_id, current_user.id)],
+                             current_user)
+    if versions.isNotModified(etag):
+        return versions.notModified(etag)
+
+    user_picks = queries.getUserPicks(current_user.id, pool_id)
+    if user_picks is None and not queries.isInPool(current_user.id, pool_id):
+        return jsonify({'error': 'You are not in this pool.'}), 403
+
+    snapshot = bracket.getBracket()
+    if user_picks is not None and picks.migratePicks(user_picks, snapshot):
+        db.session.commit()
+
+    # Matchups are [game, team1, team2, winner].  The client works out the
+    # teams of the other games from the user's picks.
+    matchups = [[game, each.team1, each.team2, each.winner]
+                for game, each in sorted(snapshot.games.items())]
+    if user_picks is None:
+        values = [None] * picks.GAMES
+    else:
+        values = picks.toList(user_picks.slots, user_picks.picked)
+    return versions.withEtag(jsonify({'season': snapshot.season, 'pool_id': pool_id,
+                                      'matchups': matchups, 'picks': values,
+                                      'locked': sorted(locks.lockedWeeks())}), etag)
+
+
+@api.route('/pools/<int:pool_id>/picks', methods=['POST'])
+@login_required
+def save_picks(pool_id):
+    link_id = queries.getLinkId(current_user.id, pool_id)
+    if link_id is None:
+        return jsonify({'error': 'You are not in this pool.'}), 403
+
+    data = request.get_json(silent=True) or {}
+    snapshot = bracket.getBracket()
+    encoded, error = picks.fromList(data.get('picks'), snapshot)
+    if error is not None:
+        return jsonify({'error': error}), 400
+    slots, picked = encoded
+
+    user_picks = db.session.query(Picks).filter(Picks.link_id == link_id,
+                                                Picks.season == currentSeason()).first()
+    if user_picks is None:
+        user_picks = Picks(slots=0, picked=0)
+    else:
+        picks.migratePicks(user_picks, snapshot)
+
+    # Games in locked weeks have to keep their saved pick.
+    try:
+        locks.checkChange(user_picks.slots, user_picks.picked, slots, picked)
+        if pickqueue.isEnabled():
+            pickqueue.submitPicks(link_id, picks.ALL_GAMES, slots, picked)
+        else:
+            if user_picks.id is None:
+                user_picks = queries.createPicks(link_id)
+            pickcounts.recordChanges([(pool_id, user_picks.slots, user_picks.picked, slots, picked)])
+            user_picks.slots = slots
+            user_picks.picked = picked
+            db.session.commit()
+            standings.refreshStanding(link_id)
+    except locks.WeekLocked as error:
+        db.session.rollback()
+        return jsonify({'error': str(error)}), 409
+    except TimeoutError:
+        # The pick queue's writer is backed up, the client can send the
+        # bracket again.
+        return jsonify({'error': 'Saving picks is taking too long.'}), 503, \
+               {'Retry-After': str(RETRY_AFTER)}
+    return jsonify({'picks': picks.toList(slots, picked)})
@@ -0,0 +1,248 @@
+from flask import current_app
+from sqlalchemy import create_engine, MetaData, Table, Column, Index, Integer, String, Boolean, select
+from .models import User, Pool, Link, Picks, Matchup, Team, Lock, Standing, PickCount, currentSeason
+from .cache import LRUCache
+from . import db
+from . import bracket
+from . import picks
+from . import standings
+from . import versions
+import os
+import stat
+import threading
+import time
+
+# Archives of finished seasons.
+#
+# `flask archive-season <season>` copies a season's teams, matchups, locks
+# and picks into its own SQLite file (ARCHIVE_DIR/season-<season>.db)
+# together with the final standings of every pool, then deletes the
+# season's rows from the live database.  Archive files are written once,
+# made read-only and opened read-only, so pages reading them can cache
+# freely.  Names of users and pools are copied into the archive as they were
+# at the end of the season.
+
+ARCHIVE_FILE = 'season-{}.db'
+CACHE_SIZE = 256
+
+_metadata = MetaData()
+
+info_table = Table('info', _metadata,
+                   Column('key', String(50), primary_key=True),
+                   Column('value', String(100)))
+
+team_table = Table('team', _metadata,
+                   Column('id', Integer, primary_key=True),
+                   Column('slot', Integer),
+                   Column('name', String(100)),
+                   Column('seed', Integer),
+                   Column('region', String(50)))
+
+matchup_table = Table('matchup', _metadata,
+                      Column('game', Integer, primary_key=True),
+                      Column('team1_id', Integer),
+                      Column('team2_id', Integer),
+                      Column('winner_id', Integer))
+
+lock_table = Table('lock', _metadata,
+                   Column('week', Integer, primary_key=True),
+                   Column('is_locked', Boolean))
+
+picks_table = Table('picks', _metadata,
+                    Column('link_id', Integer, primary_key=True),
+                    Column('user_id', Integer),
+                    Column('pool_id', Integer),
+                    Column('slots', Integer),
+                    Column('picked', Integer))
+
+standing_table = Table('standing', _metadata,
+                       Column('link_id', Integer, primary_key=True),
+                       Column('pool_id', Integer),
+                       Column('pool_name', String(100)),
+                       Column('user_id', Integer),
+                       Column('first_name', String(150)),
+                       *[Column(column, Integer) for column in standings.ROUND_COLUMNS],
+                       Column('total', Integer),
+                       Column('rank', Integer),
+                       Index('ix_standing_pool_rank', 'pool_id', 'rank'))
+
+_engines = {}
+_engines_lock = threading.Lock()
+_cache = LRUCache(CACHE_SIZE)
+
+
+def getArchiveDir():
+    return current_app.config.get('ARCHIVE_DIR', os.path.join(current_app.root_path, 'archive'))
+
+
+def getArchivePath(season):
+    return os.path.join(getArchiveDir(), ARCHIVE_FILE.format(int(season)))
+
+
+def getArchivedSeasons():
+    # Output: List of archived seasons, newest first.
+    directory = getArchiveDir()
+    if not os.path.isdir(directory):
+        return []
+    prefix, suffix = ARCHIVE_FILE.split('{}')
+    seasons = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(suffix):
+            value = name[len(prefix):len(name) - len(suffix)]
+            if value.isdigit():
+                seasons.append(int(value))
+    return sorted(seasons, reverse=True)
+
+
+def getArchiveEngine(season):
+    # Output: Read only engine for the season's archive or None if the
+    #         season hasn't been archived.
+    path = getArchivePath(season)
+    with _engines_lock:
+        engine = _engines.get(path)
+        if engine is None:
+            if not os.path.exists(path):
+                return None
+            engine = create_engine('sqlite:///file:' + path + '?mode=ro&uri=true')
+            _engines[path] = engine
+        return engine
+
+
+def finalStandings(season):
+    # Gets the final standings of every pool with the ranks of getStandings().
+    # Output: List of standing_table rows ordered by pool and rank.
+    columns = [getattr(Standing, column) for column in standings.ROUND_COLUMNS]
+    rows = db.session.query(Standing.link_id, Standing.pool_id, Pool.pool_name, User.id,
+                            User.first_name, *columns, Standing.total) \
+                     .join(Link, Link.id == Standing.link_id) \
+                     .join(User, User.id == Link.user_id) \
+                     .join(Pool, Pool.id == Standing.pool_id) \
+                     .filter(Standing.season == season) \
+                     .order_by(Standing.pool_id, Standing.total.desc(), Standing.link_id).all()
+    result = []
+    for i, row in enumerate(rows):
+        if i == 0 or row[1] != rows[i - 1][1]:
+            first = i # First row of the pool.
+        if i == first or row[-1] != rows[i - 1][-1]:
+            rank = i - first + 1
+        standing = {'link_id': row[0], 'pool_id': row[1], 'pool_name': row[2], 'user_id': row[3],
+                    'first_name': row[4], 'total': row[-1], 'rank': rank}
+        for column, value in zip(standings.ROUND_COLUMNS, row[5:-1]):
+            standing[column] = value
+        result.append(standing)
+    return result
+
+
+def archiveSeason(season):
+    # Moves a finished season into its archive file and deletes its Team,
+    # Matchup, Lock, Picks, Standing and PickCount rows from the live database.
+    # Output: Dictionary of the number of rows archived per table.
+    if season >= currentSeason():
+        raise ValueError('Only seasons before ' + str(currentSeason()) + ' can be archived.')
+    path = getArchivePath(season)
+    if os.path.exists(path):
+        raise ValueError('Season ' + str(season) + ' is already archived in ' + path + '.')
+
+    snapshot = bracket.getBracket(season)
+    if len(snapshot.games) == 0:
+        raise ValueError('Season ' + str(season) + ' has no matchups.')
+
+    # Standings are recalculated so the frozen copy matches the results.
+    standings.rebuildStandings(season)
+    rows = {'team': [{'id': team.id, 'slot': team.slot, 'name': team.name, 'seed': team.seed,
+                      'region': team.region} for team in snapshot.teams.values()],
+            'matchup': [{'game': game, 'team1_id': each.team1_id, 'team2_id': each.team2_id,
+                         'winner_id': each.winner_id} for game, each in snapshot.games.items()],
+            'lock': [{'week': lock.week, 'is_locked': bool(lock.is_locked)}
+                     for lock in bracket.getLocks(season)],
+            'picks': [],
+            'standing': finalStandings(season)}
+    for link_id, user_id, pool_id, slots, picked, winners in \
+            db.session.query(Link.id, Link.user_id, Link.pool_id, Picks.slots, Picks.picked,
+                             Picks.winners) \
+                      .join(Picks, Picks.link_id == Link.id).filter(Picks.season == season):
+        if picked is None:
+            slots, picked = picks.encodeWinners(winners or [], snapshot)
+        rows['picks'].append({'link_id': link_id, 'user_id': user_id, 'pool_id': pool_id,
+                              'slots': slots, 'picked': picked})
+
+    # Written to a temporary file first so a failure never leaves a partial archive.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + '.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+    engine = create_engine('sqlite:///' + partial)
+    _metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(info_table.insert(), [{'key': 'season', 'value': str(season)},
+                                           {'key': 'archived_at', 'value': str(int(time.time()))}])
+        tables = {'team': team_table, 'matchup': matchup_table, 'lock': lock_table,
+                  'picks': picks_table, 'standing': standing_table}
+        for name, table in tables.items():
+            if len(rows[name]) > 0:
+                conn.execute(table.insert(), rows[name])
+    engine.dispose()
+    os.chmod(partial, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    os.rename(partial, path)
+
+    for model in [PickCount, Standing, Picks, Lock, Matchup, Team]:
+        db.session.query(model).filter(model.season == season).delete(synchronize_session=False)
+    versions.bumpVersions([versions.seasonKey(season)])
+    db.session.commit()
+    bracket.invalidateBracket(season)
+    return dict((name, len(values)) for name, values in rows.items())
+
+
+def getPoolSeasons(poolId):
+    # Gets the archived seasons the pool has final standings in.
+    # Output: List of seasons, newest first.
+    found = []
+    for season in getArchivedSeasons():
+        key = ('pool_seasons', season, int(poolId))
+        entered = _cache.get(key)
+        if entered is None:
+            with getArchiveEngine(season).connect() as conn:
+                entered = conn.execute(select(standing_table.c.link_id)
+                                       .where(standing_table.c.pool_id == poolId)
+                                       .limit(1)).first() is not None
+            _cache.set(key, entered)
+        if entered:
+            found.append(season)
+    return found
+
+
+def getArchivedStandings(poolId, season):
+    # Gets a pool's final leaderboard from the season's archive.
+    # Output: List of dictionaries like standings.getStandings() or None if
+    #         the season hasn't been archived.
+    key = ('standings', int(season), int(poolId))
+    leaderboard = _cache.get(key)
+    if leaderboard is not None:
+        return leaderboard
+    engine = getArchiveEngine(season)
+    if engine is None:
+        return None
+    with engine.connect() as conn:
+        rows = conn.execute(select(standing_table)
+                            .where(standing_table.c.pool_id == poolId)
+                            .order_by(standing_table.c.rank, standing_table.c.link_id)).all()
+    leaderboard = [{'link_id': row.link_id, 'user_id': row.user_id, 'first_name': row.first_name,
+                    'rounds': [row[column] for column in standings.ROUND_COLUMNS],
+                    'total': row.total, 'rank': row.rank} for row in rows]
+    _cache.set(key, leaderboard)
+    return leaderboard
+
+
+def getArchivedChampion(season):
+    # Output: Name of the team that won the season's championship or None.
+    key = ('champion', int(season))
+    champion = _cache.get(key)
+    if champion is None:
+        with getArchiveEngine(season).connect() as conn:
+            row = conn.execute(select(team_table.c.name)
+                               .select_from(matchup_table.join(team_table,
+                                            team_table.c.id == matchup_table.c.winner_id))
+                               .where(matchup_table.c.game == picks.GAMES)).first()
+        champion = row[0] if row is not None else ''
+        _cache.set(key, champion)
+    return champion or None
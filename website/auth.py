@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for
 from .models import User
 from werkzeug.security import generate_password_hash, check_password_hash
 from . import db
+from .users import invalidateUser
 from flask_login import login_user, login_required, logout_user, current_user
 
 
@@ -59,6 +60,7 @@ def sign_up():
                 password1, method='sha256'), is_admin=False)
             db.session.add(new_user)
             db.session.commit()
+            invalidateUser(new_user.id)
             login_user(new_user, remember=True)
             flash('Account created!', category='success')
             return redirect(url_for('views.home'))
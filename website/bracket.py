@@ -0,0 +1,125 @@
+from flask import g
+from .models import Matchup, Team, Lock, currentSeason
+from . import db
+from . import versions
+from collections import namedtuple
+import threading
+
+# Bracket store.  All lookups go through the (season, game) index on
+# Matchup so older seasons in the database are never read.
+
+# Read-only copies of Matchup and Team rows.  Snapshots are shared between
+# requests so they hold plain values instead of session-bound objects.
+# team1, team2 and winner are the team names, looked up from the Team rows.
+MatchupState = namedtuple('MatchupState', ['id', 'game', 'team1', 'team2', 'winner',
+                                           'team1_id', 'team2_id', 'winner_id'])
+TeamState = namedtuple('TeamState', ['id', 'slot', 'name', 'seed', 'region'])
+
+
+class BracketSnapshot:
+    # Every Matchup and Team of one season, as of the season's Version
+    # counter when it was loaded.
+
+    def __init__(self, season, matchups, teams, version=0):
+        self.season = season
+        self.version = version
+        self.teams = {}
+        for each in teams:
+            self.teams[each.id] = TeamState(each.id, each.slot, each.name, each.seed, each.region)
+        self.games = {}
+        for each in matchups:
+            self.games[each.game] = MatchupState(each.id, each.game, self.teamName(each.team1_id),
+                                                 self.teamName(each.team2_id),
+                                                 self.teamName(each.winner_id),
+                                                 each.team1_id, each.team2_id, each.winner_id)
+
+    def teamName(self, teamId):
+        # Output: Name of the team or None.
+        team = self.teams.get(teamId)
+        return team.name if team is not None else None
+
+    def matchup(self, gameNumber):
+        # Output: MatchupState or None if the game has not been created yet.
+        return self.games.get(gameNumber)
+
+    def matchups(self, firstGame, count):
+        # Output: List of MatchupStates for count games starting at firstGame.
+        #         Games that have not been created yet are None.
+        return [self.games.get(firstGame + i) for i in range(count)]
+
+
+# Snapshots by season.  Every write to a season's teams and results bumps
+# its Version counter (see versions.seasonKey) before committing, so a
+# snapshot is reloaded once the counter in the database no longer matches,
+# including after writes made by another worker process.  The counter is
+# read once per request.  invalidateBracket() drops the snapshot right away
+# in the process that made the change.
+_snapshots = {}
+_generation = 0
+_snapshot_lock = threading.Lock()
+
+
+def seasonVersion(season):
+    # Output: The season's Version counter, read once per request (or app
+    #         context).
+    known = g.setdefault('season_versions', {})
+    if season not in known:
+        known[season] = versions.getVersions([versions.seasonKey(season)])[0]
+    return known[season]
+
+
+def getBracket(season=None):
+    # Gets the cached snapshot of the entered season (defaults to the current
+    # season), loading it with two queries if it is not cached or is older
+    # than the season's Version counter.
+    # Output: BracketSnapshot.
+    if season is None:
+        season = currentSeason()
+    version = seasonVersion(season)
+    snapshot = _snapshots.get(season)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    generation = _generation
+    snapshot = BracketSnapshot(season,
+                               db.session.query(Matchup).filter(Matchup.season == season).all(),
+                               db.session.query(Team).filter(Team.season == season).all(),
+                               version)
+    with _snapshot_lock:
+        # Don't cache a snapshot that was loaded while a commit invalidated it.
+        if generation == _generation:
+            _snapshots[season] = snapshot
+    return snapshot
+
+
+def invalidateBracket(season=None):
+    # Drops the cached snapshot of the entered season (defaults to the
+    # current season).  Call after committing changes to Matchup rows.
+    global _generation
+    if season is None:
+        season = currentSeason()
+    with _snapshot_lock:
+        _generation += 1
+        _snapshots.pop(season, None)
+    g.get('season_versions', {}).pop(season, None)
+
+
+def getMatchups(firstGame, count, season=None):
+    # Gets the Matchup rows for count games starting at firstGame with one
+    # query.  Used by the admin pages that update matchups.
+    # Output: Dictionary of game number to Matchup.
+    if season is None:
+        season = currentSeason()
+    matchups = db.session.query(Matchup).filter(Matchup.season == season,
+                                                Matchup.game >= firstGame,
+                                                Matchup.game < firstGame + count).all()
+    return dict((each.game, each) for each in matchups)
+
+
+def getLocks(season=None):
+    # Gets all Locks for the entered season (defaults to the current season).
+    # Output: List of Locks ordered by week.  Should have 3 Locks or fewer.
+    if season is None:
+        season = currentSeason()
+    return db.session.query(Lock).filter(Lock.season == season) \
+                                 .order_by(Lock.week).all()
@@ -0,0 +1,96 @@
+import click
+from flask.cli import with_appcontext
+from .models import currentSeason
+
+# Maintenance commands, run with `flask <command>` (set FLASK_APP=main.py).
+
+
+@click.command('rebuild-standings')
+@click.option('--season', type=int, default=None, help='Season to rebuild (defaults to the current season).')
+@with_appcontext
+def rebuild_standings(season):
+    # Recalculates every Standing row of a season from the picks and results.
+    from .standings import rebuildStandings
+    if season is None:
+        season = currentSeason()
+    count = rebuildStandings(season)
+    click.echo('Rebuilt ' + str(count) + ' standings for ' + str(season) + '.')
+
+
+@click.command('rebuild-pick-counts')
+@click.option('--season', type=int, default=None, help='Season to rebuild (defaults to the current season).')
+@with_appcontext
+def rebuild_pick_counts(season):
+    # Recounts how many entrants of each pool picked each team to win each game.
+    from .pickcounts import rebuildPickCounts
+    if season is None:
+        season = currentSeason()
+    count = rebuildPickCounts(season)
+    click.echo('Rebuilt ' + str(count) + ' pick counts for ' + str(season) + '.')
+
+
+@click.command('simulate-pool')
+@click.argument('pool_id', type=int)
+@click.option('--simulations', type=int, default=100000, help='Number of simulated tournaments.')
+@click.option('--top', 'top_n', type=int, default=3, help='Report the chance of finishing in the top N.')
+@click.option('--workers', type=int, default=None, help='Worker processes (defaults to the CPU count).')
+@click.option('--seed', type=int, default=None, help='Random seed for repeatable results.')
+@with_appcontext
+def simulate_pool(pool_id, simulations, top_n, workers, seed):
+    # Prints every entrant's chance of winning the pool and of finishing in the top N.
+    from .simulation import getWinProbabilities
+    odds = getWinProbabilities(pool_id, simulations, top_n, workers=workers, seed=seed)
+    for entrant in odds:
+        click.echo('%-30s %6.2f%% %6.2f%%' % (entrant['first_name'], 100*entrant['first'],
+                                              100*entrant['top']))
+
+
+@click.command('generate-data')
+@click.option('--users', type=int, default=1000, help='Number of users.')
+@click.option('--pools', type=int, default=100, help='Number of pools.')
+@click.option('--seasons', type=int, default=2, help='Complete past seasons before the current one.')
+@click.option('--played', type=click.IntRange(0, 6), default=0,
+              help='Rounds of the current season with results.')
+@click.option('--seed', type=int, default=0, help='Random seed, the same seed gives the same data.')
+@click.option('--no-standings', is_flag=True, help='Skip rebuilding the Standing rows.')
+@with_appcontext
+def generate_data(users, pools, seasons, played, seed, no_standings):
+    # Fills an empty database with synthetic users, pools and seasons of picks.
+    from .synthetic import generateData, PASSWORD
+    try:
+        counts = generateData(users, pools, seasons, played, seed, rebuild=not no_standings)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo('Wrote ' + ', '.join(str(count) + ' ' + table for table, count in counts.items())
+               + '.  Every user has the password \'' + PASSWORD + '\'.')
+
+
+@click.command('archive-season')
+@click.argument('season', type=int)
+@with_appcontext
+def archive_season(season):
+    # Moves a finished season out of the live database into its archive file.
+    from .archive import archiveSeason, getArchivePath
+    try:
+        counts = archiveSeason(season)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo('Archived ' + ', '.join(str(count) + ' ' + table for table, count in counts.items())
+               + ' to ' + getArchivePath(season) + '.')
+
+
+@click.command('export-picks')
+@click.argument('pool_id', type=int)
+@click.option('--season', type=int, default=None, help='Season to export (defaults to the current season).')
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']), default='csv')
+@click.option('--output', type=click.File('w'), default='-', help='File to write (defaults to stdout).')
+@with_appcontext
+def export_picks(pool_id, season, format, output):
+    # Writes every entrant's picks in the pool, one row per game.
+    from .export import PICK_COLUMNS, poolPickRows, csvLines, ndjsonLines
+    lines = csvLines if format == 'csv' else ndjsonLines
+    for line in lines(PICK_COLUMNS, poolPickRows(pool_id, season)):
+        output.write(line)
+
+
+commands = [rebuild_standings, rebuild_pick_counts, simulate_pool, generate_data, archive_season, export_picks]
@@ -0,0 +1,108 @@
+from sqlalchemy import and_, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import QueuePool
+from os import environ
+
+# Database settings.  The URI comes from the app config, then the
+# DATABASE_URL environment variable, then the local SQLite file.  SQLite
+# connections are opened with the pragmas in SQLITE_PRAGMAS and kept in a
+# QueuePool so requests reuse them.
+#
+# WAL lets readers carry on while a pick is being written and busy_timeout
+# makes a writer wait for the lock instead of failing with "database is
+# locked".  Each value can be changed through app.config['SQLITE_PRAGMAS'].
+#
+# upsert() writes rows keyed by a unique index on any of the databases.
+
+DEFAULT_URI = 'sqlite:///database.db'
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL', # Safe with WAL, only the last commits can be lost on power loss.
+    'busy_timeout': 10000, # Milliseconds a writer waits for the lock.
+    'mmap_size': 268435456, # 256 MB of the file read through memory mapping.
+    'cache_size': -65536, # Negative is KiB, 64 MB of page cache per connection.
+    'temp_store': 'MEMORY',
+}
+
+POOL_SIZE = 10 # Connections kept open.
+POOL_MAX_OVERFLOW = 20 # Extra connections opened under load.
+POOL_TIMEOUT = 30 # Seconds to wait for a connection.
+
+
+def getDatabaseUri(config):
+    # Output: URI from the config, the DATABASE_URL environment variable or
+    #         the default SQLite file.
+    return config.get('SQLALCHEMY_DATABASE_URI') or environ.get('DATABASE_URL') or DEFAULT_URI
+
+
+def configureDatabase(app):
+    # Sets the URI and engine options on the app config.  Call before
+    # db.init_app(app).
+    uri = getDatabaseUri(app.config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+
+    options = {}
+    if uri.startswith('sqlite') and ':memory:' not in uri and uri.rstrip('/') != 'sqlite:':
+        pragmas = dict(SQLITE_PRAGMAS)
+        pragmas.update(app.config.get('SQLITE_PRAGMAS', {}))
+        app.config['SQLITE_PRAGMAS'] = pragmas
+        options = {'poolclass': QueuePool,
+                   'pool_size': app.config.get('DATABASE_POOL_SIZE', POOL_SIZE),
+                   'max_overflow': app.config.get('DATABASE_MAX_OVERFLOW', POOL_MAX_OVERFLOW),
+                   'pool_timeout': app.config.get('DATABASE_POOL_TIMEOUT', POOL_TIMEOUT),
+                   # Pooled connections are handed to whichever request thread needs one.
+                   'connect_args': {'check_same_thread': False,
+                                    'timeout': pragmas['busy_timeout'] / 1000}}
+    elif not uri.startswith('sqlite'):
+        options = {'pool_size': app.config.get('DATABASE_POOL_SIZE', POOL_SIZE),
+                   'max_overflow': app.config.get('DATABASE_MAX_OVERFLOW', POOL_MAX_OVERFLOW),
+                   'pool_timeout': app.config.get('DATABASE_POOL_TIMEOUT', POOL_TIMEOUT),
+                   'pool_pre_ping': True}
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def setPragmas(pragmas):
+    # Output: Connect listener that runs the pragmas on every new connection.
+    def onConnect(connection, record):
+        cursor = connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA ' + name + ' = ' + str(value))
+        cursor.close()
+    return onConnect
+
+
+def registerPragmas(app, db):
+    # Adds the SQLite pragmas to the app's engine.  Call after
+    # db.init_app(app) and before the first query.
+    if 'SQLITE_PRAGMAS' not in app.config or not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return
+    with app.app_context():
+        event.listen(db.engine, 'connect', setPragmas(app.config['SQLITE_PRAGMAS']))
+
+
+def upsert(model, rows, keys, update):
+    # Inserts the rows, and for rows whose keys (the columns of a unique
+    # index) are already in the table sets the columns of update(new)
+    # instead, where new[column] is the row's new value.  SQLite and
+    # PostgreSQL run one INSERT ... ON CONFLICT DO UPDATE, other databases an
+    # UPDATE and then an INSERT per row.  Nothing is committed.
+    from . import db
+    if len(rows) == 0:
+        return
+    table = model.__table__
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        statement = insert(table).values(rows)
+        db.session.execute(statement.on_conflict_do_update(index_elements=keys,
+                                                           set_=update(statement.excluded)))
+        return
+    for row in rows:
+        updated = db.session.execute(table.update()
+                                          .where(and_(*[table.c[key] == row[key] for key in keys]))
+                                          .values(update(row))).rowcount
+        if updated == 0:
+            db.session.execute(table.insert().values(row))
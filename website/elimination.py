@@ -0,0 +1,86 @@
+from .models import currentSeason
+from . import bracket
+from . import picks
+from . import scoring
+from . import versions
+from .cache import LRUCache
+from .simulation import OutcomeScorer
+import numpy as np
+
+# Exact "still alive" analysis.  Once few enough games are left, every way
+# the rest of the tournament can go is enumerated as a bitmask over the
+# remaining games (bit i set means the bottom team wins the i-th remaining
+# game) and every entrant is scored against every outcome.
+
+MAX_REMAINING_GAMES = 15 # 2^15 outcomes, reached once the Sweet 16 starts.
+BATCH_CELLS = 4000000 # Outcomes x entrants scored at once, bounds memory per batch.
+
+_cache = LRUCache(32)
+
+
+def outcomeResults(results, outcomes):
+    # Builds the full results of each outcome.
+    # Output: (outcomes x 63) array of the winning team code of each game.
+    remaining = np.flatnonzero(results < 0)
+    bit_of_game = dict((column, bit) for bit, column in enumerate(remaining))
+    played = np.empty((len(outcomes), picks.GAMES), dtype=np.int16)
+    for gameNumber in range(1, picks.GAMES + 1):
+        column = gameNumber - 1
+        if results[column] >= 0:
+            played[:, column] = results[column]
+            continue
+        if gameNumber <= 32:
+            team1 = 2*column
+            team2 = 2*column + 1
+        else:
+            top, bottom = picks.childGames(gameNumber)
+            team1 = played[:, top - 1]
+            team2 = played[:, bottom - 1]
+        bottom_wins = (outcomes >> bit_of_game[column]) & 1
+        played[:, column] = np.where(bottom_wins == 1, team2, team1)
+    return played
+
+
+def countFirstPlaces(teams, results):
+    # Scores every entrant against every remaining outcome.
+    # Output: (number of outcomes in which each entrant finishes first,
+    #          tied for first counts, total number of outcomes)
+    remaining = len(np.flatnonzero(results < 0))
+    total = 1 << remaining
+    scorer = OutcomeScorer(teams, results)
+    batch = max(1, min(total, BATCH_CELLS // max(1, teams.shape[0])))
+
+    wins = np.zeros(teams.shape[0], dtype=np.int64)
+    for start in range(0, total, batch):
+        outcomes = np.arange(start, min(total, start + batch), dtype=np.int64)
+        scores = scorer.score(outcomeResults(results, outcomes))
+        wins += (scores == scores.max(axis=1, keepdims=True)).sum(axis=0)
+    return wins, total
+
+
+def getStillAlive(poolId, season=None):
+    # Gets whether each entrant can still finish first in the pool.
+    # Output: None while more than MAX_REMAINING_GAMES games are left, else
+    #         a dictionary of user id to (outcomes won, total outcomes).
+    if season is None:
+        season = currentSeason()
+    # The pool's picks are only loaded once few enough games are left, and
+    # then only once per change to the season or the pool, which bump their
+    # Version counters.
+    if len(np.flatnonzero(scoring.getResults(bracket.getBracket(season)) < 0)) > MAX_REMAINING_GAMES:
+        return None
+    key = (int(poolId), season) + tuple(versions.getVersions([versions.seasonKey(season),
+                                                         versions.poolKey(poolId)]))
+    alive = _cache.get(key)
+    if alive is not None:
+        return alive
+    entrants, teams, results = scoring.loadPoolTeams(poolId, season)
+    if len(entrants) == 0:
+        return None
+
+    wins, total = countFirstPlaces(teams, results)
+    alive = {}
+    for i, entrant in enumerate(entrants):
+        alive[entrant[1]] = (int(wins[i]), total)
+    _cache.set(key, alive)
+    return alive
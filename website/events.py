@@ -0,0 +1,80 @@
+from collections import deque, namedtuple
+import json
+import threading
+
+# In-process publish/subscribe for the live pool pages (/pool-events).
+#
+# Writers call publish() after they commit.  Events are kept in a short
+# history with increasing ids so a subscriber that reconnects with
+# Last-Event-ID gets what it missed.  Subscribers block on one shared
+# Condition, so an idle subscriber is a sleeping thread (or greenlet) and
+# costs no queries until something is published.
+#
+# Events only reach subscribers in the process that published them.
+
+HISTORY = 1000 # Events kept for reconnecting subscribers.
+
+Event = namedtuple('Event', ['id', 'pool_id', 'name', 'data'])
+
+
+class EventBroker:
+
+    def __init__(self, history=HISTORY):
+        self.condition = threading.Condition()
+        self.events = deque(maxlen=history)
+        self.last_id = 0
+
+    def publish(self, name, data, poolId=None):
+        # Sends an event to the subscribers of the pool, or of every pool if
+        # poolId is None.
+        with self.condition:
+            self.last_id += 1
+            self.events.append(Event(self.last_id, poolId, name, json.dumps(data)))
+            self.condition.notify_all()
+
+    def wait(self, afterId, poolId, timeout):
+        # Waits up to timeout seconds for events newer than afterId.
+        # Output: (id to wait after next time, list of new Events for the pool)
+        with self.condition:
+            if self.last_id <= afterId:
+                self.condition.wait(timeout)
+            found = []
+            for event in reversed(self.events):
+                if event.id <= afterId:
+                    break
+                if event.pool_id is None or event.pool_id == poolId:
+                    found.append(event)
+            found.reverse()
+            return self.last_id, found
+
+
+_broker = EventBroker()
+
+
+def publish(name, data, poolId=None):
+    _broker.publish(name, data, poolId)
+
+
+def formatEvent(event):
+    # Output: The event in text/event-stream format.
+    return 'id: ' + str(event.id) + '\nevent: ' + event.name + '\ndata: ' + event.data + '\n\n'
+
+
+def streamEvents(poolId, afterId=None, heartbeat=15):
+    # Yields the pool's events in text/event-stream format forever.  A
+    # comment line is sent every heartbeat seconds so proxies keep the
+    # connection open and closed clients are noticed.
+    if afterId is None:
+        afterId = _broker.last_id
+    elif afterId > _broker.last_id:
+        # The client's id is from before this process started, so it gets
+        # every event since then.
+        afterId = 0
+    yield 'retry: 5000\n\n'
+    while True:
+        lastId, found = _broker.wait(afterId, poolId, heartbeat)
+        if lastId == afterId:
+            yield ': keepalive\n\n'
+        afterId = lastId
+        for event in found:
+            yield formatEvent(event)
@@ -0,0 +1,102 @@
+from flask import Response, current_app, stream_with_context
+from .models import User, Link, Picks, currentSeason
+from . import db
+from . import bracket
+from . import picks
+from . import scoring
+import csv
+import io
+import json
+
+# Streamed responses for downloads and long admin pages.  Rows are written
+# to the client as they are read, so memory use doesn't depend on how many
+# rows there are.  Queries passed in should use yield_per(CHUNK_ROWS).
+
+CHUNK_ROWS = 1000 # Rows read from the database at a time.
+
+PICK_COLUMNS = ['entrant', 'user_id', 'game', 'round', 'pick', 'result']
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def csvLines(columns, rows):
+    # Yields the header and then one CSV line per row.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def ndjsonLines(columns, rows):
+    # Yields one JSON object per row, keyed by the column names.
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row))) + '\n'
+
+
+def streamRows(columns, rows, format, filename):
+    # Output: Response downloading the rows as filename.csv or filename.ndjson.
+    lines = csvLines(columns, rows) if format == 'csv' else ndjsonLines(columns, rows)
+    return Response(stream_with_context(lines), mimetype=FORMATS[format],
+                    headers={'Content-Disposition': 'attachment; filename=' + filename + '.' + format})
+
+
+def streamTemplate(name, **context):
+    # Output: Response rendering the template piece by piece, so loops over
+    #         lazy rows are sent while they are read.
+    current_app.update_template_context(context)
+    template = current_app.jinja_env.get_template(name)
+    return Response(stream_with_context(template.generate(context)))
+
+
+def poolPickRows(poolId, season=None, weeks=None):
+    # Yields a row of PICK_COLUMNS for each of the 63 games of every entrant
+    # in the pool.  Entrants are read CHUNK_ROWS at a time and each chunk is
+    # decoded at once with scoring.decodeTeams().  Only games in the entered
+    # weeks (1 - 3) are included if weeks isn't None.  The result is
+    # 'correct', 'incorrect' or blank if the game hasn't been played.
+    if season is None:
+        season = currentSeason()
+    snapshot = bracket.getBracket(season)
+    codes = scoring.teamCodes(snapshot)
+    results = scoring.getResults(snapshot, codes)
+    names = [''] * 64
+    for team in snapshot.teams.values():
+        names[team.slot] = team.name
+    games = [gameNumber for gameNumber in range(1, picks.GAMES + 1)
+             if weeks is None or picks.gameWeek(gameNumber) in weeks]
+    rounds = [scoring.ROUND_NAMES[scoring.GAME_ROUNDS[gameNumber - 1]] for gameNumber in range(1, 64)]
+
+    query = db.session.query(User.first_name, User.id, Picks.slots, Picks.picked, Picks.winners) \
+                      .join(Link, Link.user_id == User.id) \
+                      .join(Picks, Picks.link_id == Link.id) \
+                      .filter(Link.pool_id == poolId, Picks.season == season) \
+                      .order_by(Link.id).yield_per(CHUNK_ROWS)
+    chunk = []
+    for row in query:
+        chunk.append(row)
+        if len(chunk) == CHUNK_ROWS:
+            yield from decodeChunk(chunk, snapshot, codes, results, names, games, rounds)
+            chunk = []
+    yield from decodeChunk(chunk, snapshot, codes, results, names, games, rounds)
+
+
+def decodeChunk(rows, snapshot, codes, results, names, games, rounds):
+    if len(rows) == 0:
+        return
+    slots, picked = picks.encodeRows([row[2:] for row in rows], snapshot.season)
+    teams = scoring.decodeTeams(slots, picked, snapshot, codes)
+    for i, row in enumerate(rows):
+        for gameNumber in games:
+            team = teams[i, gameNumber - 1]
+            result = results[gameNumber - 1]
+            if result < 0 or team < 0:
+                outcome = ''
+            else:
+                outcome = 'correct' if team == result else 'incorrect'
+            yield (row[0], row[1], gameNumber, rounds[gameNumber - 1],
+                   names[team] if team >= 0 else '', outcome)
@@ -0,0 +1,170 @@
+from .models import Matchup, Team, currentSeason
+from . import db
+from . import bracket
+from . import standings
+from . import versions
+from . import pickcounts
+from .database import upsert
+import csv
+import io
+import json
+
+# Bulk import of the 64 team field.  Teams are written with one
+# INSERT ... ON CONFLICT DO UPDATE on the unique (season, slot) index of
+# Team and the Round of 64 (games 1 - 32) with one on the unique
+# (season, game) index of Matchup, so loading the field is a fixed number of
+# statements and one commit however many teams change.
+#
+# Team n (1 - 64) has slot n - 1 and is team1 of game (n + 1) // 2 when n is
+# odd and team2 when n is even, the same order as the enter_teams form.
+#
+# A blank field means "leave unchanged": a blank name, seed or region keeps
+# the value already stored in that slot, so the enter_teams form can rename
+# one team by filling in one box.  An import can't clear a stored seed or
+# region; enter the corrected value instead.
+
+TEAMS = 64
+
+
+def teamEntry(name, seed=None, region=None):
+    # Output: Dictionary of one team to import.
+    return {'name': (name or '').strip(), 'seed': seed, 'region': region or None}
+
+
+def parseSeed(value):
+    # Output: Seed as an int (1 - 16), None if blank, or raises ValueError.
+    value = str(value).strip() if value is not None else ''
+    if value == '':
+        return None
+    seed = int(value)
+    if seed < 1 or seed > 16:
+        raise ValueError(value)
+    return seed
+
+
+def parseField(text, format):
+    # Reads the field from CSV or JSON text.
+    #   JSON: a list of 64 teams, or {"teams": [64 teams]}, where a team is
+    #         a name or {"name": ..., "seed": ..., "region": ...}.
+    #   CSV:  64 rows of "name" or "slot,name[,seed[,region]]" (slot 1 - 64),
+    #         an optional header row is skipped.
+    # Output: (list of 64 team dictionaries, None) or (None, error message)
+    if format == 'json':
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None, 'Invalid JSON.'
+        if isinstance(data, dict):
+            data = data.get('teams')
+        if not isinstance(data, list):
+            return None, 'Expected a list of ' + str(TEAMS) + ' teams.'
+        entries = []
+        for i, team in enumerate(data):
+            if isinstance(team, str):
+                entries.append(teamEntry(team))
+            elif isinstance(team, dict) and isinstance(team.get('name', ''), str):
+                try:
+                    seed = parseSeed(team.get('seed'))
+                except ValueError:
+                    return None, 'Team ' + str(i + 1) + ' has an invalid seed.'
+                entries.append(teamEntry(team.get('name'), seed, team.get('region')))
+            else:
+                return None, 'Team ' + str(i + 1) + ' should be a name or an object with a name.'
+    elif format == 'csv':
+        entries = [teamEntry('')] * TEAMS
+        rows = [row for row in csv.reader(io.StringIO(text)) if len(row) > 0]
+        if len(rows) > 0 and rows[0][0].strip().lower() in ('slot', 'name', 'team'):
+            rows = rows[1:]
+        if len(rows) != TEAMS:
+            return None, 'Expected ' + str(TEAMS) + ' rows, found ' + str(len(rows)) + '.'
+        for i, row in enumerate(rows):
+            if len(row) == 1:
+                entries[i] = teamEntry(row[0])
+                continue
+            try:
+                slot = int(row[0])
+                seed = parseSeed(row[2]) if len(row) > 2 else None
+            except ValueError:
+                return None, 'Row ' + str(i + 1) + ' has an invalid slot or seed.'
+            if slot < 1 or slot > TEAMS:
+                return None, 'Row ' + str(i + 1) + ' has a slot outside 1 - 64.'
+            entries[slot - 1] = teamEntry(row[1], seed, row[3].strip() if len(row) > 3 else None)
+    else:
+        return None, 'Unknown format: ' + str(format)
+
+    if len(entries) != TEAMS:
+        return None, 'Expected ' + str(TEAMS) + ' teams, found ' + str(len(entries)) + '.'
+    return entries, None
+
+
+def parseUpload(upload):
+    # Reads the field from an uploaded file, JSON if the name ends in .json
+    # and CSV otherwise.
+    # Output: (list of 64 team dictionaries, None) or (None, error message)
+    format = 'json' if upload.filename.lower().endswith('.json') else 'csv'
+    return parseField(upload.read().decode('utf-8-sig'), format)
+
+
+def upsertRows(model, rows, keys, keep):
+    # Writes the rows keyed by the keys (see database.upsert).  Columns in keep take the new value unless it is blank or NULL, every
+    # other column takes the new value.
+    table = model.__table__
+
+    def update(new):
+        values = {}
+        for column in rows[0].keys():
+            if column in keys:
+                continue
+            if column in keep:
+                values[column] = db.func.coalesce(db.func.nullif(new[column], ''), table.c[column])
+            else:
+                values[column] = new[column]
+        return values
+
+    upsert(model, rows, keys, update)
+
+
+def importField(entries, season=None):
+    # Writes the season's 64 teams and Round of 64 matchups and updates the
+    # standings if any game changed teams.  Blank names, seeds and regions
+    # keep the stored values.
+    # Output: List of changed teams as dictionaries with slot (1 - 64), old
+    #         (name or None if it was a new team) and new.
+    if season is None:
+        season = currentSeason()
+    old_snapshot = bracket.getBracket(season)
+    old_teams = dict((team.slot, team) for team in old_snapshot.teams.values())
+
+    team_rows = []
+    changes = []
+    for slot, entry in enumerate(entries):
+        old = old_teams.get(slot)
+        team_rows.append({'season': season, 'slot': slot, 'name': entry['name'],
+                          'seed': entry['seed'], 'region': entry['region']})
+        if old is None:
+            changes.append({'slot': slot + 1, 'old': None, 'new': entry['name']})
+        elif entry['name'] != '' and entry['name'] != old.name:
+            changes.append({'slot': slot + 1, 'old': old.name, 'new': entry['name']})
+
+    seeds_changed = any(entry['seed'] is not None and entry['seed'] != old_teams[slot].seed
+                        or entry['region'] is not None and entry['region'] != old_teams[slot].region
+                        for slot, entry in enumerate(entries) if slot in old_teams)
+    games_missing = any(old_snapshot.matchup(gameNumber) is None
+                        for gameNumber in range(1, TEAMS // 2 + 1))
+    if len(changes) == 0 and not seeds_changed and not games_missing:
+        return changes
+
+    upsertRows(Team, team_rows, ['season', 'slot'], ['name', 'seed', 'region'])
+    team_ids = dict(db.session.query(Team.slot, Team.id).filter(Team.season == season).all())
+    matchup_rows = [{'season': season, 'game': gameNumber,
+                     'team1_id': team_ids[2*(gameNumber - 1)],
+                     'team2_id': team_ids[2*(gameNumber - 1) + 1]}
+                    for gameNumber in range(1, TEAMS // 2 + 1)]
+    upsertRows(Matchup, matchup_rows, ['season', 'game'], [])
+    versions.bumpVersions([versions.seasonKey(season)])
+    db.session.commit()
+    bracket.invalidateBracket(season)
+    new_snapshot = bracket.getBracket(season)
+    standings.applyBracketChange(old_snapshot, new_snapshot)
+    pickcounts.applyBracketChange(old_snapshot, new_snapshot)
+    return changes
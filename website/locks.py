@@ -0,0 +1,52 @@
+from .models import currentSeason
+from . import bracket
+from . import picks
+
+# Locked weeks.  Once an admin locks a week (see Lock) nobody can change
+# their picks for its games.  Every path that writes picks (make_picks, the
+# JSON API and the pick queue writer) checks the change with lockedChange()
+# before saving it.
+
+# Bits of the games in each week (1 - 3).
+WEEK_MASKS = dict((week, sum(1 << (gameNumber - 1) for gameNumber in range(1, picks.GAMES + 1)
+                             if picks.gameWeek(gameNumber) == week))
+                  for week in [1, 2, 3])
+
+
+class WeekLocked(Exception):
+    # Raised when saving picks would change a pick in a locked week.
+
+    def __init__(self, week):
+        Exception.__init__(self, 'Week ' + str(week) + ' is locked.')
+        self.week = week
+
+
+def lockedWeeks(season=None):
+    # Output: Set of the weeks (1 - 3) that are locked in the season
+    #         (defaults to the current season).
+    if season is None:
+        season = currentSeason()
+    return set(lock.week for lock in bracket.getLocks(season) if lock.is_locked)
+
+
+def lockedChange(oldSlots, oldPicked, newSlots, newPicked, locked):
+    # Checks whether going from the old picks to the new ones changes a game
+    # in one of the locked weeks.  A game changes when it is picked in one
+    # and not the other, or picked in both with different teams.
+    # Output: The first locked week with a change or None.
+    oldSlots, oldPicked = oldSlots or 0, oldPicked or 0
+    changed = (oldPicked ^ newPicked) | ((oldSlots ^ newSlots) & oldPicked & newPicked)
+    for week in sorted(locked):
+        if changed & WEEK_MASKS[week]:
+            return week
+    return None
+
+
+def checkChange(oldSlots, oldPicked, newSlots, newPicked, locked=None, season=None):
+    # Raises WeekLocked if the change touches a locked week.  The locked
+    # weeks of the season are looked up unless they are entered.
+    if locked is None:
+        locked = lockedWeeks(season)
+    week = lockedChange(oldSlots, oldPicked, newSlots, newPicked, locked)
+    if week is not None:
+        raise WeekLocked(week)
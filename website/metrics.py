@@ -0,0 +1,199 @@
+from collections import deque
+from bisect import bisect_left
+from flask import g, has_request_context, request
+from sqlalchemy import event
+import threading
+import time
+
+# Request and SQL instrumentation shown on /admin/metrics.
+#
+# Every request is timed and the queries it runs are counted and timed
+# through SQLAlchemy cursor events.  Each endpoint keeps totals and a
+# histogram of response times with fixed buckets, so recording a request is
+# a few additions under a lock and memory doesn't grow with traffic.
+# Requests and queries slower than the thresholds are logged as warnings
+# and the last few slow queries are kept for the metrics page.
+#
+# Config:
+#   METRICS                  - False turns all of it off (default True).
+#   METRICS_SLOW_REQUEST_MS  - Requests slower than this are logged.
+#   METRICS_SLOW_QUERY_MS    - Queries slower than this are logged and kept.
+
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000] # Upper bounds, plus one overflow bucket.
+SLOW_REQUEST_MS = 1000
+SLOW_QUERY_MS = 100
+SLOW_QUERIES_KEPT = 50
+
+
+class EndpointStats:
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0 # Responses with a 5xx status.
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.queries = 0
+        self.db_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, elapsed, status, queries, dbTime):
+        self.requests += 1
+        if status >= 500:
+            self.errors += 1
+        self.total_ms += elapsed
+        self.max_ms = max(self.max_ms, elapsed)
+        self.queries += queries
+        self.db_ms += dbTime
+        self.buckets[bisect_left(BUCKETS_MS, elapsed)] += 1
+
+    def percentile(self, fraction):
+        # Output: Upper bound of the bucket holding the percentile, or the
+        #         slowest request for the overflow bucket.
+        rank = fraction * self.requests
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count > 0 and seen >= rank:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else round(self.max_ms, 3)
+        return 0
+
+    def summary(self):
+        return {'requests': self.requests, 'errors': self.errors,
+                'mean_ms': round(self.total_ms / self.requests, 3),
+                'p50_ms': self.percentile(0.50), 'p95_ms': self.percentile(0.95),
+                'p99_ms': self.percentile(0.99), 'max_ms': round(self.max_ms, 3),
+                'queries_per_request': round(self.queries / self.requests, 2),
+                'db_ms_per_request': round(self.db_ms / self.requests, 3),
+                'histogram': list(self.buckets)}
+
+
+class Metrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.slow_queries = deque(maxlen=SLOW_QUERIES_KEPT)
+        self.started = time.time()
+        self.slow_request_ms = SLOW_REQUEST_MS
+        self.slow_query_ms = SLOW_QUERY_MS
+        self.logger = None # The app's logger, set by configureMetrics().
+
+    def addRequest(self, endpoint, elapsed, status, queries, dbTime):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.add(elapsed, status, queries, dbTime)
+
+    def addSlowQuery(self, endpoint, elapsed, statement):
+        with self.lock:
+            self.slow_queries.append({'endpoint': endpoint, 'ms': round(elapsed, 3),
+                                      'statement': statement, 'at': time.time()})
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+            self.slow_queries.clear()
+            self.started = time.time()
+
+
+_metrics = Metrics()
+
+
+def currentEndpoint():
+    return (request.endpoint or '(not found)') if has_request_context() else '(background)'
+
+
+def beforeCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def afterCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if not started:
+        return
+    elapsed = (time.perf_counter() - started.pop()) * 1000
+    if has_request_context() and 'metrics' in g:
+        g.metrics[1] += 1
+        g.metrics[2] += elapsed
+    if elapsed >= _metrics.slow_query_ms:
+        endpoint = currentEndpoint()
+        _metrics.logger.warning('Slow query (' + str(round(elapsed, 1)) + ' ms, ' + endpoint + '): '
+                                + ' '.join(statement.split())[:300])
+        _metrics.addSlowQuery(endpoint, elapsed, ' '.join(statement.split()))
+
+
+def handleError(context):
+    # Statements that raise never reach after_cursor_execute, so their start
+    # time is dropped here or pooled connections would keep it.
+    if context.connection is None or context.execution_context is None:
+        return
+    started = context.connection.info.get('metrics_started')
+    if started:
+        started.pop()
+
+
+def beforeRequest():
+    # [start time, queries, milliseconds in the database]
+    g.metrics = [time.perf_counter(), 0, 0.0]
+
+
+def recordRequest(status):
+    if 'metrics' not in g:
+        return
+    started, queries, dbTime = g.pop('metrics')
+    elapsed = (time.perf_counter() - started) * 1000
+    endpoint = currentEndpoint()
+    _metrics.addRequest(endpoint, elapsed, status, queries, dbTime)
+    if elapsed >= _metrics.slow_request_ms:
+        _metrics.logger.warning('Slow request (' + str(round(elapsed, 1)) + ' ms, ' + str(queries)
+                                + ' queries): ' + request.method + ' ' + request.full_path.rstrip('?'))
+
+
+def afterRequest(response):
+    # Streamed responses are timed up to the first byte.
+    recordRequest(response.status_code)
+    return response
+
+
+def teardownRequest(exception):
+    # Requests which raised never reach afterRequest.
+    if exception is not None:
+        recordRequest(500)
+
+
+def configureMetrics(app, db):
+    # Adds the request hooks and the engine events unless METRICS is False.
+    # Call after db.init_app(app).
+    app.config.setdefault('METRICS', True)
+    if not app.config['METRICS']:
+        return
+    _metrics.slow_request_ms = app.config.get('METRICS_SLOW_REQUEST_MS', SLOW_REQUEST_MS)
+    _metrics.slow_query_ms = app.config.get('METRICS_SLOW_QUERY_MS', SLOW_QUERY_MS)
+    _metrics.logger = app.logger
+    app.before_request(beforeRequest)
+    app.after_request(afterRequest)
+    app.teardown_request(teardownRequest)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', beforeCursorExecute)
+        event.listen(db.engine, 'after_cursor_execute', afterCursorExecute)
+        event.listen(db.engine, 'handle_error', handleError)
+
+
+def getMetrics():
+    # Output: Dictionary with the seconds since the last reset, the bucket
+    #         bounds, the stats of each endpoint (slowest mean first) and the
+    #         recent slow queries (newest first).
+    with _metrics.lock:
+        endpoints = [dict(endpoint=name, **stats.summary())
+                     for name, stats in _metrics.endpoints.items()]
+        slow_queries = list(reversed(_metrics.slow_queries))
+        started = _metrics.started
+    endpoints.sort(key=lambda each: each['mean_ms'], reverse=True)
+    return {'seconds': round(time.time() - started, 1), 'buckets_ms': BUCKETS_MS,
+            'slow_request_ms': _metrics.slow_request_ms, 'slow_query_ms': _metrics.slow_query_ms,
+            'endpoints': endpoints, 'slow_queries': slow_queries}
+
+
+def resetMetrics():
+    _metrics.reset()
@@ -0,0 +1,150 @@
+from sqlalchemy import inspect, text
+from . import db
+
+# Schema changes for databases created by older versions of the app.
+# db.create_all() only creates missing tables, so columns and indexes
+# added to existing tables are applied here.  Every step checks the
+# current schema first so running them on each start up is safe.
+
+
+def getColumnNames(conn, table):
+    # Output: Set of column names currently in the entered table.
+    return set(column['name'] for column in inspect(conn).get_columns(table))
+
+
+def createIndexes(conn, model):
+    # Creates any index declared on the model that is missing from the database.
+    # Unique indexes are left to the step that removes duplicate rows first.
+    for index in model.__table__.indexes:
+        if not index.unique:
+            index.create(conn, checkfirst=True)
+
+
+def addSeasonColumns(conn):
+    # Adds Matchup.season, Picks.season and Lock.season and backfills them
+    # from the year of each row's date.
+    from .models import Matchup, Picks, Lock
+
+    for model in [Matchup, Picks, Lock]:
+        table = model.__tablename__
+        if 'season' not in getColumnNames(conn, table):
+            print('Adding season column to ' + table + '...')
+            conn.execute(text('ALTER TABLE "' + table + '" ADD COLUMN season INTEGER'))
+            conn.execute(text('UPDATE "' + table + '" SET season = '
+                              'CAST(strftime(\'%Y\', date) AS INTEGER) '
+                              'WHERE season IS NULL'))
+        createIndexes(conn, model)
+
+
+def addPickSlotColumns(conn):
+    # Adds Picks.slots and Picks.picked.  Existing rows are left NULL and are
+    # converted from Picks.winners by picks.migratePicks() when first read.
+    columns = getColumnNames(conn, 'picks')
+    for column in ['slots', 'picked']:
+        if column not in columns:
+            print('Adding ' + column + ' column to picks...')
+            conn.execute(text('ALTER TABLE picks ADD COLUMN ' + column + ' INTEGER'))
+
+
+def createNewTables(conn):
+    # Creates tables added after the database was first created.
+    existing = set(inspect(conn).get_table_names())
+    db.Model.metadata.create_all(conn)
+    if 'standing' not in existing and 'picks' in existing:
+        print('Created the standing table.  Run "flask rebuild-standings" to fill it.')
+    if 'pick_count' not in existing and 'picks' in existing:
+        print('Created the pick_count table.  Run "flask rebuild-pick-counts" to fill it.')
+
+
+def addLinkIndexes(conn):
+    # Adds the Link indexes used by the roster and pool list queries.
+    from .models import Link
+    createIndexes(conn, Link)
+
+
+def makeMatchupGamesUnique(conn):
+    # Replaces the (season, game) index of Matchup with a unique one, used by
+    # the bulk team import.  When a game has more than one row the newest is
+    # kept, which is the row the bracket already used.
+    from .models import Matchup
+    indexes = dict((index['name'], index) for index in inspect(conn).get_indexes('matchup'))
+    if 'ux_matchup_season_game' in indexes:
+        return
+    print('Removing duplicate matchups...')
+    conn.execute(text('DELETE FROM matchup WHERE id NOT IN '
+                      '(SELECT MAX(id) FROM matchup GROUP BY season, game)'))
+    if 'ix_matchup_season_game' in indexes:
+        conn.execute(text('DROP INDEX ix_matchup_season_game'))
+    for index in Matchup.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def addTeamIds(conn):
+    # Adds Matchup.team1_id, team2_id and winner_id.  Existing seasons get
+    # Team rows from their Round of 64 names and every Matchup is pointed at
+    # the Team with the matching name.
+    columns = getColumnNames(conn, 'matchup')
+    if 'team1_id' in columns:
+        return
+    print('Adding team ids to matchup...')
+    for column in ['team1_id', 'team2_id', 'winner_id']:
+        conn.execute(text('ALTER TABLE matchup ADD COLUMN ' + column
+                          + ' INTEGER REFERENCES team (id)'))
+    conn.execute(text('INSERT INTO team (season, slot, name) '
+                      'SELECT season, 2*(game - 1), team1 FROM matchup WHERE game <= 32 '
+                      'UNION ALL '
+                      'SELECT season, 2*(game - 1) + 1, team2 FROM matchup WHERE game <= 32'))
+    for column in ['team1', 'team2', 'winner']:
+        conn.execute(text('UPDATE matchup SET ' + column + '_id = '
+                          '(SELECT MIN(team.id) FROM team WHERE team.season = matchup.season '
+                          'AND team.name = matchup.' + column + ')'))
+
+
+def makeLinksAndPicksUnique(conn):
+    # Replaces the (user, pool) index of Link and the (link, season) index of
+    # Picks with unique ones.  Duplicate Links are merged into the oldest,
+    # which is the one the pages used: their picks move to it for seasons it
+    # has none, everything else of theirs is deleted.  When a Link has more
+    # than one Picks row for a season the oldest is kept.
+    from .models import Link, Picks
+    if 'ux_link_user_pool' in set(index['name'] for index in inspect(conn).get_indexes('link')):
+        return
+    print('Removing duplicate links and picks...')
+    duplicate_links = ('SELECT id FROM link WHERE id NOT IN '
+                       '(SELECT MIN(id) FROM link GROUP BY user_id, pool_id)')
+    keeper = ('(SELECT MIN(keep.id) FROM link AS duplicate JOIN link AS keep '
+              'ON keep.user_id = duplicate.user_id AND keep.pool_id = duplicate.pool_id '
+              'WHERE duplicate.id = picks.link_id)')
+    oldest_picks = ('DELETE FROM picks WHERE id NOT IN '
+                    '(SELECT MIN(id) FROM picks GROUP BY link_id, season)')
+    conn.execute(text(oldest_picks))
+    moved = conn.execute(text('UPDATE picks SET link_id = ' + keeper + ' '
+                              'WHERE link_id IN (' + duplicate_links + ') AND NOT EXISTS '
+                              '(SELECT 1 FROM picks AS kept WHERE kept.season = picks.season '
+                              'AND kept.link_id = ' + keeper + ')')).rowcount
+    conn.execute(text(oldest_picks))
+    conn.execute(text('DELETE FROM picks WHERE link_id IN (' + duplicate_links + ')'))
+    conn.execute(text('DELETE FROM standing WHERE link_id IN (' + duplicate_links + ')'))
+    conn.execute(text('DELETE FROM link WHERE id IN (' + duplicate_links + ')'))
+    if moved > 0:
+        print('Moved ' + str(moved) + ' picks to other links.  Run "flask rebuild-standings" '
+              'for their seasons.')
+
+    for table, old in [('link', 'ix_link_user_pool'), ('picks', 'ix_picks_link_season')]:
+        if old in set(index['name'] for index in inspect(conn).get_indexes(table)):
+            conn.execute(text('DROP INDEX ' + old))
+    for model in [Link, Picks]:
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+# Steps are run in order.  New steps are added to the end.
+MIGRATIONS = [addSeasonColumns, addPickSlotColumns, createNewTables, addLinkIndexes,
+              makeMatchupGamesUnique, addTeamIds, makeLinksAndPicksUnique]
+
+
+def migrate(app):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            for step in MIGRATIONS:
+                step(conn)
@@ -3,6 +3,13 @@ from flask_login import UserMixin
 from sqlalchemy.sql import func
 from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy import PickleType
+from datetime import date
+
+
+def currentSeason():
+    # The season is the year of the tournament.  Every Matchup, Picks and
+    # Lock row is tagged with it so current-season lookups hit an index.
+    return date.today().year
 
 
 class Note(db.Model):
@@ -14,16 +21,36 @@ class Note(db.Model):
 class Picks(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime(timezone=True), default=func.now())
-    winners = db.Column(MutableList.as_mutable(PickleType), default=[]) # List of all winners picked
+    season = db.Column(db.Integer, default=currentSeason)
+    slots = db.Column(db.Integer, default=0) # Bit per game: set if team2 was picked (see picks.py)
+    picked = db.Column(db.Integer, default=0) # Bit per game: set once the game has been picked
+    winners = db.Column(MutableList.as_mutable(PickleType)) # Legacy list of winner names, converted on first read
     link_id = db.Column(db.Integer, db.ForeignKey('link.id'))
-    
+    __table_args__ = (db.Index('ux_picks_link_season', 'link_id', 'season', unique=True),)
+
 class Matchup(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime(timezone=True), default=func.now())
+    season = db.Column(db.Integer, default=currentSeason)
     game = db.Column(db.Integer) # 1 - 63 as shown on image in enter_teams.html
-    team1 = db.Column(db.String(100)) # Name of Team 1
-    team2 = db.Column(db.String(100)) # Name of Team 2
-    winner = db.Column(db.String(100)) # Name of winning team
+    team1_id = db.Column(db.Integer, db.ForeignKey('team.id')) # Team 1
+    team2_id = db.Column(db.Integer, db.ForeignKey('team.id')) # Team 2
+    winner_id = db.Column(db.Integer, db.ForeignKey('team.id')) # Winning team
+    team1 = db.Column(db.String(100)) # Legacy name of Team 1, replaced by team1_id
+    team2 = db.Column(db.String(100)) # Legacy name of Team 2, replaced by team2_id
+    winner = db.Column(db.String(100)) # Legacy name of winning team, replaced by winner_id
+    __table_args__ = (db.Index('ux_matchup_season_game', 'season', 'game', unique=True),)
+
+class Team(db.Model):
+    # One of the 64 teams in a season's field.  Matchups refer to teams by
+    # id so renaming a team only changes this row.
+    id = db.Column(db.Integer, primary_key=True)
+    season = db.Column(db.Integer, default=currentSeason)
+    slot = db.Column(db.Integer) # 0 - 63, position in the Round of 64 and the team code in scoring.py
+    name = db.Column(db.String(100))
+    seed = db.Column(db.Integer) # 1 - 16 or None if not entered
+    region = db.Column(db.String(50))
+    __table_args__ = (db.Index('ux_team_season_slot', 'season', 'slot', unique=True),)
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -43,6 +70,8 @@ class Link(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     pool_id = db.Column(db.Integer, db.ForeignKey('pool.id'))
     picks = db.relationship('Picks')
+    __table_args__ = (db.Index('ix_link_pool_user', 'pool_id', 'user_id'),
+                      db.Index('ux_link_user_pool', 'user_id', 'pool_id', unique=True))
     
 class Lock(db.Model):
     # Used to track when a round of picks is locked so users
@@ -51,6 +80,48 @@ class Lock(db.Model):
     # at tip off of the first game of each week.
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime(timezone=True), default=func.now())
+    season = db.Column(db.Integer, default=currentSeason)
     week = db.Column(db.Integer) # 1: Round of 64 and 32; 2: Sweet 16 and Elite 8; 3: Final 4 and Championship
     is_locked = db.Column(db.Boolean, default=False)
+    __table_args__ = (db.Index('ix_lock_season_week', 'season', 'week'),)
+
+
+class Standing(db.Model):
+    # Materialized leaderboard row for one Link in one season.  Updated with
+    # the change in points whenever an admin round commits new winners, and
+    # recalculated from scratch by `flask rebuild-standings`.
+    id = db.Column(db.Integer, primary_key=True)
+    pool_id = db.Column(db.Integer, db.ForeignKey('pool.id'))
+    link_id = db.Column(db.Integer, db.ForeignKey('link.id'))
+    season = db.Column(db.Integer, default=currentSeason)
+    round1 = db.Column(db.Integer, default=0) # Points for each round
+    round2 = db.Column(db.Integer, default=0)
+    round3 = db.Column(db.Integer, default=0)
+    round4 = db.Column(db.Integer, default=0)
+    round5 = db.Column(db.Integer, default=0)
+    round6 = db.Column(db.Integer, default=0)
+    total = db.Column(db.Integer, default=0)
+    __table_args__ = (db.Index('ix_standing_link_season', 'link_id', 'season', unique=True),
+                      db.Index('ix_standing_pool_season_total', 'pool_id', 'season', 'total'))
+
 
+class PickCount(db.Model):
+    # Number of entrants in a pool picking a team to win a game, adjusted by
+    # pickcounts.py whenever picks are saved.
+    id = db.Column(db.Integer, primary_key=True)
+    pool_id = db.Column(db.Integer) # Pool id, or 0 for the count over every pool
+    season = db.Column(db.Integer, default=currentSeason)
+    game = db.Column(db.Integer) # 1 - 63
+    team = db.Column(db.Integer) # Team code (Team.slot) picked to win the game
+    count = db.Column(db.Integer, default=0)
+    __table_args__ = (db.Index('ux_pick_count_pool_season_game_team', 'pool_id', 'season', 'game',
+                               'team', unique=True),)
+
+
+class Version(db.Model):
+    # Counter that goes up whenever something shown on a cached page
+    # changes.  Used to build the ETags of versions.py.
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(100)) # 'season:<season>', 'pool:<pool id>' or 'member:<pool id>:<user id>'
+    value = db.Column(db.Integer, default=0)
+    __table_args__ = (db.Index('ux_version_key', 'key', unique=True),)
@@ -0,0 +1,185 @@
+from .models import PickCount, currentSeason
+from .cache import LRUCache
+from .database import upsert
+from . import db
+from . import bracket
+from . import picks
+from . import scoring
+from . import standings
+from . import versions
+import time
+import numpy as np
+
+# Pick popularity.  PickCount rows hold how many entrants of a pool picked
+# each team to win each game, plus the same counts over every pool under
+# pool id 0.  They are kept up to date by:
+#   recordChanges()      - before picks are committed, adds the change in
+#                          counts between the old and new picks.
+#   applyBracketChange() - after the teams of a week's first games change
+#                          (later picks then decode to other teams),
+#                          recounts the season.
+#   rebuildPickCounts()  - recounts every row of a season (recovery).
+
+GLOBAL_POOL = 0 # pool_id of the counts over every pool.
+GLOBAL_TTL = 60 # Seconds the counts over every pool are cached for.
+CHUNK_ENTRANTS = 100000 # Entrants decoded at a time by rebuildPickCounts().
+CHUNK_ROWS = 1000 # Rows written by one statement of addCounts().
+TEAMS = 64
+
+_cache = LRUCache(8)
+
+
+def countKeys(poolIds, teams):
+    # Counts the picked teams of many entrants at once, for their pools and
+    # for GLOBAL_POOL.  Keys are (pool id * 63 + game - 1) * 64 + team code.
+    # Output: (sorted keys array, count of each key)
+    rows, columns = np.nonzero(teams >= 0)
+    codes = teams[rows, columns].astype(np.int64)
+    pool_ids = np.asarray(poolIds, dtype=np.int64)[rows]
+    keys = np.concatenate([(pool_ids*picks.GAMES + columns)*TEAMS + codes,
+                           (GLOBAL_POOL*picks.GAMES + columns)*TEAMS + codes])
+    return np.unique(keys, return_counts=True)
+
+
+def mergeKeys(keys, counts):
+    # Adds up the counts of equal keys from several countKeys() results.
+    # Output: (sorted keys array, count of each key)
+    keys = np.concatenate(keys) if len(keys) > 0 else np.zeros(0, dtype=np.int64)
+    counts = np.concatenate(counts) if len(counts) > 0 else np.zeros(0, dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    counts = counts[order]
+    unique, first = np.unique(keys, return_index=True)
+    if len(unique) == 0:
+        return unique, counts
+    return unique, np.add.reduceat(counts, first)
+
+
+def keyRows(keys, counts, season):
+    # Output: List of PickCount row dictionaries for the keys.
+    rows = []
+    for key, count in zip(keys.tolist(), counts.tolist()):
+        if count != 0:
+            rows.append({'pool_id': key // (TEAMS*picks.GAMES), 'season': season,
+                         'game': key // TEAMS % picks.GAMES + 1, 'team': key % TEAMS,
+                         'count': count})
+    return rows
+
+
+def addCounts(rows):
+    # Adds the count of each row to the matching PickCount row, creating
+    # the rows that don't exist yet.  Nothing is committed.
+    table = PickCount.__table__
+    for start in range(0, len(rows), CHUNK_ROWS):
+        upsert(PickCount, rows[start:start + CHUNK_ROWS], ['pool_id', 'season', 'game', 'team'],
+               lambda new: {'count': table.c.count + new['count']})
+
+
+def recordChanges(changes, season=None):
+    # Adjusts the counts for picks that are about to be committed.
+    # changes is a list of (pool id, old slots, old picked, new slots,
+    # new picked), use 0 and 0 for the old picks of a new Picks row.
+    if season is None:
+        season = currentSeason()
+    if len(changes) == 0:
+        return
+    snapshot = bracket.getBracket(season)
+    codes = scoring.teamCodes(snapshot)
+    columns = np.array([[int(value or 0) for value in change] for change in changes], dtype=np.int64)
+    old_keys, old_counts = countKeys(columns[:, 0],
+                                     scoring.decodeTeams(columns[:, 1], columns[:, 2], snapshot, codes))
+    new_keys, new_counts = countKeys(columns[:, 0],
+                                     scoring.decodeTeams(columns[:, 3], columns[:, 4], snapshot, codes))
+    keys, counts = mergeKeys([old_keys, new_keys], [-old_counts, new_counts])
+    addCounts(keyRows(keys, counts, season))
+
+
+def rebuildPickCounts(season=None):
+    # Recounts every PickCount row of the season from the picks.
+    # Output: Number of rows written.
+    if season is None:
+        season = currentSeason()
+    snapshot = bracket.getBracket(season)
+    codes = scoring.teamCodes(snapshot)
+    link_ids, pool_ids, slots, picked = standings.loadSeasonPicks(season)
+    keys = []
+    counts = []
+    for start in range(0, len(link_ids), CHUNK_ENTRANTS):
+        end = start + CHUNK_ENTRANTS
+        chunk_keys, chunk_counts = countKeys(pool_ids[start:end],
+                                             scoring.decodeTeams(slots[start:end], picked[start:end],
+                                                                 snapshot, codes))
+        keys.append(chunk_keys)
+        counts.append(chunk_counts)
+    rows = keyRows(*mergeKeys(keys, counts), season)
+
+    db.session.query(PickCount).filter(PickCount.season == season).delete()
+    db.session.bulk_insert_mappings(PickCount, rows)
+    versions.bumpVersions([versions.seasonKey(season)])
+    db.session.commit()
+    _cache.clear()
+    return len(rows)
+
+
+def applyBracketChange(oldSnapshot, newSnapshot):
+    # Recounts the season if the teams of any week's first games changed.
+    for gameNumber in picks.WEEK_FIRST_GAMES:
+        old = oldSnapshot.matchup(gameNumber)
+        new = newSnapshot.matchup(gameNumber)
+        old_teams = (old.team1_id, old.team2_id) if old is not None else (None, None)
+        new_teams = (new.team1_id, new.team2_id) if new is not None else (None, None)
+        if old_teams != new_teams:
+            print('Recounted ' + str(rebuildPickCounts(newSnapshot.season)) + ' pick counts.')
+            return
+
+
+def globalTag():
+    # Output: Number that changes every GLOBAL_TTL seconds, the age of the
+    #         counts over every pool shown on a page.
+    return int(time.time() // GLOBAL_TTL)
+
+
+def getCounts(poolId, season):
+    # Output: Dictionary of game number to {team code: count} for the pool.
+    counts = {}
+    for game, team, count in db.session.query(PickCount.game, PickCount.team, PickCount.count) \
+                                       .filter(PickCount.pool_id == poolId,
+                                               PickCount.season == season,
+                                               PickCount.count > 0):
+        counts.setdefault(game, {})[team] = count
+    return counts
+
+
+def getPickPopularity(poolId, season=None, weeks=None):
+    # Gets the share of the pool and of every pool picking each team to win
+    # each game.  Shares are of the entrants who picked the game.  Only games
+    # in the entered weeks (1 - 3) are included if weeks isn't None.
+    # Output: List of dictionaries with game, round and teams, a list of
+    #         dictionaries with name, pool and overall (percentages), most
+    #         picked in the pool first.
+    if season is None:
+        season = currentSeason()
+    pool_counts = getCounts(int(poolId), season)
+    key = (season, globalTag())
+    overall_counts = _cache.get(key)
+    if overall_counts is None:
+        overall_counts = getCounts(GLOBAL_POOL, season)
+        _cache.set(key, overall_counts)
+
+    names = dict((team.slot, team.name) for team in bracket.getBracket(season).teams.values())
+    popularity = []
+    for gameNumber in sorted(pool_counts.keys()):
+        if weeks is not None and picks.gameWeek(gameNumber) not in weeks:
+            continue
+        counts = pool_counts[gameNumber]
+        overall = overall_counts.get(gameNumber, {})
+        pool_total = sum(counts.values())
+        overall_total = sum(overall.values())
+        teams = []
+        for team, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+            teams.append({'name': names.get(team, ''), 'pool': 100.0*count/pool_total,
+                          'overall': 100.0*overall.get(team, 0)/overall_total if overall_total > 0 else 0.0})
+        popularity.append({'game': gameNumber,
+                           'round': scoring.ROUND_NAMES[scoring.GAME_ROUNDS[gameNumber - 1]],
+                           'teams': teams})
+    return popularity
@@ -0,0 +1,169 @@
+from flask import current_app
+from .models import Link, Picks, currentSeason
+from . import db
+from . import bracket
+from . import picks
+from . import standings
+from . import pickcounts
+from . import locks
+from collections import namedtuple
+import queue
+import threading
+import time
+
+# Optional write coalescing for pick submissions, turned on with
+# app.config['PICK_QUEUE'] = True.
+#
+# Request handlers validate the picks and call submitPicks(), which puts
+# a PickUpdate on an in-process queue and waits.  One writer thread takes
+# everything queued in the next PICK_QUEUE_INTERVAL seconds, applies it to
+# the Picks rows, refreshes their standings and commits the whole batch in
+# one transaction.  submitPicks() returns once that commit has finished.
+#
+# Updates are masks over the 63 game bits (see picks.applyUpdate) so a
+# round of make_picks and a full bracket from the API are the same kind of
+# update, and several updates to one row in a batch apply in order.
+
+INTERVAL = 0.005 # Seconds the writer waits to gather a batch.
+BATCH_SIZE = 500 # Most updates committed in one transaction.
+TIMEOUT = 30 # Seconds a request waits for its batch to commit.
+
+PickUpdate = namedtuple('PickUpdate', ['link_id', 'season', 'mask', 'slots', 'picked'])
+
+
+class Submission:
+    # A queued update and the result its request is waiting for.
+
+    def __init__(self, update):
+        self.update = update
+        self.done = threading.Event()
+        self.error = None
+
+
+class PickWriter:
+
+    def __init__(self, app):
+        self.app = app
+        self.queue = queue.Queue()
+        self.interval = app.config.get('PICK_QUEUE_INTERVAL', INTERVAL)
+        self.batch_size = app.config.get('PICK_QUEUE_BATCH_SIZE', BATCH_SIZE)
+        self.batches = 0
+        self.updates = 0
+        self.thread = threading.Thread(target=self.run, name='pick-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, update, timeout):
+        # Queues the update and waits until its batch has been committed.
+        # Raises the batch's error if the commit failed.
+        submission = Submission(update)
+        self.queue.put(submission)
+        if not submission.done.wait(timeout):
+            raise TimeoutError('Picks were not saved within ' + str(timeout) + ' seconds.')
+        if submission.error is not None:
+            raise submission.error
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0
+                                 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.write(batch)
+
+    def write(self, batch):
+        error = None
+        rejected = {}
+        with self.app.app_context():
+            try:
+                rejected = writeUpdates([submission.update for submission in batch])
+            except Exception as exception:
+                db.session.rollback()
+                print('Pick writer failed to save ' + str(len(batch)) + ' updates: '
+                      + str(exception))
+                error = exception
+            finally:
+                db.session.remove()
+        self.batches += 1
+        self.updates += len(batch)
+        for submission in batch:
+            submission.error = error or rejected.get(submission.update)
+            submission.done.set()
+
+
+def writeUpdates(updates):
+    # Applies the updates to their Picks rows and refreshes the standings of
+    # those Links, with one commit per season (batches are almost always
+    # a single season).  Updates that would change a pick in a locked week
+    # are left out.
+    # Output: Dictionary of each left out update to its WeekLocked error.
+    rejected = {}
+    for season in set(update.season for update in updates):
+        season_updates = [update for update in updates if update.season == season]
+        link_ids = list(set(update.link_id for update in season_updates))
+        rows = db.session.query(Picks).filter(Picks.link_id.in_(link_ids),
+                                              Picks.season == season).all()
+        by_link = dict((row.link_id, row) for row in rows)
+        snapshot = bracket.getBracket(season)
+        locked = locks.lockedWeeks(season)
+        old = {} # Link id: (slots, picked) before the batch.
+        for row in rows:
+            picks.migratePicks(row, snapshot)
+        for update in season_updates:
+            row = by_link.get(update.link_id)
+            slots, picked = (row.slots, row.picked) if row is not None else (0, 0)
+            week = locks.lockedChange(slots, picked,
+                                      (slots & ~update.mask) | (update.slots & update.mask),
+                                      (picked & ~update.mask) | (update.picked & update.mask), locked)
+            if week is not None:
+                rejected[update] = locks.WeekLocked(week)
+                continue
+            if row is None:
+                row = Picks(slots=0, picked=0, link_id=update.link_id, season=season)
+                db.session.add(row)
+                by_link[update.link_id] = row
+            old.setdefault(update.link_id, (row.slots or 0, row.picked or 0))
+            picks.applyUpdate(row, update.mask, update.slots, update.picked)
+        pool_ids = dict(db.session.query(Link.id, Link.pool_id).filter(Link.id.in_(link_ids)).all())
+        pickcounts.recordChanges([(pool_ids[linkId],) + old[linkId]
+                                  + (by_link[linkId].slots, by_link[linkId].picked)
+                                  for linkId in old if linkId in pool_ids], season)
+        db.session.flush()
+        standings.refreshStandings(link_ids, season)
+    return rejected
+
+
+_writers_lock = threading.Lock()
+
+
+def isEnabled():
+    return current_app.config.get('PICK_QUEUE', False)
+
+
+def getWriter():
+    # Output: The PickWriter of the current app, started on first use.
+    app = current_app._get_current_object()
+    with _writers_lock:
+        writer = app.extensions.get('pick_writer')
+        if writer is None:
+            writer = PickWriter(app)
+            app.extensions['pick_writer'] = writer
+        return writer
+
+
+def submitPicks(linkId, mask, slots, picked, season=None):
+    # Saves a pick update through the writer thread and waits for it to be
+    # committed.  Raises locks.WeekLocked if it changes a locked week and
+    # TimeoutError if the batch isn't committed within PICK_QUEUE_TIMEOUT
+    # seconds (it may still be committed later).
+    if season is None:
+        season = currentSeason()
+    update = PickUpdate(linkId, season, mask, slots & mask, picked & mask)
+    # Give the request's connection back to the pool while waiting, a burst
+    # of waiting requests could otherwise leave none for the writer.
+    db.session.close()
+    getWriter().submit(update, current_app.config.get('PICK_QUEUE_TIMEOUT', TIMEOUT))
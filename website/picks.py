@@ -0,0 +1,170 @@
+from . import db
+from . import bracket
+import numpy as np
+
+# Compact encoding of a bracket's picks.
+#
+# Each of the 63 games is stored as one bit in two integers on Picks:
+#   Picks.picked - bit (game - 1) is set once the user has picked the game.
+#   Picks.slots  - bit (game - 1) is set if the pick is the bottom team
+#                  (team2) of the game and clear for the top team (team1).
+#
+# The team in each slot comes from the bracket.  The first round of each
+# week (games 1-32, 49-56 and 61-62) takes its teams from the Matchup
+# table.  Every other game is played between the user's own picks for the
+# two games that feed into it.
+
+GAMES = 63
+ALL_GAMES = (1 << GAMES) - 1 # Mask with the bit of every game set.
+WEEK_FIRST_GAMES = set(list(range(1, 33)) + list(range(49, 57)) + [61, 62])
+
+
+def childGames(gameNumber):
+    # Gets the two games whose winners play in the entered game (33 - 63).
+    # Output: (top game, bottom game)
+    first = 2*(gameNumber - 33) + 1
+    return (first, first + 1)
+
+
+def getPick(picks, gameNumber):
+    # Output: 0 for team1, 1 for team2 or None if the game hasn't been picked.
+    bit = 1 << (gameNumber - 1)
+    if not (picks.picked or 0) & bit:
+        return None
+    return 1 if (picks.slots or 0) & bit else 0
+
+
+def applyUpdate(picks, mask, slots, picked):
+    # Replaces the picks of the games whose bit is set in mask with the
+    # entered slots and picked bits.  Other games keep their picks.
+    picks.picked = ((picks.picked or 0) & ~mask) | (picked & mask)
+    picks.slots = ((picks.slots or 0) & ~mask) | (slots & mask)
+
+
+# (game number, bit, top game, bottom game) for every game, top and bottom
+# game are None for the first round of each week.
+_DECODE_ORDER = [(gameNumber, 1 << (gameNumber - 1)) +
+                 ((None, None) if gameNumber in WEEK_FIRST_GAMES else childGames(gameNumber))
+                 for gameNumber in range(1, GAMES + 1)]
+
+
+def decodeWinners(slots, picked, snapshot):
+    # Gets the team name picked to win each game.
+    # Output: List of 63 team names.  Games that have not been picked, or
+    #         whose matchup hasn't been created yet, are 'None'.
+    winners = []
+    games = snapshot.games
+    for gameNumber, bit, top, bottom in _DECODE_ORDER:
+        if not picked & bit:
+            winners.append('None')
+        elif top is not None:
+            winners.append(winners[(bottom if slots & bit else top) - 1])
+        else:
+            matchup = games.get(gameNumber)
+            if matchup is None:
+                winners.append('None')
+            else:
+                winners.append(matchup.team2 if slots & bit else matchup.team1)
+    return winners
+
+
+def encodeWinners(winners, snapshot):
+    # Converts a list of 63 picked team names into the compact encoding.
+    # Names that aren't in the game they were picked for are dropped.
+    # Output: (slots, picked)
+    slots = 0
+    picked = 0
+    for gameNumber in range(1, min(len(winners), GAMES) + 1):
+        name = winners[gameNumber - 1]
+        if name is None or name == 'None':
+            continue
+        if gameNumber in WEEK_FIRST_GAMES:
+            matchup = snapshot.matchup(gameNumber)
+            if matchup is None:
+                continue
+            teams = (matchup.team1, matchup.team2)
+        else:
+            top, bottom = childGames(gameNumber)
+            teams = (winners[top - 1], winners[bottom - 1])
+        bit = 1 << (gameNumber - 1)
+        if name == teams[0]:
+            picked |= bit
+        elif name == teams[1]:
+            picked |= bit
+            slots |= bit
+    return (slots, picked)
+
+
+def migratePicks(picks, snapshot):
+    # Converts a Picks row saved before the compact encoding existed.  Rows
+    # are converted the first time they are read.
+    # Output: True if the row was converted and needs to be committed.
+    if picks.picked is not None:
+        return False
+    picks.slots, picks.picked = encodeWinners(picks.winners or [], snapshot)
+    picks.winners = None
+    db.session.add(picks)
+    return True
+
+
+def encodeRows(rows, season):
+    # Reads (slots, picked, winners) rows of Picks into arrays without
+    # converting them, so rows saved before the compact encoding which
+    # haven't been read yet are encoded from their winners.
+    # Output: (slots array, picked array)
+    slots = np.zeros(len(rows), dtype=np.int64)
+    picked = np.zeros(len(rows), dtype=np.int64)
+    snapshot = None
+    for i, (row_slots, row_picked, winners) in enumerate(rows):
+        if row_picked is not None:
+            slots[i], picked[i] = row_slots, row_picked
+        elif winners is not None:
+            if snapshot is None:
+                snapshot = bracket.getBracket(season)
+            slots[i], picked[i] = encodeWinners(winners, snapshot)
+    return slots, picked
+
+
+def gameWeek(gameNumber):
+    # Output: Week (1 - 3) whose Lock covers the entered game.
+    if gameNumber < 49:
+        return 1
+    if gameNumber < 61:
+        return 2
+    return 3
+
+
+def toList(slots, picked):
+    # Output: List of 63 picks, 0 for team1, 1 for team2, None if not picked.
+    return [(1 if slots & (1 << g) else 0) if picked & (1 << g) else None
+            for g in range(GAMES)]
+
+
+def fromList(values, snapshot):
+    # Converts a list of 63 picks (0, 1 or None) into the compact encoding,
+    # checking that every pick is a game of the bracket: a week's first
+    # round needs its matchup to exist and every later game needs both of
+    # the games that feed into it to be picked.
+    # Output: ((slots, picked), None) or (None, error message)
+    if not isinstance(values, list) or len(values) != GAMES:
+        return None, 'Expected a list of ' + str(GAMES) + ' picks.'
+    slots = 0
+    picked = 0
+    for gameNumber, value in enumerate(values, start=1):
+        if value is None:
+            continue
+        if value not in (0, 1) or isinstance(value, bool):
+            return None, 'Pick for game ' + str(gameNumber) + ' must be 0, 1 or null.'
+        if gameNumber in WEEK_FIRST_GAMES:
+            if snapshot.matchup(gameNumber) is None:
+                return None, 'Game ' + str(gameNumber) + ' has no matchup yet.'
+        else:
+            top, bottom = childGames(gameNumber)
+            if values[top - 1] is None or values[bottom - 1] is None:
+                return None, ('Game ' + str(gameNumber) + ' needs games ' + str(top)
+                              + ' and ' + str(bottom) + ' to be picked first.')
+        bit = 1 << (gameNumber - 1)
+        picked |= bit
+        if value:
+            slots |= bit
+    return (slots, picked), None
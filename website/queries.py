@@ -0,0 +1,154 @@
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from .models import User, Pool, Link, Picks, Matchup, Team, currentSeason
+from . import db
+from . import scoring
+from . import versions
+
+# Joined lookups for pages that list pools, pool members and picks.  Each
+# lookup runs a single indexed query no matter how many pools, members or
+# seasons there are.
+#
+# A user is linked to a pool at most once and a Link has at most one Picks
+# row per season (unique indexes ux_link_user_pool and ux_picks_link_season).
+# joinPool() and createPicks() can be called again safely.
+
+ROSTER_PAGE_SIZE = 100 # Members shown per page of a pool's roster.
+MATCHUP_PAGE_SIZE = 100 # Matchups shown per page of the admin data page.
+
+
+def getUserPools(userId):
+    # Gets every pool the entered user is linked to.
+    # Output: List of Pools ordered by id.
+    return db.session.query(Pool).join(Link, Link.pool_id == Pool.id) \
+                     .filter(Link.user_id == userId) \
+                     .order_by(Pool.id).all()
+
+
+def getLinkId(userId, poolId):
+    # Output: Id of the Link between the user and the pool or None.
+    link = db.session.query(Link.id).filter(Link.user_id == userId,
+                                            Link.pool_id == poolId).first()
+    return link[0] if link is not None else None
+
+
+def getUserPicks(userId, poolId, season=None):
+    # Output: The user's Picks for the pool in the season (defaults to the
+    #         current season) or None if they have none.
+    if season is None:
+        season = currentSeason()
+    return db.session.query(Picks).join(Link, Link.id == Picks.link_id) \
+                     .filter(Link.user_id == userId, Link.pool_id == poolId,
+                             Picks.season == season).first()
+
+
+def joinPool(userId, poolId):
+    # Links the user to the pool unless they are already in it and commits.
+    # Output: (Link id, True if the Link was created)
+    link_id = getLinkId(userId, poolId)
+    if link_id is not None:
+        return link_id, False
+    link = Link(user_id=userId, pool_id=poolId)
+    db.session.add(link)
+    try:
+        db.session.flush()
+        link_id = link.id
+        versions.bumpVersions([versions.poolKey(poolId), versions.memberKey(poolId, userId)])
+        db.session.commit()
+    except IntegrityError:
+        # The same user joined from another request first.
+        db.session.rollback()
+        return getLinkId(userId, poolId), False
+    return link_id, True
+
+
+def createPicks(linkId, season=None):
+    # Adds an empty Picks row for the Link unless it already has one for the
+    # season (defaults to the current season) and commits.
+    # Output: The Link's Picks for the season.
+    if season is None:
+        season = currentSeason()
+    user_picks = Picks(slots=0, picked=0, link_id=linkId, season=season)
+    db.session.add(user_picks)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Created by another request first.
+        db.session.rollback()
+        user_picks = db.session.query(Picks).filter(Picks.link_id == linkId,
+                                                    Picks.season == season).first()
+    return user_picks
+
+
+def isInPool(userId, poolId):
+    # Output: True if the entered user is linked to the entered pool.
+    return db.session.query(Link.id).filter(Link.user_id == userId,
+                                            Link.pool_id == poolId).first() is not None
+
+
+def getRoster(poolId, afterUserId=None, limit=ROSTER_PAGE_SIZE):
+    # Gets one page of a pool's members ordered by user id.  Pages are keyed
+    # by the last user id of the previous page rather than an offset so late
+    # pages of very large pools cost the same as the first one.
+    # Output: (list of (user id, first name), user id to pass for the next
+    #          page or None if this is the last page)
+    query = db.session.query(User.id, User.first_name) \
+                      .join(Link, Link.user_id == User.id) \
+                      .filter(Link.pool_id == poolId)
+    if afterUserId is not None:
+        query = query.filter(User.id > afterUserId)
+    if limit is None:
+        return query.order_by(User.id).all(), None
+
+    rows = query.order_by(User.id).limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1][0]
+    return rows, None
+
+
+def matchupQuery(season=None, roundNumber=None, game=None):
+    # Every Matchup with its team names, ordered by season and game (the
+    # unique index ux_matchup_season_game).  Filters that are None are
+    # left out.
+    # Output: Query of (season, game, team1, team2, winner) rows.
+    team1 = aliased(Team)
+    team2 = aliased(Team)
+    winner = aliased(Team)
+    query = db.session.query(Matchup.season, Matchup.game, team1.name.label('team1'),
+                             team2.name.label('team2'), winner.name.label('winner')) \
+                      .outerjoin(team1, team1.id == Matchup.team1_id) \
+                      .outerjoin(team2, team2.id == Matchup.team2_id) \
+                      .outerjoin(winner, winner.id == Matchup.winner_id)
+    if season is not None:
+        query = query.filter(Matchup.season == season)
+    if roundNumber is not None and 1 <= roundNumber <= len(scoring.ROUND_FIRST_GAMES):
+        last_games = scoring.ROUND_FIRST_GAMES[1:] + [64]
+        query = query.filter(Matchup.game >= scoring.ROUND_FIRST_GAMES[roundNumber - 1],
+                             Matchup.game < last_games[roundNumber - 1])
+    if game is not None:
+        query = query.filter(Matchup.game == game)
+    return query.order_by(Matchup.season, Matchup.game)
+
+
+class KeysetPage:
+    # One page of a query ordered by a unique key, read lazily.  Iterating
+    # yields at most limit rows; after that next_after is the key to pass for
+    # the next page or None if this was the last one.
+
+    def __init__(self, query, keyColumns, after=None, limit=MATCHUP_PAGE_SIZE, chunk=MATCHUP_PAGE_SIZE):
+        if after is not None:
+            query = query.filter(tuple_(*keyColumns) > tuple_(*after))
+        self.query = query.limit(limit + 1).yield_per(chunk)
+        self.key_count = len(keyColumns)
+        self.limit = limit
+        self.next_after = None
+
+    def __iter__(self):
+        last = None
+        for i, row in enumerate(self.query):
+            if i == self.limit:
+                self.next_after = tuple(last[:self.key_count])
+                break
+            last = row
+            yield row
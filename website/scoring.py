@@ -0,0 +1,109 @@
+from .models import User, Link, Picks, currentSeason
+from . import db
+from . import bracket
+from . import picks
+from sqlalchemy import and_
+import numpy as np
+
+# Scoring engine.  Every entrant in a pool is scored in one pass by turning
+# their picks into an (entrants x 63) array of team codes and comparing it
+# with the season's results.
+#
+# A team code is the team's position in the Round of 64 (Team.slot, 0 - 63):
+# the top team of game g is 2*(g-1) and the bottom team is 2*(g-1) + 1.
+# -1 means no team (game not picked or not played yet).
+
+ROUND_NAMES = ['Round of 64', 'Round of 32', 'Sweet 16', 'Elite 8', 'Final 4', 'Championship']
+ROUND_FIRST_GAMES = [1, 33, 49, 57, 61, 63]
+ROUND_POINTS = [10, 20, 40, 80, 160, 320] # Points for each correct pick in a round.
+
+# Round (0 - 5) and points of each game, indexed by game number - 1.
+GAME_ROUNDS = np.array([r for r in range(6)
+                        for g in range(ROUND_FIRST_GAMES[r],
+                                       (ROUND_FIRST_GAMES + [64])[r + 1])])
+GAME_POINTS = np.array(ROUND_POINTS)[GAME_ROUNDS]
+
+
+def teamCodes(snapshot):
+    # Output: Dictionary of team id to team code for the snapshot's season.
+    return dict((team.id, team.slot) for team in snapshot.teams.values())
+
+
+def getResults(snapshot, codes=None):
+    # Output: Array of the winning team code of each game, -1 if not played.
+    if codes is None:
+        codes = teamCodes(snapshot)
+    results = np.full(picks.GAMES, -1, dtype=np.int16)
+    for gameNumber, matchup in snapshot.games.items():
+        if matchup.winner_id is not None:
+            results[gameNumber - 1] = codes.get(matchup.winner_id, -1)
+    return results
+
+
+def bitMatrix(values):
+    # Output: (len(values) x 63) boolean array, column g-1 is bit g-1.
+    values = np.asarray(values, dtype=np.int64).reshape(-1, 1)
+    return ((values >> np.arange(picks.GAMES, dtype=np.int64)) & 1).astype(bool)
+
+
+def decodeTeams(slots, picked, snapshot, codes=None):
+    # Decodes the compact picks of many entrants at once (see picks.py).
+    # Output: (entrants x 63) array of the team code picked to win each game.
+    if codes is None:
+        codes = teamCodes(snapshot)
+    bottom = bitMatrix(slots)
+    made = bitMatrix(picked)
+    teams = np.full(bottom.shape, -1, dtype=np.int16)
+    for gameNumber in range(1, picks.GAMES + 1):
+        column = gameNumber - 1
+        if gameNumber in picks.WEEK_FIRST_GAMES:
+            matchup = snapshot.matchup(gameNumber)
+            if matchup is None:
+                continue
+            team1 = codes.get(matchup.team1_id, -1)
+            team2 = codes.get(matchup.team2_id, -1)
+        else:
+            top_game, bottom_game = picks.childGames(gameNumber)
+            team1 = teams[:, top_game - 1]
+            team2 = teams[:, bottom_game - 1]
+        teams[:, column] = np.where(made[:, column],
+                                    np.where(bottom[:, column], team2, team1), -1)
+    return teams
+
+
+def correctTeams(teams, results):
+    # Output: (entrants x 63) boolean array of the picks that match a result.
+    return (teams == results) & (results >= 0)
+
+
+def roundPoints(correct):
+    # Output: (entrants x 6) array of points per round of the correct picks.
+    return np.add.reduceat(correct * GAME_POINTS, np.array(ROUND_FIRST_GAMES) - 1, axis=1)
+
+
+def loadPoolPicks(poolId, season=None):
+    # Loads every entrant in a pool with their picks for the season in one query.
+    # Output: (list of (link id, user id, first name), slots array, picked array)
+    if season is None:
+        season = currentSeason()
+    rows = db.session.query(Link.id, User.id, User.first_name,
+                            Picks.slots, Picks.picked, Picks.winners) \
+                     .join(User, User.id == Link.user_id) \
+                     .outerjoin(Picks, and_(Picks.link_id == Link.id, Picks.season == season)) \
+                     .filter(Link.pool_id == poolId).all()
+    entrants = [(row[0], row[1], row[2]) for row in rows]
+    slots, picked = picks.encodeRows([row[3:] for row in rows], season)
+    return entrants, slots, picked
+
+
+def loadPoolTeams(poolId, season=None):
+    # Loads and decodes the picks of every entrant in a pool.
+    # Output: (list of (link id, user id, first name),
+    #          (entrants x 63) array of picked team codes, results array)
+    if season is None:
+        season = currentSeason()
+    snapshot = bracket.getBracket(season)
+    entrants, slots, picked = loadPoolPicks(poolId, season)
+    codes = teamCodes(snapshot)
+    return entrants, decodeTeams(slots, picked, snapshot, codes), getResults(snapshot, codes)
+
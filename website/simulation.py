@@ -0,0 +1,224 @@
+from .models import currentSeason
+from . import bracket
+from . import picks
+from . import scoring
+from .cache import LRUCache
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import multiprocessing
+import os
+import threading
+import numpy as np
+
+# Monte Carlo tournament simulator.  Plays out the games that don't have a
+# winner yet many times, scores every entrant of a pool against each
+# simulated bracket and counts how often each entrant finishes first and in
+# the top N.
+#
+# Simulations are run in batches as (simulations x 63) arrays of team codes
+# (see scoring.py) and large jobs are split across a ProcessPoolExecutor.
+
+# Seed of each Round of 64 position within a region, top to bottom.
+SEED_ORDER = [1, 16, 8, 9, 5, 12, 4, 13, 6, 11, 3, 14, 7, 10, 2, 15]
+
+BATCH_CELLS = 4000000 # Simulations x entrants scored at once, bounds memory per batch.
+PARALLEL_CELLS = 50000000 # Jobs smaller than this run in the calling process.
+CACHE_SIZE = 32
+
+_executor = None
+_executor_lock = threading.Lock()
+_cache = LRUCache(CACHE_SIZE)
+
+
+def seedStrengths(snapshot=None):
+    # Default team strengths from the seed of each team, 16 for a 1 seed down
+    # to 1 for a 16 seed.  Teams without a seed entered use the usual seed of
+    # their Round of 64 position.
+    # Output: Array of 64 strengths indexed by team code.
+    seeds = [SEED_ORDER[code % 16] for code in range(64)]
+    if snapshot is not None:
+        for team in snapshot.teams.values():
+            if team.seed is not None and 0 <= team.slot < 64:
+                seeds[team.slot] = team.seed
+    return np.array([17 - seed for seed in seeds], dtype=np.float64)
+
+
+def simulateResults(results, strengths, count, rng):
+    # Plays out every game without a winner.  Team a beats team b with
+    # probability strength[a] / (strength[a] + strength[b]).
+    # Output: (count x 63) array of the winning team code of each game.
+    simulated = np.empty((count, picks.GAMES), dtype=np.int16)
+    for gameNumber in range(1, picks.GAMES + 1):
+        column = gameNumber - 1
+        if results[column] >= 0:
+            simulated[:, column] = results[column]
+            continue
+        if gameNumber <= 32:
+            team1 = np.full(count, 2*column, dtype=np.int16)
+            team2 = team1 + 1
+        else:
+            top, bottom = picks.childGames(gameNumber)
+            team1 = simulated[:, top - 1]
+            team2 = simulated[:, bottom - 1]
+        strength1 = strengths[team1]
+        chance = strength1 / (strength1 + strengths[team2])
+        simulated[:, column] = np.where(rng.random(count) < chance, team1, team2)
+    return simulated
+
+
+def possibleWinners(results):
+    # Gets the (game column, team code) pairs that a simulation can produce:
+    # the winner of a decided game, or any team that can still reach an
+    # undecided one.  Only undecided games are listed.
+    # Output: List of (column, team code)
+    teams = []
+    outcomes = []
+    for gameNumber in range(1, picks.GAMES + 1):
+        column = gameNumber - 1
+        if results[column] >= 0:
+            teams.append([int(results[column])])
+            continue
+        if gameNumber <= 32:
+            teams.append([2*column, 2*column + 1])
+        else:
+            top, bottom = picks.childGames(gameNumber)
+            teams.append(teams[top - 1] + teams[bottom - 1])
+        outcomes += [(column, team) for team in teams[column]]
+    return outcomes
+
+
+class OutcomeScorer:
+    # Scores every entrant against many possible sets of results.
+    #
+    # Every (game, team) outcome that is still possible is listed with the
+    # points each entrant gets for it.  A batch of result sets is scored with
+    # one matrix product of the outcomes that happened (results x outcomes)
+    # and that table (outcomes x entrants).  Scores are small integers so
+    # float32 is exact.
+
+    def __init__(self, teams, results):
+        self.base = (((teams == results) & (results >= 0)) @ scoring.GAME_POINTS).astype(np.float32)
+        outcomes = possibleWinners(results)
+        self.columns = np.array([each[0] for each in outcomes], dtype=np.int64)
+        self.teams = np.array([each[1] for each in outcomes], dtype=np.int16)
+        self.points = ((teams[:, self.columns] == self.teams)
+                       * scoring.GAME_POINTS[self.columns]).T.astype(np.float32)
+
+    def score(self, results):
+        # Output: (result sets x entrants) array of scores.
+        happened = (results[:, self.columns] == self.teams).astype(np.float32)
+        return happened @ self.points + self.base
+
+
+def finishCounts(scores, topN):
+    # Counts first place finishes (shared equally between tied entrants) and
+    # top N finishes (every entrant tied with Nth place counts).
+    # Output: (first place array, top N array) summed over the simulations.
+    leader = scores.argmax(axis=1)
+    best = scores[np.arange(scores.shape[0]), leader][:, None]
+    leaders = scores == best
+    ties = leaders.sum(axis=1)
+    first = np.bincount(leader[ties == 1], minlength=scores.shape[1]).astype(np.float64)
+    tied = np.flatnonzero(ties > 1)
+    if len(tied) > 0:
+        simulation_rows, entrant_columns = np.nonzero(leaders[tied])
+        first += np.bincount(entrant_columns, weights=1.0 / ties[tied][simulation_rows],
+                             minlength=scores.shape[1])
+    if topN >= scores.shape[1]:
+        top = np.full(scores.shape[1], scores.shape[0], dtype=np.float64)
+    else:
+        cutoff = -np.partition(-scores, topN - 1, axis=1)[:, topN - 1:topN]
+        top = (scores >= cutoff).sum(axis=0).astype(np.float64)
+    return first, top
+
+
+def simulateBatch(task):
+    # Runs one share of the simulations.  This is a module level function so
+    # it can be sent to worker processes.
+    # Output: (first place counts, top N counts)
+    teams, results, strengths, simulations, topN, seed = task
+    rng = np.random.default_rng(seed)
+    scorer = OutcomeScorer(teams, results)
+    batch = max(1, min(simulations, BATCH_CELLS // max(1, teams.shape[0])))
+
+    first = np.zeros(teams.shape[0])
+    top = np.zeros(teams.shape[0])
+    done = 0
+    while done < simulations:
+        count = min(batch, simulations - done)
+        simulated = simulateResults(results, strengths, count, rng)
+        scores = scorer.score(simulated)
+        batch_first, batch_top = finishCounts(scores, topN)
+        first += batch_first
+        top += batch_top
+        done += count
+    return first, top
+
+
+def getExecutor():
+    # Output: The shared worker pool, started on first use.  Workers are
+    # spawned rather than forked: a fork from the threaded web process
+    # copies locks held by other threads (the database pool, the pick
+    # writer, the event broker) and can deadlock the workers.
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def simulateTeams(teams, results, simulations, topN=3, strengths=None, workers=None, seed=None):
+    # Simulates the rest of the tournament for already decoded picks.
+    # Output: (probability of first place, probability of top N) arrays.
+    if strengths is None:
+        strengths = seedStrengths()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if not (results < 0).any():
+        simulations = 1 # Every game is final, one "simulation" is exact.
+
+    cells = simulations * teams.shape[0]
+    tasks_count = workers if cells >= PARALLEL_CELLS and workers > 1 else 1
+    seeds = np.random.SeedSequence(seed).spawn(tasks_count)
+    shares = [simulations // tasks_count + (1 if i < simulations % tasks_count else 0)
+              for i in range(tasks_count)]
+    tasks = [(teams, results, strengths, shares[i], topN, seeds[i]) for i in range(tasks_count)]
+
+    if tasks_count == 1:
+        counts = [simulateBatch(tasks[0])]
+    else:
+        counts = list(getExecutor().map(simulateBatch, tasks))
+    first = sum(each[0] for each in counts)
+    top = sum(each[1] for each in counts)
+    return first / simulations, top / simulations
+
+
+def getWinProbabilities(poolId, simulations=10000, topN=3, season=None, strengths=None,
+                        workers=None, seed=None):
+    # Gets every entrant's chance of finishing first and in the top N of the
+    # pool.  Results are cached until the bracket or anyone's picks change.
+    # Output: List of dictionaries ordered by chance of first place with
+    #         link_id, user_id, first_name, first and top.
+    if season is None:
+        season = currentSeason()
+    entrants, teams, results = scoring.loadPoolTeams(poolId, season)
+    if len(entrants) == 0:
+        return []
+
+    if strengths is None:
+        strengths = seedStrengths(bracket.getBracket(season))
+
+    digest = hashlib.sha1()
+    for each in [teams, results, np.asarray(strengths, dtype=np.float64)]:
+        digest.update(each.tobytes())
+    key = (poolId, season, simulations, topN, seed, digest.hexdigest())
+    cached = _cache.get(key)
+    if cached is None:
+        first, top = simulateTeams(teams, results, simulations, topN, strengths, workers, seed)
+        cached = []
+        for i in np.argsort(-first, kind='stable'):
+            link_id, user_id, first_name = entrants[i]
+            cached.append({'link_id': link_id, 'user_id': user_id, 'first_name': first_name,
+                           'first': float(first[i]), 'top': float(top[i])})
+        _cache.set(key, cached)
+    return cached
@@ -0,0 +1,240 @@
+from .models import User, Link, Picks, Standing, currentSeason
+from . import db
+from . import bracket
+from . import picks
+from . import scoring
+from . import events
+from . import versions
+from sqlalchemy import and_, or_, case, bindparam
+import numpy as np
+
+# Materialized standings.  Standing rows are kept up to date by:
+#   applyBracketChange() - after an admin round commits, adds the change in
+#                          points for the games that changed.
+#   refreshStandings()   - after users save picks, recalculates their rows.
+#   rebuildStandings()   - recalculates every row of a season (recovery).
+
+ROUND_COLUMNS = ['round1', 'round2', 'round3', 'round4', 'round5', 'round6']
+LEADERBOARD_PAGE_SIZE = 100 # Entrants shown per page of a pool's leaderboard.
+
+
+def loadSeasonPicks(season, linkIds=None):
+    # Loads the picks of every Link with Picks in the season (or just the
+    # entered Links) with one query.
+    # Output: (link ids array, pool ids array, slots array, picked array)
+    query = db.session.query(Link.id, Link.pool_id, Picks.slots, Picks.picked, Picks.winners) \
+                      .join(Picks, Picks.link_id == Link.id) \
+                      .filter(Picks.season == season)
+    if linkIds is not None:
+        query = query.filter(Link.id.in_(linkIds))
+    rows = query.all()
+
+    link_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    pool_ids = np.array([row[1] for row in rows], dtype=np.int64)
+    slots, picked = picks.encodeRows([row[2:] for row in rows], season)
+    return link_ids, pool_ids, slots, picked
+
+
+def correctPicks(slots, picked, snapshot):
+    # Output: (entrants x 63) boolean array of correct picks.
+    codes = scoring.teamCodes(snapshot)
+    return scoring.correctTeams(scoring.decodeTeams(slots, picked, snapshot, codes),
+                                scoring.getResults(snapshot, codes))
+
+
+def standingRow(linkId, poolId, season, points):
+    row = {'link_id': int(linkId), 'pool_id': int(poolId), 'season': season,
+           'total': int(points.sum())}
+    for column, value in zip(ROUND_COLUMNS, points):
+        row[column] = int(value)
+    return row
+
+
+def affectedGames(oldSnapshot, newSnapshot):
+    # Gets the games whose score can change between two snapshots: games
+    # with a different winner, plus games with different teams and every
+    # later game fed by them (those picks decode to different teams).
+    # Output: Boolean array indexed by game number - 1.
+    affected = np.zeros(picks.GAMES, dtype=bool)
+    moved = np.zeros(picks.GAMES, dtype=bool)
+    for gameNumber in range(1, picks.GAMES + 1):
+        old = oldSnapshot.matchup(gameNumber)
+        new = newSnapshot.matchup(gameNumber)
+        old_teams = (old.team1_id, old.team2_id) if old is not None else (None, None)
+        new_teams = (new.team1_id, new.team2_id) if new is not None else (None, None)
+        if gameNumber not in picks.WEEK_FIRST_GAMES:
+            top, bottom = picks.childGames(gameNumber)
+            moved[gameNumber - 1] = moved[top - 1] or moved[bottom - 1]
+        elif old_teams != new_teams:
+            moved[gameNumber - 1] = True
+        old_winner = old.winner_id if old is not None else None
+        new_winner = new.winner_id if new is not None else None
+        affected[gameNumber - 1] = moved[gameNumber - 1] or old_winner != new_winner
+    return affected
+
+
+def applyBracketChange(oldSnapshot, newSnapshot):
+    # Updates the season's Standing rows after Matchup rows changed.  Only
+    # the games that changed are scored and only rows whose points changed
+    # are written.  Links without a Standing row get a full row inserted.
+    season = newSnapshot.season
+    affected = affectedGames(oldSnapshot, newSnapshot)
+    if not affected.any():
+        return
+
+    link_ids, pool_ids, slots, picked = loadSeasonPicks(season)
+    if len(link_ids) == 0:
+        return
+    old_correct = correctPicks(slots, picked, oldSnapshot)
+    new_correct = correctPicks(slots, picked, newSnapshot)
+    delta = scoring.roundPoints((new_correct & affected).astype(np.int64)
+                        - (old_correct & affected).astype(np.int64))
+
+    existing = set(each[0] for each in db.session.query(Standing.link_id)
+                                               .filter(Standing.season == season).all())
+    new_rows = []
+    updates = []
+    changed = []
+    full_points = scoring.roundPoints(new_correct)
+    for i in range(len(link_ids)):
+        if int(link_ids[i]) not in existing:
+            new_rows.append(standingRow(link_ids[i], pool_ids[i], season, full_points[i]))
+            changed.append(i)
+        elif delta[i].any():
+            changed.append(i)
+            update = {'b_link_id': int(link_ids[i]), 'b_season': season,
+                      'b_total': int(delta[i].sum())}
+            for column, value in zip(ROUND_COLUMNS, delta[i]):
+                update['b_' + column] = int(value)
+            updates.append(update)
+
+    if len(updates) > 0:
+        table = Standing.__table__
+        values = {'total': table.c.total + bindparam('b_total')}
+        for column in ROUND_COLUMNS:
+            values[column] = table.c[column] + bindparam('b_' + column)
+        db.session.execute(table.update()
+                                .where(and_(table.c.link_id == bindparam('b_link_id'),
+                                            table.c.season == bindparam('b_season')))
+                                .values(values), updates)
+    if len(new_rows) > 0:
+        db.session.bulk_insert_mappings(Standing, new_rows)
+    versions.bumpVersions([versions.seasonKey(season)])
+    db.session.commit()
+    print('Updated ' + str(len(updates)) + ' and added ' + str(len(new_rows)) + ' standings.')
+    publishStandings(season, link_ids[changed], pool_ids[changed], full_points[changed])
+
+
+def publishStandings(season, linkIds, poolIds, points):
+    # Sends a standings event to each pool with rows that changed.  Rows are
+    # [link id, points per round, total].
+    by_pool = {}
+    for i in range(len(linkIds)):
+        by_pool.setdefault(int(poolIds[i]), []).append(
+            [int(linkIds[i]), [int(value) for value in points[i]], int(points[i].sum())])
+    for poolId, rows in by_pool.items():
+        events.publish('standings', {'season': season, 'rows': rows}, poolId)
+
+
+def refreshStanding(linkId, season=None):
+    # Recalculates the Standing row of one Link after its picks change.
+    refreshStandings([linkId], season)
+
+
+def refreshStandings(linkIds, season=None):
+    # Recalculates the Standing rows of the entered Links after their picks
+    # change and commits them (with anything else pending in the session).
+    # Only rows that are new or whose points changed are published.
+    if season is None:
+        season = currentSeason()
+    link_ids, pool_ids, slots, picked = loadSeasonPicks(season, linkIds)
+    changed = np.zeros(len(link_ids), dtype=bool)
+    if len(link_ids) > 0:
+        points = scoring.roundPoints(correctPicks(slots, picked, bracket.getBracket(season)))
+        rows = db.session.query(Standing).filter(Standing.link_id.in_(linkIds),
+                                                 Standing.season == season).all()
+        existing = dict((standing.link_id, standing) for standing in rows)
+        for i in range(len(link_ids)):
+            standing = existing.get(int(link_ids[i]))
+            if standing is None:
+                standing = Standing()
+                db.session.add(standing)
+            for key, value in standingRow(link_ids[i], pool_ids[i], season, points[i]).items():
+                if getattr(standing, key) != value:
+                    setattr(standing, key, value)
+                    changed[i] = True
+    versions.bumpLinks(linkIds)
+    db.session.commit()
+    if changed.any():
+        publishStandings(season, link_ids[changed], pool_ids[changed], points[changed])
+
+
+def rebuildStandings(season=None):
+    # Recalculates every Standing row of the season from the picks and results.
+    # Output: Number of rows written.
+    if season is None:
+        season = currentSeason()
+    link_ids, pool_ids, slots, picked = loadSeasonPicks(season)
+    rows = []
+    if len(link_ids) > 0:
+        points = scoring.roundPoints(correctPicks(slots, picked, bracket.getBracket(season)))
+        for i in range(len(link_ids)):
+            rows.append(standingRow(link_ids[i], pool_ids[i], season, points[i]))
+
+    db.session.query(Standing).filter(Standing.season == season).delete()
+    db.session.bulk_insert_mappings(Standing, rows)
+    versions.bumpVersions([versions.seasonKey(season)])
+    db.session.commit()
+    return len(rows)
+
+
+def getStandings(poolId, season=None, after=None, limit=LEADERBOARD_PAGE_SIZE):
+    # Gets one page of the pool's leaderboard from the Standing table, ordered
+    # by total (highest first) and then link id.  Pages are keyed by the
+    # (total, link id) of the last row of the previous page so they read a
+    # range of ix_standing_pool_season_total however far down they are.
+    # Members without picks this season have no Standing row and aren't listed.
+    # Output: (list of dictionaries with link_id, user_id, first_name,
+    #          rounds (points per round), total, rank and position, (total, link id)
+    #          to pass for the next page or None if this is the last page)
+    if season is None:
+        season = currentSeason()
+    columns = [getattr(Standing, column) for column in ROUND_COLUMNS]
+    in_pool = and_(Standing.pool_id == poolId, Standing.season == season)
+    query = db.session.query(Link.id, User.id, User.first_name, Standing.total, *columns) \
+                      .join(Link, Link.id == Standing.link_id) \
+                      .join(User, User.id == Link.user_id) \
+                      .filter(in_pool)
+    if after is not None:
+        after_total, after_link = after
+        query = query.filter(or_(Standing.total < after_total,
+                                    and_(Standing.total == after_total,
+                                         Standing.link_id > after_link)))
+    rows = query.order_by(Standing.total.desc(), Standing.link_id).limit(limit + 1).all()
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = (rows[-1][3], rows[-1][0])
+    if len(rows) == 0:
+        return [], None
+
+    # Ranks continue from the rows on earlier pages, ties share the best rank.
+    rank, position = 1, 1
+    if after is not None:
+        first_total, first_link = rows[0][3], rows[0][0]
+        above = db.session.query(db.func.count(Standing.id),
+                                 db.func.sum(case((Standing.total > first_total, 1), else_=0))) \
+                          .filter(in_pool, or_(Standing.total > first_total,
+                                                  and_(Standing.total == first_total,
+                                                       Standing.link_id < first_link))).one()
+        position = above[0] + 1
+        rank = (above[1] or 0) + 1
+
+    leaderboard = []
+    for i, row in enumerate(rows):
+        if i > 0 and row[3] != rows[i - 1][3]:
+            rank = position + i
+        leaderboard.append({'link_id': row[0], 'user_id': row[1], 'first_name': row[2],
+                            'rounds': list(row[4:]), 'total': row[3], 'rank': rank,
+                            'position': position + i})
+    return leaderboard, next_after
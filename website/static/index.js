@@ -6,3 +6,169 @@ function deleteNote(noteId) {
     window.location.href = "/";
   });
 }
+
+// One page bracket (bracket.html).  The bracket and the user's picks are
+// loaded with one request to /api/pools/<id>/bracket and all 63 picks are
+// saved with one POST to /api/pools/<id>/picks.  A pick is 0 for team1,
+// 1 for team2 or null.
+
+const WEEK_FIRST_GAMES = new Set(
+  [...Array(32).keys()].map((i) => i + 1)
+    .concat([49, 50, 51, 52, 53, 54, 55, 56, 61, 62])
+);
+let bracketState = null;
+
+function gameWeek(game) {
+  return game < 49 ? 1 : game < 61 ? 2 : 3;
+}
+
+function childGames(game) {
+  const first = 2 * (game - 33) + 1;
+  return [first, first + 1];
+}
+
+function bracketTeams(game) {
+  // Teams of a game: from the matchup for the first round of each week,
+  // otherwise the user's winners of the two games that feed into it.
+  if (WEEK_FIRST_GAMES.has(game)) {
+    const matchup = bracketState.matchups[game];
+    return matchup ? [matchup[1], matchup[2]] : [null, null];
+  }
+  return childGames(game).map((child) => bracketWinner(child));
+}
+
+function bracketWinner(game) {
+  const pick = bracketState.picks[game - 1];
+  return pick === null ? null : bracketTeams(game)[pick];
+}
+
+function clearLaterPicks(game) {
+  // A changed pick changes the teams of every later game it feeds.
+  for (let later = 33; later <= 63; later++) {
+    if (WEEK_FIRST_GAMES.has(later)) continue;
+    const [top, bottom] = childGames(later);
+    if ((top === game || bottom === game) && bracketState.picks[later - 1] !== null) {
+      bracketState.picks[later - 1] = null;
+      clearLaterPicks(later);
+    }
+  }
+}
+
+function pickTeam(game, slot) {
+  if (bracketState.picks[game - 1] !== slot) {
+    bracketState.picks[game - 1] = slot;
+    clearLaterPicks(game);
+  }
+  renderBracket();
+}
+
+function renderBracket() {
+  const element = document.getElementById("bracket");
+  const names = element.dataset.roundNames.split("|");
+  const firsts = element.dataset.roundFirstGames.split(",").map(Number).concat([64]);
+  let html = "";
+  for (let round = 0; round < names.length; round++) {
+    html += "<h3>" + names[round] + "</h3>";
+    for (let game = firsts[round]; game < firsts[round + 1]; game++) {
+      const teams = bracketTeams(game);
+      const disabled = bracketState.locked.includes(gameWeek(game)) ? " disabled" : "";
+      html += "<h4>Game " + game + "</h4>";
+      teams.forEach((team, slot) => {
+        if (team === null) return;
+        const checked = bracketState.picks[game - 1] === slot ? " checked" : "";
+        const id = "game" + game + "team" + (slot + 1);
+        html += '<input type="radio" id="' + id + '" name="game' + game + '"' + checked + disabled +
+          ' onchange="pickTeam(' + game + ", " + slot + ')">' +
+          '<label for="' + id + '">&nbsp ' + escapeHtml(team) + "</label><br>";
+      });
+    }
+  }
+  element.innerHTML = html;
+}
+
+function escapeHtml(text) {
+  const div = document.createElement("div");
+  div.textContent = text;
+  return div.innerHTML;
+}
+
+function loadBracket() {
+  const element = document.getElementById("bracket");
+  fetch("/api/pools/" + element.dataset.poolId + "/bracket")
+    .then((res) => res.json())
+    .then((data) => {
+      const matchups = {};
+      data.matchups.forEach((matchup) => (matchups[matchup[0]] = matchup));
+      bracketState = { matchups: matchups, picks: data.picks, locked: data.locked };
+      renderBracket();
+    });
+}
+
+function saveBracket() {
+  const element = document.getElementById("bracket");
+  const status = document.getElementById("bracketStatus");
+  fetch("/api/pools/" + element.dataset.poolId + "/picks", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ picks: bracketState.picks }),
+  })
+    .then((res) => res.json())
+    .then((data) => {
+      if (data.error) {
+        status.textContent = data.error;
+      } else {
+        bracketState.picks = data.picks;
+        status.textContent = "Picks saved!";
+      }
+    });
+}
+
+if (document.getElementById("bracket")) {
+  loadBracket();
+}
+
+// Live updates on view_pool.html from the /pool-events stream.  Standings
+// events update the leaderboard rows in place and re-rank them, results
+// events list the latest winners above the table.
+
+function updateLeaderboard(rows) {
+  const body = document.getElementById("leaderboard");
+  rows.forEach(([linkId, rounds, total]) => {
+    const row = body.querySelector('tr[data-link-id="' + linkId + '"]');
+    if (!row) return;
+    row.querySelectorAll("td.round").forEach((cell, i) => (cell.textContent = rounds[i]));
+    row.querySelector("td.total").textContent = total;
+  });
+
+  // Competition ranking, ties share the best rank (1, 2, 2, 4).  Later
+  // pages of the leaderboard start at the position of their first row.
+  const firstPosition = Number(body.dataset.firstPosition || 1);
+  const ordered = Array.from(body.querySelectorAll("tr")).sort(
+    (a, b) => Number(b.querySelector("td.total").textContent) - Number(a.querySelector("td.total").textContent)
+  );
+  let lastTotal = null;
+  let rank = 0;
+  ordered.forEach((row, i) => {
+    const total = Number(row.querySelector("td.total").textContent);
+    if (total !== lastTotal) {
+      rank = firstPosition + i;
+      lastTotal = total;
+    }
+    row.querySelector("td.rank").textContent = rank;
+    body.appendChild(row);
+  });
+}
+
+function showResults(games) {
+  const element = document.getElementById("liveResults");
+  element.textContent = "Latest results: " + games
+    .map(([game, winner]) => "Game " + game + " - " + (winner === null ? "not final" : winner))
+    .join(", ");
+}
+
+const liveResults = document.getElementById("liveResults");
+if (liveResults && window.EventSource) {
+  const source = new EventSource(liveResults.dataset.eventsUrl);
+  source.addEventListener("standings", (event) => updateLeaderboard(JSON.parse(event.data).rows));
+  source.addEventListener("results", (event) => showResults(JSON.parse(event.data).games));
+}
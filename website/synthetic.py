@@ -0,0 +1,222 @@
+from werkzeug.security import generate_password_hash
+from .models import User, Pool, Link, Picks, Matchup, Team, Lock, currentSeason
+from . import db
+from . import bracket
+from . import picks
+from . import scoring
+from . import simulation
+from . import standings
+from . import pickcounts
+from . import versions
+import string
+import time
+import numpy as np
+
+# Synthetic data for scaling tests, loaded with `flask generate-data`.
+#
+# Fills an empty database with users, pools, links and several seasons of
+# teams, matchups, locks and picks.  Every value comes from one numpy
+# generator so the same options and seed give the same database.  Rows are
+# written with executemany INSERTs of CHUNK rows and explicit ids, so no ids
+# have to be read back.
+#
+# Results are played out with the seed strengths of simulation.py.  Users
+# pick each week after the previous week's results are in (like the real
+# make_picks pages) from the same model with the strengths raised to
+# PICK_CHALK, so brackets favour the higher seed more often than the
+# results do but still have upsets.
+
+CHUNK = 10000 # Rows per INSERT.
+PICKS_CHUNK = 100000 # Links whose picks are simulated at once.
+PICK_CHALK = 2.0 # Strength exponent for picks, above 1 picks favourites more often.
+PAST_PARTICIPATION = 0.85 # Chance that a link has picks in a past season.
+EXTRA_POOL_CHANCE = 0.4 # Chance that a user joins one more pool, repeated.
+MAX_POOLS_PER_USER = 5
+PASSWORD = 'password' # Every generated user has this password.
+
+REGIONS = ['East', 'West', 'South', 'Midwest']
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Casey', 'Morgan', 'Riley', 'Jamie',
+               'Avery', 'Quinn', 'Drew', 'Reese', 'Cameron', 'Parker', 'Hayden', 'Rowan']
+WEEK_GAMES = [(1, 48), (49, 60), (61, 63)] # First and last game picked in each week.
+
+
+def insertRows(model, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(model.__table__.insert(), rows[start:start + CHUNK])
+
+
+def resetSequences(models):
+    # PostgreSQL sequences don't see explicit ids, move them past the rows.
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in models:
+        table = model.__table__.name
+        db.session.execute("SELECT setval(pg_get_serial_sequence('\"" + table + "\"', 'id'), "
+                           "COALESCE((SELECT MAX(id) FROM \"" + table + "\"), 1))")
+
+
+def generateMembers(users, pools, rng):
+    # Pools get a heavy tailed share of the members (a few big office pools,
+    # many small ones) and each user joins one pool plus a few more by chance.
+    # Output: (link user ids array, link pool ids array) ordered by user.
+    extra = np.minimum(rng.geometric(1 - EXTRA_POOL_CHANCE, size=users) - 1,
+                       MAX_POOLS_PER_USER - 1)
+    link_users = np.repeat(np.arange(1, users + 1), 1 + extra)
+    weights = rng.pareto(1.2, size=pools) + 1
+    link_pools = rng.choice(np.arange(1, pools + 1), size=len(link_users), p=weights / weights.sum())
+    # A user can only be in a pool once.
+    pairs = np.unique(link_users * (pools + 1) + link_pools)
+    return pairs // (pools + 1), pairs % (pools + 1)
+
+
+def playedResults(strengths, played, rng):
+    # Output: Array of 63 winning team codes, -1 for games in rounds after
+    #         the entered number of played rounds.
+    results = simulation.simulateResults(np.full(picks.GAMES, -1, dtype=np.int16),
+                                         strengths, 1, rng)[0]
+    results[scoring.GAME_ROUNDS >= played] = -1
+    return results
+
+
+def openWeeks(played):
+    # Output: Weeks (0 - 2) whose first games have their teams after the
+    #         entered number of played rounds.
+    return [week for week in range(3) if played >= 2 * week]
+
+
+def generatePicks(results, weeks, count, strengths, rng):
+    # Simulates count brackets, one week at a time with the earlier weeks'
+    # results fixed, and encodes them like picks.py.
+    # Output: (slots array, picked array)
+    slots = np.zeros(count, dtype=np.int64)
+    picked = 0
+    for week in weeks:
+        first, last = WEEK_GAMES[week]
+        fixed = np.where(np.arange(picks.GAMES) < first - 1, results, -1).astype(np.int16)
+        simulated = simulation.simulateResults(fixed, strengths, count, rng)
+        for gameNumber in range(first, last + 1):
+            column = gameNumber - 1
+            if gameNumber <= 32:
+                team2 = 2*column + 1
+            else:
+                team2 = simulated[:, picks.childGames(gameNumber)[1] - 1]
+            slots |= (simulated[:, column] == team2).astype(np.int64) << column
+            picked |= 1 << column
+    return slots, np.full(count, picked, dtype=np.int64)
+
+
+def seasonRows(season, results, teamId, matchupId, lockId):
+    # Output: (Team rows, Matchup rows, Lock rows) of the season.
+    teams = []
+    for slot in range(64):
+        region = REGIONS[slot // 16]
+        seed = simulation.SEED_ORDER[slot % 16]
+        teams.append({'id': teamId + slot, 'season': season, 'slot': slot, 'seed': seed,
+                      'region': region, 'name': region + ' ' + str(seed) + ' seed'})
+
+    matchups = []
+    for gameNumber in range(1, picks.GAMES + 1):
+        if gameNumber <= 32:
+            team1, team2 = 2*(gameNumber - 1), 2*gameNumber - 1
+        else:
+            top, bottom = picks.childGames(gameNumber)
+            team1, team2 = results[top - 1], results[bottom - 1]
+            if team1 < 0 or team2 < 0:
+                continue
+        winner = results[gameNumber - 1]
+        matchups.append({'id': matchupId + len(matchups), 'season': season, 'game': gameNumber,
+                         'team1_id': teamId + int(team1), 'team2_id': teamId + int(team2),
+                         'winner_id': teamId + int(winner) if winner >= 0 else None})
+
+    # A week is locked once any of its games has a result.
+    locks = [{'id': lockId + week, 'season': season, 'week': week + 1,
+              'is_locked': bool((results[first - 1:last] >= 0).any())}
+             for week, (first, last) in enumerate(WEEK_GAMES)]
+    return teams, matchups, locks
+
+
+def generateData(users, pools, seasons=2, played=0, seed=0, rebuild=True):
+    # Fills an empty database with synthetic data: the entered number of
+    # users and pools, the entered number of complete past seasons and the
+    # current season with the entered number of rounds (0 - 6) played.
+    # User 1 is admin@example.com with is_admin set.
+    # Output: Dictionary of the number of rows written per table.
+    if users > 0 and pools < 1:
+        raise ValueError('generate-data needs at least one pool for its users.')
+    for model in [User, Pool, Link, Picks, Matchup, Team, Lock]:
+        if db.session.query(model.id).first() is not None:
+            raise ValueError('The database already has ' + model.__tablename__
+                             + ' rows, generate-data needs an empty database.')
+    rng = np.random.default_rng(seed)
+    counts = {}
+    started = time.perf_counter()
+
+    def progress(table, count):
+        counts[table] = counts.get(table, 0) + count
+        print('%-8s %9d rows  %7.1f s' % (table, counts[table], time.perf_counter() - started))
+
+    password = generate_password_hash(PASSWORD, method='sha256')
+    names = rng.integers(0, len(FIRST_NAMES), size=users)
+    rows = [{'id': i, 'email': 'user' + str(i) + '@example.com', 'password': password,
+             'first_name': FIRST_NAMES[names[i - 1]] + ' ' + str(i), 'is_admin': False}
+            for i in range(1, users + 1)]
+    if users > 0:
+        rows[0].update(email='admin@example.com', is_admin=True)
+    insertRows(User, rows)
+    progress('user', len(rows))
+
+    characters = np.array(list(string.ascii_uppercase + string.digits))
+    codes = rng.integers(0, len(characters), size=(pools, 12))
+    rows = [{'id': i + 1, 'pool_name': 'Pool ' + str(i + 1), 'password': ''.join(characters[codes[i]])}
+            for i in range(pools)]
+    insertRows(Pool, rows)
+    progress('pool', len(rows))
+
+    link_users, link_pools = generateMembers(users, pools, rng)
+    link_ids = np.arange(1, len(link_users) + 1)
+    insertRows(Link, [{'id': int(link_ids[i]), 'user_id': int(link_users[i]),
+                       'pool_id': int(link_pools[i])} for i in range(len(link_ids))])
+    progress('link', len(link_ids))
+    db.session.commit()
+
+    strengths = simulation.seedStrengths()
+    pick_strengths = strengths ** PICK_CHALK
+    current = currentSeason()
+    ids = {'team': 1, 'matchup': 1, 'lock': 1, 'picks': 1}
+    for season in range(current - seasons, current + 1):
+        rounds_played = 6 if season < current else played
+        results = playedResults(strengths, rounds_played, rng)
+        teams, matchups, locks = seasonRows(season, results, ids['team'], ids['matchup'], ids['lock'])
+        insertRows(Team, teams)
+        insertRows(Matchup, matchups)
+        insertRows(Lock, locks)
+        ids['team'] += len(teams)
+        ids['matchup'] += len(matchups)
+        ids['lock'] += len(locks)
+        progress('team', len(teams))
+        progress('matchup', len(matchups))
+
+        if season < current:
+            entered = link_ids[rng.random(len(link_ids)) < PAST_PARTICIPATION]
+        else:
+            entered = link_ids
+        for start in range(0, len(entered), PICKS_CHUNK):
+            chunk = entered[start:start + PICKS_CHUNK]
+            slots, picked = generatePicks(results, openWeeks(rounds_played), len(chunk),
+                                          pick_strengths, rng)
+            insertRows(Picks, [{'id': ids['picks'] + i, 'season': season, 'link_id': int(chunk[i]),
+                                'slots': int(slots[i]), 'picked': int(picked[i])}
+                               for i in range(len(chunk))])
+            ids['picks'] += len(chunk)
+            progress('picks', len(chunk))
+        versions.bumpVersions([versions.seasonKey(season)])
+        db.session.commit()
+        bracket.invalidateBracket(season)
+
+        if rebuild:
+            progress('standing', standings.rebuildStandings(season))
+            progress('pick_count', pickcounts.rebuildPickCounts(season))
+
+    resetSequences([User, Pool, Link, Picks, Matchup, Team, Lock])
+    db.session.commit()
+    return counts
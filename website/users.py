@@ -0,0 +1,50 @@
+from collections import namedtuple
+from flask_login import UserMixin
+from .models import User
+from .cache import LRUCache
+from . import db
+
+# Cached user loader for Flask-Login.  Every authenticated request loads the
+# current user, so the few columns pages use are kept in memory as a
+# UserRecord.  Anything that writes a User row must call invalidateUser().
+
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 300 # Seconds, bounds how stale a user can be across processes.
+
+_cache = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+class UserRecord(UserMixin, namedtuple('UserRecord', ['id', 'is_admin', 'email', 'first_name'])):
+    # Read only copy of a User row.  Use the User model to make changes.
+    __slots__ = ()
+
+
+def loadUser(userId):
+    # Output: UserRecord for the entered id or None if there is no such user.
+    userId = int(userId)
+    record = _cache.get(userId)
+    if record is None:
+        row = db.session.query(User.id, User.is_admin, User.email, User.first_name) \
+                        .filter(User.id == userId).first()
+        if row is None:
+            return None
+        record = UserRecord(*row)
+        _cache.set(userId, record)
+    return record
+
+
+def invalidateUser(userId):
+    # Drops the cached copy of the user after their User row changes.
+    _cache.delete(int(userId))
+
+
+def configureUserCache(app):
+    # Applies USER_CACHE_SIZE and USER_CACHE_TTL from the app config.
+    _cache.maxsize = app.config.get('USER_CACHE_SIZE', USER_CACHE_SIZE)
+    _cache.ttl = app.config.get('USER_CACHE_TTL', USER_CACHE_TTL)
+    _cache.clear()
+
+
+def getUserCacheStats():
+    # Output: Dictionary of hits, misses and size of the user cache.
+    return _cache.stats()
@@ -0,0 +1,111 @@
+from flask import Response, current_app, make_response, request, session
+from .models import Link, Version, currentSeason
+from .database import upsert
+from . import db
+import hashlib
+import os
+
+# Conditional GETs for the pool, picks and bracket pages.
+#
+# Version rows count the changes to what those pages show:
+#   season:<season>          - teams, results and locks of a season
+#   pool:<pool id>           - members, picks and standings of a pool
+#   member:<pool id>:<user>  - one member's picks in a pool
+# Writes call bumpVersions() (or bumpLinks()) before their commit so the
+# counters change in the same transaction as the rows.  A page's ETag is a
+# hash of the counters it depends on, the current user and the URL, so a
+# request whose If-None-Match matches gets a 304 after reading only the
+# counters.
+
+_build_tag = None
+
+
+def seasonKey(season=None):
+    if season is None:
+        season = currentSeason()
+    return 'season:' + str(int(season))
+
+
+def poolKey(poolId):
+    return 'pool:' + str(int(poolId))
+
+
+def memberKey(poolId, userId):
+    return 'member:' + str(int(poolId)) + ':' + str(int(userId))
+
+
+def bumpVersions(keys):
+    # Adds 1 to the counter of each key, starting new keys at 1.  Nothing is
+    # committed, call this before the commit of the change.
+    keys = sorted(set(keys))
+    if len(keys) == 0:
+        return
+    table = Version.__table__
+    upsert(Version, [{'key': key, 'value': 1} for key in keys], ['key'],
+           lambda new: {'value': table.c.value + 1})
+
+
+def bumpLinks(linkIds):
+    # Bumps the pool and member counters of the entered Links after their
+    # picks change.
+    if len(linkIds) == 0:
+        return
+    keys = []
+    for pool_id, user_id in db.session.query(Link.pool_id, Link.user_id) \
+                                      .filter(Link.id.in_([int(each) for each in linkIds])):
+        keys += [poolKey(pool_id), memberKey(pool_id, user_id)]
+    bumpVersions(keys)
+
+
+def getVersions(keys):
+    # Gets the counters of the entered keys with one query.
+    # Output: List of counters in the order of keys, 0 for keys never bumped.
+    values = dict(db.session.query(Version.key, Version.value).filter(Version.key.in_(keys)).all())
+    return [values.get(key, 0) for key in keys]
+
+
+def getBuildTag():
+    # Output: String that changes when the templates change, so pages cached
+    # before a deploy aren't reused after it.
+    global _build_tag
+    if _build_tag is None:
+        digest = hashlib.sha1()
+        for directory, names, files in sorted(os.walk(os.path.join(current_app.root_path, 'templates'))):
+            for name in sorted(files):
+                path = os.path.join(directory, name)
+                digest.update((path + ':' + str(os.stat(path).st_mtime_ns)).encode())
+        _build_tag = digest.hexdigest()
+    return _build_tag
+
+
+def pageEtag(keys, user, *extra):
+    # Gets the ETag of the current request's page for the user.  Anything
+    # else the page depends on is passed in extra.
+    # Output: ETag string or None if the page can't be cached (a flashed
+    #         message is waiting to be shown).
+    if '_flashes' in session:
+        return None
+    parts = [getBuildTag(), request.full_path, str(user.id), str(user.is_admin), str(user.first_name)]
+    parts += [str(each) for each in extra]
+    parts += [key + '=' + str(value) for key, value in zip(keys, getVersions(keys))]
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+
+def isNotModified(etag):
+    # Output: True if the request's If-None-Match has the entered ETag.
+    return etag is not None and request.if_none_match.contains(etag)
+
+
+def notModified(etag):
+    # Output: Empty 304 response for the ETag.
+    return withEtag(Response(status=304), etag)
+
+
+def withEtag(response, etag):
+    # Adds the ETag to the response.  Browsers are told to check it on every
+    # request rather than reuse the page without asking.
+    response = make_response(response)
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -1,56 +1,83 @@
-from flask import Blueprint, render_template, render_template_string, request, flash, jsonify, redirect, url_for
+from flask import Blueprint, render_template, request, flash, jsonify, redirect, url_for, current_app, \
+                  Response, stream_with_context
 from flask_login import login_required, current_user
-from .models import Note, Picks, Matchup, User, Pool, Link, Lock
+from .models import Note, Picks, Matchup, User, Pool, Lock, currentSeason
 from . import db
+from . import bracket
+from . import picks
+from . import scoring
+from . import standings
+from . import simulation
+from . import elimination
+from . import queries
+from . import importer
+from . import pickqueue
+from . import events
+from . import metrics
+from . import archive
+from . import export
+from . import versions
+from . import pickcounts
+from . import locks
+from .users import invalidateUser, getUserCacheStats
 import json
 import random
 import string
-from datetime import date
 
 views = Blueprint('views', __name__)
 
 def getWinnersByUser(userId, poolId):
-    # Gets the entered user's winners from the Picks table for the given week
+    # Gets the entered user's winners from the Picks table for the current season
     # in the database linked to the entered poolId.
     # Output: List of winners.  Returns empty list if user hasn't made picks.
-    link_id = db.session.query(Link.id).filter(Link.user_id == userId,
-                                               Link.pool_id == poolId).first()[0]
-    picks_all = db.session.query(Picks).filter(Picks.link_id == link_id).all()
-    for each in picks_all:
-        if each.date.year == date.today().year:
-            return each.winners
+    user_picks = getPicksByUser(userId, poolId)
+    if user_picks is not None:
+        return picks.decodeWinners(user_picks.slots, user_picks.picked, bracket.getBracket())
     return []
 
 def getPicksByUser(userId, poolId):
     # Gets the Picks object from the database matching the user.id and pool.id
-    # Output: Picks object.  The Picks.winners will be used and updated.
-    link_id = db.session.query(Link.id).filter(Link.user_id == userId,
-                                               Link.pool_id == poolId).first()[0]
-    picks_all = db.session.query(Picks).filter(Picks.link_id == link_id).all()
-    for each in picks_all:
-        if each.date.year == date.today().year:
-            return each
-
-def getMatchupsByGameNumber(gameNumber):
-    # Gets the matchup from the database with the entered game number
-    # within the current year.
-    # Output: List of Matchups.  Should just have 1 Matchup.
-    matchups = []
-    matchups_all = db.session.query(Matchup).filter(Matchup.game == gameNumber).all()
-    for each in matchups_all:
-        if each.date.year == date.today().year:
-            matchups.append(each)
-    return matchups
+    # for the current season.
+    # Output: Picks object or None.  Picks.slots and Picks.picked will be used and updated.
+    user_picks = queries.getUserPicks(userId, poolId)
+    if user_picks is not None and picks.migratePicks(user_picks, bracket.getBracket()):
+        db.session.commit()
+    return user_picks
+
+def notInPool():
+    # Page shown when the current user opens a pool they are not in.
+    return render_template("access_denied.html", user=current_user, title='Access Denied',
+                           heading='Access Denied', message='You are not in this pool.')
+
+def adminRequired(title, heading):
+    # Page shown when a user without is_admin opens an admin page.
+    return render_template("access_denied.html", user=current_user, title=title,
+                           heading=heading, message='Access denied.  Admin access required.')
+
+def publishResults(oldSnapshot, newSnapshot, firstGame, count):
+    # Sends a results event to every pool with the games whose winner
+    # changed.  Games are [game number, winner name or None].
+    games = []
+    for gameNumber in range(firstGame, firstGame + count):
+        old = oldSnapshot.matchup(gameNumber)
+        new = newSnapshot.matchup(gameNumber)
+        old_winner = old.winner_id if old is not None else None
+        new_winner = new.winner_id if new is not None else None
+        if old_winner != new_winner:
+            games.append([gameNumber, new.winner if new is not None else None])
+    if len(games) > 0:
+        events.publish('results', {'season': newSnapshot.season, 'games': games})
 
 def getLocks():
-    # Gets all Locks in the database for the current year.
+    # Gets all Locks in the database for the current season.
     # Output: List of Locks.  Should have 3 Locks or fewer.
-    locks = []
-    locks_all = db.session.query(Lock).all()
-    for each in locks_all:
-        if each.date.year == date.today().year:
-            locks.append(each)
-    return locks
+    return bracket.getLocks()
+
+def getRuntimeMetrics():
+    # Output: The request and query metrics with the user cache's hits,
+    #         misses and size added as user_cache.
+    return dict(metrics.getMetrics(), user_cache=getUserCacheStats())
+
 
 @views.route('/', methods=['GET', 'POST'])
 @login_required
@@ -66,13 +93,7 @@ def home():
             db.session.commit()
             flash('Note added!', category='success')
     
-    html_string = '{% extends "base.html" %} {% block title %}' \
-        'Home{% endblock %} {% block content%}' \
-        '<h1 align="center">OsterHoops</h1>'
-    html_string += str(current_user.is_admin)
-    html_string += '{% endblock %}'
-
-    return render_template_string(html_string, user=current_user)
+    return render_template("home.html", user=current_user)
 
 
 @views.route('/create-pool', methods=['GET', 'POST'])
@@ -87,7 +108,8 @@ def create_pool():
             # Creates a 12 character alphanumeric code uniqe to the pool.
             characters = string.ascii_uppercase + string.digits
             password1 = ''.join(random.choice(characters) for i in range(12))
-            # TODO: Confirm that a pool doesn't already have this password.
+            while db.session.query(Pool.id).filter(Pool.password == password1).first() is not None:
+                password1 = ''.join(random.choice(characters) for i in range(12))
             
             # Create the pool and add it to the database.
             new_pool = Pool(pool_name=pool_name, password=password1)
@@ -97,10 +119,7 @@ def create_pool():
                   + '.  Anyone with this code can join your pool.', category='success')
             
             # Add the user that created the pool to it.
-            pool_id = db.session.query(Pool.id).filter(Pool.password == password1).first()[0]
-            new_link = Link(user_id=current_user.id, pool_id=pool_id)
-            db.session.add(new_link)
-            db.session.commit()
+            queries.joinPool(current_user.id, new_pool.id)
             
             return redirect(url_for('views.home'))
 
@@ -116,12 +135,15 @@ def join_pool():
         if len(pool_password) != 12:
             flash('Pool password should be 12 characters. (Enter password without spaces or dashes between numbers and letters)', category='error')
         else:
-            pool_id = db.session.query(Pool.id).filter(Pool.password == pool_password).first()[0]
-            new_link = Link(user_id=current_user.id, pool_id=pool_id)
-            db.session.add(new_link)
-            db.session.commit()
-            
-            return redirect(url_for('views.home'))
+            pool = db.session.query(Pool.id).filter(Pool.password == pool_password).first()
+            if pool is None:
+                flash('No pool has this password.', category='error')
+            else:
+                # Joining twice (a resubmitted form) leaves the user in the pool once.
+                link_id, created = queries.joinPool(current_user.id, pool[0])
+                if not created:
+                    flash('You are already in this pool.', category='success')
+                return redirect(url_for('views.home'))
 
     return render_template("join_pool.html", user=current_user)
 
@@ -129,26 +151,10 @@ def join_pool():
 @views.route('/pools', methods=['GET'])
 @login_required
 def pools():
-    if request.method == 'GET':
-        html_string = '{% extends "base.html" %} {% block title %}Pools' \
-            '{% endblock %} {% block content%} </br>' \
-            '<h1 align="center">Pools</h1></br>' \
-            '<ul class="list-group list-group-flush" id="pools">'
-        
-        # Get a list of pools from the database that the current user is linked to.
-        pool_ids = db.session.query(Link.pool_id).filter(Link.user_id == current_user.id)
-        for each in pool_ids:
-            pool = db.session.query(Pool).filter(Pool.id == each[0]).first()
-            pool_name = pool.pool_name
-            password = pool.password
-            password = password[0:4] + ' ' + password[4:8] + ' ' + password[8:12]
-            html_string += '<li class="list-group-item">' \
-                           '<a href="{{ url_for(\'views.view_pool\', id=' + str(each[0]) \
-                           + ') }}">' + pool_name + '</a> - ' + password + '</li>'
-        html_string += '</ul>' \
-                       '{% endblock %}'
-
-    return render_template_string(html_string, user=current_user)
+    # Get a list of pools from the database that the current user is linked to.
+    pools = queries.getUserPools(current_user.id)
+
+    return render_template("pools.html", user=current_user, pools=pools)
 
 
 @views.route('/view-pool', methods=['GET'])
@@ -156,76 +162,139 @@ def pools():
 def view_pool():
     if request.method == 'GET':
         
-        pool_id = request.args.get('id', None)
-        pool = db.session.query(Pool).filter(Pool.id == pool_id).first()
-        pool_name = pool.pool_name
+        pool_id = request.args.get('id', None, type=int)
         
-        # Get a list of pools from the database that the current user is linked to.
-        pool_ids = db.session.query(Link).filter(Link.user_id == current_user.id,
-                                                 Link.pool_id == pool_id)
+        # Nothing on the page changed since the user's browser last loaded it.
+        etag = None
+        if pool_id is not None:
+            etag = versions.pageEtag([versions.seasonKey(), versions.poolKey(pool_id)], current_user,
+                                     pickcounts.globalTag())
+            if versions.isNotModified(etag):
+                return versions.notModified(etag)
         
-        # Get a list of other users in this pool.
-        all_links = db.session.query(Link).filter(Link.pool_id == pool_id)
-        other_users = []
-        for each in all_links:
-            other_users.append(db.session.query(User.id, User.first_name).filter(User.id == each.user_id).first())
+        pool = db.session.query(Pool).filter(Pool.id == pool_id).first()
         
         # Current user is not in this pool.
-        if pool_ids.count() == 0:
-            html_string = '{% extends "base.html" %} {% block title %}Access Denied' \
-                          '{% endblock %} {% block content%} </br>' \
-                          '<h1 align="center">Access Denied</h1></br>' \
-                          '<p>You are not in this pool.</p>' \
-                          '{% endblock %}'
-            return render_template_string(html_string, user=current_user)
+        if not queries.isInPool(current_user.id, pool_id):
+            return notInPool()
         
-        # Current user is in this pool.
-        html_string = '{% extends "base.html" %} {% block title %}' + pool_name \
-            + '{% endblock %} {% block content%} </br>' \
-            '<h1 align="center">' + pool_name + '</h1></br>'
-        
-        week3 = getMatchupsByGameNumber(61)
-        week2 = getMatchupsByGameNumber(49)
-        if len(week3) > 0:
-            # Picks need to be made for week 3.
-            html_string += '<p><a href="{{ url_for(\'views.make_picks\', ' \
-                           'pool_id=' + str(pool_id) \
-                           + ', round_number=5) }}"> ' \
-                           'Make/update your picks for week 3 ' \
-                           '(Final 4 and Championship) </a></p>'
-        
-        elif len(week2) > 0:
-            # Picks need to be made for week 2.
-            html_string += '<p><a href="{{ url_for(\'views.make_picks\', ' \
-                           'pool_id=' + str(pool_id) \
-                           + ', round_number=3) }}"> ' \
-                           'Make/update your picks for week 2 ' \
-                           '(Sweet 16 and Elite 8) </a></p>'
+        # Get a page of other users in this pool.
+        after = request.args.get('after', None, type=int)
+        other_users, next_after = queries.getRoster(pool_id, after)
         
+        # Current user is in this pool.
+        # Picks need to be made for the latest week with matchups.
+        snapshot = bracket.getBracket()
+        if snapshot.matchup(61) is not None:
+            week = 3
+        elif snapshot.matchup(49) is not None:
+            week = 2
         else:
-            # Picks need to be made for week 1.
-            html_string += '<p><a href="{{ url_for(\'views.make_picks\', ' \
-                           'pool_id=' + str(pool_id) \
-                           + ', round_number=1) }}"> ' \
-                           'Make/update your picks for week 1 ' \
-                           '(Round of 64 and Round of 32) </a></p>'
+            week = 1
         
         winners = getWinnersByUser(current_user.id, pool_id)
-        if len(winners) > 0:
-            html_string += '<h4>Your currently submitted picks</h4><p>'
-            for i in range(len(winners)):
-                html_string += 'Game ' + str(i+1) + ' | ' + winners[i] + '</br>'
-            html_string += '</p>'
-        
-        if len(other_users) > 0:
-            html_string += '<h4>Users in this pool</h4><p>'
-            for each in other_users:
-                html_string += str(each) + '</br>'
-            html_string += '</p>'
-        
-        html_string += '{% endblock %}'
+        after_total = request.args.get('after_total', None, type=int)
+        after_link = request.args.get('after_link', None, type=int)
+        leaderboard_after = (after_total, after_link) if after_total is not None and after_link is not None else None
+        leaderboard, next_standing = standings.getStandings(pool_id, after=leaderboard_after)
+        still_alive = elimination.getStillAlive(pool_id)
+        # Other entrants' picks are only shown once their week is locked.
+        popularity = pickcounts.getPickPopularity(pool_id, weeks=None if current_user.is_admin
+                                                  else locks.lockedWeeks())
+
+    return versions.withEtag(render_template("view_pool.html", user=current_user, pool=pool, week=week,
+                                             winners=winners, other_users=other_users,
+                                             leaderboard=leaderboard, round_names=scoring.ROUND_NAMES,
+                                             still_alive=still_alive, next_after=next_after,
+                                             next_standing=next_standing, after=after,
+                                             leaderboard_after=leaderboard_after,
+                                             popularity=popularity), etag)
+
+
+@views.route('/pool-odds', methods=['GET'])
+@login_required
+def pool_odds():
+    pool_id = request.args.get('id', None)
+    pool = db.session.query(Pool).filter(Pool.id == pool_id).first()
+    
+    # Current user is not in this pool.
+    if not queries.isInPool(current_user.id, pool_id):
+        return notInPool()
+    
+    # Simulate the rest of the tournament.  Cached until results or picks change.
+    simulations = current_app.config.get('ODDS_SIMULATIONS', 10000)
+    top_n = current_app.config.get('ODDS_TOP_N', 3)
+    odds = simulation.getWinProbabilities(int(pool_id), simulations, top_n)
+    
+    return render_template("pool_odds.html", user=current_user, pool=pool, odds=odds,
+                           simulations=simulations, top_n=top_n)
+
 
-    return render_template_string(html_string, user=current_user)
+@views.route('/pool-history', methods=['GET'])
+@login_required
+def pool_history():
+    # Final standings of the pool's archived seasons, read from the archives.
+    pool_id = request.args.get('id', None, type=int)
+    if pool_id is None or not queries.isInPool(current_user.id, pool_id):
+        return notInPool()
+    pool = db.session.query(Pool).filter(Pool.id == pool_id).first()
+    seasons = archive.getPoolSeasons(pool_id)
+    season = request.args.get('season', seasons[0] if len(seasons) > 0 else None, type=int)
+    leaderboard = None
+    champion = None
+    if season in seasons:
+        leaderboard = archive.getArchivedStandings(pool_id, season)
+        champion = archive.getArchivedChampion(season)
+    return render_template("pool_history.html", user=current_user, pool=pool, seasons=seasons,
+                           season=season, leaderboard=leaderboard, champion=champion,
+                           round_names=scoring.ROUND_NAMES)
+
+
+@views.route('/pool-export', methods=['GET'])
+@login_required
+def pool_export():
+    # Every entrant's picks as a CSV (or ?format=ndjson) download.  Members
+    # get the picks of locked weeks, admins get every pick.
+    pool_id = request.args.get('id', None, type=int)
+    if pool_id is None or not (current_user.is_admin or queries.isInPool(current_user.id, pool_id)):
+        return notInPool()
+    format = request.args.get('format', 'csv')
+    if format not in export.FORMATS:
+        format = 'csv'
+    weeks = None if current_user.is_admin else locks.lockedWeeks()
+    return export.streamRows(export.PICK_COLUMNS, export.poolPickRows(pool_id, weeks=weeks),
+                             format, 'pool-' + str(pool_id) + '-picks')
+
+
+@views.route('/pool-events', methods=['GET'])
+@login_required
+def pool_events():
+    # Server-Sent Events stream of new results and standings for the pool.
+    pool_id = request.args.get('id', None, type=int)
+    if pool_id is None or not queries.isInPool(current_user.id, pool_id):
+        return notInPool()
+
+    # The stream can stay open for hours, don't hold a connection for it.
+    db.session.close()
+    after = request.headers.get('Last-Event-ID', None, type=int)
+    heartbeat = current_app.config.get('EVENTS_HEARTBEAT', 15)
+    return Response(stream_with_context(events.streamEvents(pool_id, after, heartbeat)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@views.route('/bracket', methods=['GET'])
+@login_required
+def edit_bracket():
+    # The whole bracket on one page.  static/index.js loads and saves the
+    # picks through the JSON API in api.py.
+    pool_id = request.args.get('pool_id', None)
+    if not queries.isInPool(current_user.id, pool_id):
+        return notInPool()
+    pool = db.session.query(Pool).filter(Pool.id == pool_id).first()
+    return render_template("bracket.html", user=current_user, pool=pool,
+                           round_names=scoring.ROUND_NAMES,
+                           round_first_games=scoring.ROUND_FIRST_GAMES)
 
 
 @views.route('/make-picks', methods=['GET', 'POST'])
@@ -235,31 +304,35 @@ def make_picks():
     pool_id = request.args.get('pool_id', None)
     round_number = int(request.args.get('round_number', None))
     
-    # Get a list of links from the database that link the current user to the pool.
-    links = db.session.query(Link).filter(Link.user_id == current_user.id,
-                                          Link.pool_id == pool_id)
+    # The user's picks and the bracket haven't changed since their browser
+    # last loaded the page.
+    etag = None
+    if request.method == 'GET' and pool_id is not None and pool_id.isdigit():
+        etag = versions.pageEtag([versions.seasonKey(), versions.memberKey(pool_id, current_user.id)],
+                                 current_user)
+        if versions.isNotModified(etag):
+            return versions.notModified(etag)
+    
+    # Get the link between the current user and the pool.
+    link_id = queries.getLinkId(current_user.id, pool_id)
     
     # Current user is not in this pool.
-    if links.count() == 0:
-        html_string = '{% extends "base.html" %} {% block title %}Access Denied' \
-                      '{% endblock %} {% block content%} </br>' \
-                      '<h1 align="center">Access Denied</h1></br>' \
-                      '<p>You are not in this pool.</p>' \
-                      '{% endblock %}'
-        return render_template_string(html_string, user=current_user)
+    if link_id is None:
+        return notInPool()
     
     # Current user is in this pool.
     if request.method == 'GET':
         pool = db.session.query(Pool).filter(Pool.id == pool_id).first()
-        pool_name = pool.pool_name
         round_names = ['Round of 64', 'Round of 32',
                        'Sweet 16', 'Elite 8',
                        'Final 4', 'Championship']
-
-        html_string = '{% extends "base.html" %} {% block title %}' + pool_name \
-            + '{% endblock %} {% block content%} </br>' \
-            '<h1 align="center">' + pool_name + ' picks for ' \
-            + round_names[int(round_number)-1] + '</h1></br>'
+        games = [] # Number, teams and current pick of each game on the page.
+        
+        user_picks = getPicksByUser(current_user.id, pool_id)
+        
+        # Nothing picked yet.  The row is created when picks are first saved.
+        if user_picks is None:
+            user_picks = Picks(slots=0, picked=0)
         
         # The matchups will be taken from the database Matchup table for
         # the first round of each week.
@@ -277,42 +350,17 @@ def make_picks():
                 currentRoundFirstGame = 61
                 nextRoundFirstGame = 63
             
-            matchups = [] # List of all matchups in current round in current year.
+            # List of all matchups in current round in current season.
+            matchups = bracket.getBracket().matchups(currentRoundFirstGame, nextRoundNumber)
             
             for i in range(nextRoundNumber):
-                # Get games for the current round and current year and
-                # add them to matchups.
-                matchups.append(getMatchupsByGameNumber(i+currentRoundFirstGame)[0])
-            
-            winners = getWinnersByUser(current_user.id, pool_id) # List of the user's selected winners.
-            
-            if len(winners) == 0:
-                for i in range(63):
-                    winners.append('None')
-                user_picks = Picks(winners=winners, link_id=links.first().id)
-                db.session.add(user_picks)
-                db.session.commit()
-                print('Created new Picks matching Link.id: ' + links.first().id)
-            
-            html_string += '<form method="POST">'
-
-            for i in range(nextRoundNumber):
-                html_string += '<h4>Game ' + str(i+currentRoundFirstGame) + '</h4>'
-                
-                # Create radio buttons for each team in each matchup with winner checked.
-                if winners[i+currentRoundFirstGame-1] != matchups[i].team2:
-                    html_string += '<input type="radio" id="team' + str(2*i + 1) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team1" checked>' \
-                                   '<label for="team1">&nbsp ' + str(matchups[i].team1) + '</label><br>' \
-                                   '<input type="radio" id="team' + str(2*i + 2) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team2">' \
-                                   '<label for="team2">&nbsp ' + str(matchups[i].team2) + '</label><br><br>' 
+                # The winner is checked, team1 if no pick has been made.
+                if picks.getPick(user_picks, i+currentRoundFirstGame) == 1:
+                    pick = 'team2'
                 else:
-                    html_string += '<input type="radio" id="team' + str(2*i + 1) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team1">' \
-                                   '<label for="team1">&nbsp ' + str(matchups[i].team1) + '</label><br>' \
-                                   '<input type="radio" id="team' + str(2*i + 2) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team2" checked>' \
-                                   '<label for="team2">&nbsp ' + str(matchups[i].team2) + '</label><br><br>' 
-
-            html_string += '<button type="submit" class="btn btn-primary">Submit</button>' \
-                           '</form><br />'
+                    pick = 'team1'
+                games.append({'number': i+currentRoundFirstGame, 'team1': matchups[i].team1,
+                              'team2': matchups[i].team2, 'pick': pick})
         
         # The matchups will be taken from the database from the user's picks
         # for the second round of each week.
@@ -333,77 +381,87 @@ def make_picks():
                 currentRoundFirstGame = 63
                 nextRoundFirstGame = 64
             
-            winners = getWinnersByUser(current_user.id, pool_id) # List of the user's selected winners.
+            # List of the user's selected winners.
+            winners = picks.decodeWinners(user_picks.slots, user_picks.picked, bracket.getBracket())
             
-            html_string += '<form method="POST">'
-
             for i in range(nextRoundNumber):
-                html_string += '<h4>Game ' + str(i+currentRoundFirstGame) + '</h4>'
-                
                 team1 = winners[2*i + lastRoundFirstGame - 1]
                 team2 = winners[2*i + lastRoundFirstGame]
                 
-                # Create radio buttons for each team in each matchup with winner checked.
-                if winners[i+currentRoundFirstGame-1] != team2:
-                    html_string += '<input type="radio" id="team' + str(2*i + 1) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team1" checked>' \
-                                   '<label for="team1">&nbsp ' + team1 + '</label><br>' \
-                                   '<input type="radio" id="team' + str(2*i + 2) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team2">' \
-                                   '<label for="team2">&nbsp ' + team2 + '</label><br><br>' 
+                # The winner is checked, team1 if no pick has been made.
+                if picks.getPick(user_picks, i+currentRoundFirstGame) == 1:
+                    pick = 'team2'
                 else:
-                    html_string += '<input type="radio" id="team' + str(2*i + 1) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team1">' \
-                                   '<label for="team1">&nbsp ' + team1 + '</label><br>' \
-                                   '<input type="radio" id="team' + str(2*i + 2) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team2" checked>' \
-                                   '<label for="team2">&nbsp ' + team2 + '</label><br><br>' 
-
-            html_string += '<button type="submit" class="btn btn-primary">Submit</button>' \
-                           '</form><br />'
+                    pick = 'team1'
+                games.append({'number': i+currentRoundFirstGame, 'team1': team1,
+                              'team2': team2, 'pick': pick})
         
-        html_string += '{% endblock %}'
-        return render_template_string(html_string, user=current_user)
+        return versions.withEtag(render_template("make_picks.html", user=current_user, pool=pool,
+                                                 round_name=round_names[round_number-1], games=games),
+                                 etag)
     
     if request.method == 'POST':
         
-        user_picks = getPicksByUser(current_user.id, pool_id)
-        
         if round_number == 1:
             currentRoundGames = 32
             currentRoundFirstGame = 1
         elif round_number == 2:
             currentRoundGames = 16
             currentRoundFirstGame = 33
-            lastRoundFirstGame = 1
         elif round_number == 3:
             currentRoundGames = 8
             currentRoundFirstGame = 49
         elif round_number == 4:
             currentRoundGames = 4
             currentRoundFirstGame = 57
-            lastRoundFirstGame = 49
         elif round_number == 5:
             currentRoundGames = 2
             currentRoundFirstGame = 61
         elif round_number == 6:
             currentRoundGames = 1
             currentRoundFirstGame = 63
-            lastRoundFirstGame = 61
         else:
             currentRoundGames = 1
             currentRoundFirstGame = 64
             print("Error: Round should be 1-6!")
             
+        # Only the bits of the submitted games change.  The team in each slot
+        # comes from the bracket so no team names are looked up here.
+        mask = 0
+        slots = 0
         for i in range(currentRoundGames):
             winner = request.form.get('game' + str(i + currentRoundFirstGame)) # "team1" or "team2"
-            if winner == "team1" and round_number % 2 == 1:
-                user_picks.winners[i + currentRoundFirstGame - 1] = getMatchupsByGameNumber(i + currentRoundFirstGame)[0].team1
-            elif winner == "team2" and round_number % 2 == 1:
-                user_picks.winners[i + currentRoundFirstGame - 1] = getMatchupsByGameNumber(i + currentRoundFirstGame)[0].team2
-            elif winner == "team1" and round_number % 2 == 0:
-                user_picks.winners[i + currentRoundFirstGame - 1] = user_picks.winners[2*i + lastRoundFirstGame - 1]
+            bit = 1 << (i + currentRoundFirstGame - 1)
+            if winner == "team1":
+                mask |= bit
+            elif winner == "team2":
+                mask |= bit
+                slots |= bit
+        
+        # Games in locked weeks have to keep their saved pick.
+        try:
+            if pickqueue.isEnabled():
+                pickqueue.submitPicks(link_id, mask, slots, mask)
             else:
-                user_picks.winners[i + currentRoundFirstGame - 1] = user_picks.winners[2*i + lastRoundFirstGame]
-        
-        db.session.add(user_picks)
-        db.session.commit()
+                user_picks = getPicksByUser(current_user.id, pool_id)
+                old_slots, old_picked = (user_picks.slots, user_picks.picked) if user_picks is not None else (0, 0)
+                locks.checkChange(old_slots, old_picked, (old_slots & ~mask) | slots,
+                                  (old_picked & ~mask) | mask)
+                if user_picks is None:
+                    user_picks = queries.createPicks(link_id)
+                picks.applyUpdate(user_picks, mask, slots, mask)
+                db.session.add(user_picks)
+                pickcounts.recordChanges([(pool_id, old_slots, old_picked, user_picks.slots, user_picks.picked)])
+                db.session.commit()
+                standings.refreshStanding(user_picks.link_id)
+        except locks.WeekLocked as error:
+            db.session.rollback()
+            flash(str(error) + '  Your picks were not saved.', category='error')
+            return redirect(url_for('views.make_picks', pool_id=pool_id, round_number=str(round_number)))
+        except TimeoutError:
+            # The pick queue's writer is backed up.
+            flash('Saving your picks is taking too long.  Please check them and try again.', category='error')
+            return redirect(url_for('views.make_picks', pool_id=pool_id, round_number=str(round_number)))
         
         if round_number == 1 or round_number == 3 or round_number == 5:
             return redirect(url_for('views.make_picks', pool_id=pool_id, round_number=str(round_number + 1)))
@@ -430,6 +488,7 @@ def make_admin():
         user.is_admin = give_admin_access
         db.session.add(user)
         db.session.commit()
+        invalidateUser(user.id)
             
         return redirect(url_for('views.home'))
     
@@ -437,12 +496,7 @@ def make_admin():
     if True:
         return render_template("make_admin.html", user=current_user)
     else:
-        html_string = '{% extends "base.html" %} {% block title %}Pools' \
-            '{% endblock %} {% block content%} </br>' \
-            '<h1 align="center">Make Admin</h1></br>' \
-            'Access denied.  Admin access required.' \
-            '{% endblock %}'
-        return render_template_string(html_string, user=current_user)
+        return adminRequired('Pools', 'Make Admin')
 
 
 @views.route('/admin', methods=['GET'])
@@ -451,12 +505,26 @@ def admin():
     if current_user.is_admin:
         return render_template("admin.html", user=current_user)
     else:
-        html_string = '{% extends "base.html" %} {% block title %}Pools' \
-            '{% endblock %} {% block content%} </br>' \
-            '<h1 align="center">Admin</h1></br>' \
-            'Access denied.  Admin access required.' \
-            '{% endblock %}'
-        return render_template_string(html_string, user=current_user)
+        return adminRequired('Pools', 'Admin')
+
+
+@views.route('/admin/metrics', methods=['GET', 'POST'])
+@login_required
+def admin_metrics():
+    if not current_user.is_admin:
+        return adminRequired('Metrics', 'Metrics')
+    if request.method == 'POST':
+        metrics.resetMetrics()
+        return redirect(url_for('views.admin_metrics'))
+    return render_template("admin_metrics.html", user=current_user, metrics=getRuntimeMetrics())
+
+
+@views.route('/admin/metrics.json', methods=['GET'])
+@login_required
+def admin_metrics_json():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required.'}), 403
+    return jsonify(getRuntimeMetrics())
 
 
 @views.route('/admin/lock', methods=['GET', 'POST'])
@@ -495,19 +563,15 @@ def lock():
             update_locks[2].is_locked = False
         
         db.session.add_all(update_locks)
+        versions.bumpVersions([versions.seasonKey()])
         db.session.commit()
         
         return redirect('/admin/lock')
     
     if current_user.is_admin:
-        html_string = '{% extends "base.html" %} {% block title %}Lock/Unlock Rounds' \
-            '{% endblock %} {% block content%} </br>' \
-            '<h1 align="center">Lock/Unlock Rounds</h1></br>' \
-            '<form method="POST">'
-        
         if len(locks) == 0:
             # Create the 3 locks we will need and add them to the database.
-            print("Creating Locks for " + str(date.today().year))
+            print("Creating Locks for " + str(currentSeason()))
             for i in range(3):
                 locks.append(Lock(week=i+1))
             
@@ -517,213 +581,87 @@ def lock():
         else:
             print("Found " + str(len(locks)) + " locks.")
         
-        # Create the radio buttons for the 3 weeks (Locked or Unlocked for each week).
-        for i in range(3):
-            
-            html_string += '<h4>Week ' + str(locks[i].week) + '</h4>'
-            
-            if locks[i].is_locked:
-                html_string += '<input type="radio" id="week' + str(locks[i].week) + '" name="week' + str(i + 1) + '" value="true" checked>' \
-                               '<label for="true">&nbsp Locked</label><br>' \
-                               '<input type="radio" id="week' + str(locks[i].week) + '" name="week' + str(i + 1) + '" value="false">' \
-                               '<label for="false">&nbsp Unlocked</label><br><br>'
-            else:
-                html_string += '<input type="radio" id="week' + str(locks[i].week) + '" name="week' + str(i + 1) + '" value="true">' \
-                               '<label for="true">&nbsp Locked</label><br>' \
-                               '<input type="radio" id="week' + str(locks[i].week) + '" name="week' + str(i + 1) + '" value="false" checked>' \
-                               '<label for="false">&nbsp Unlocked</label><br><br>'
-                        
-        
-        html_string += '<button type="submit" class="btn btn-primary">Submit</button>' \
-                       '</form><br />' \
-                       '{% endblock %}'
+        # Radio buttons for the 3 weeks (Locked or Unlocked for each week).
+        return render_template("lock.html", user=current_user, locks=locks[0:3])
         
     else:
-        html_string = '{% extends "base.html" %} {% block title %}Enter Teams' \
-            '{% endblock %} {% block content%} </br>' \
-            '<h1 align="center">Enter Teams</h1></br>' \
-            'Access denied.  Admin access required.' \
-            '{% endblock %}'
-    
-    return render_template_string(html_string, user=current_user)
+        return adminRequired('Enter Teams', 'Enter Teams')
 
 
 @views.route('/admin/enter_teams', methods=['GET', 'POST'])
 @login_required
 def enter_teams():
     if request.method == 'POST':
-        # Get the teams entered from the form.
-        team_name1 = request.form.get('teamName1')
-        team_name2 = request.form.get('teamName2')
-        team_name3 = request.form.get('teamName3')
-        team_name4 = request.form.get('teamName4')
-        team_name5 = request.form.get('teamName5')
-        team_name6 = request.form.get('teamName6')
-        team_name7 = request.form.get('teamName7')
-        team_name8 = request.form.get('teamName8')
-        team_name9 = request.form.get('teamName9')
-        team_name10 = request.form.get('teamName10')
-        team_name11 = request.form.get('teamName11')
-        team_name12 = request.form.get('teamName12')
-        team_name13 = request.form.get('teamName13')
-        team_name14 = request.form.get('teamName14')
-        team_name15 = request.form.get('teamName15')
-        team_name16 = request.form.get('teamName16')
-        team_name17 = request.form.get('teamName17')
-        team_name18 = request.form.get('teamName18')
-        team_name19 = request.form.get('teamName19')
-        team_name20 = request.form.get('teamName20')
-        team_name21 = request.form.get('teamName21')
-        team_name22 = request.form.get('teamName22')
-        team_name23 = request.form.get('teamName23')
-        team_name24 = request.form.get('teamName24')
-        team_name25 = request.form.get('teamName25')
-        team_name26 = request.form.get('teamName26')
-        team_name27 = request.form.get('teamName27')
-        team_name28 = request.form.get('teamName28')
-        team_name29 = request.form.get('teamName29')
-        team_name30 = request.form.get('teamName30')
-        team_name31 = request.form.get('teamName31')
-        team_name32 = request.form.get('teamName32')
-        team_name33 = request.form.get('teamName33')
-        team_name34 = request.form.get('teamName34')
-        team_name35 = request.form.get('teamName35')
-        team_name36 = request.form.get('teamName36')
-        team_name37 = request.form.get('teamName37')
-        team_name38 = request.form.get('teamName38')
-        team_name39 = request.form.get('teamName39')
-        team_name40 = request.form.get('teamName40')
-        team_name41 = request.form.get('teamName41')
-        team_name42 = request.form.get('teamName42')
-        team_name43 = request.form.get('teamName43')
-        team_name44 = request.form.get('teamName44')
-        team_name45 = request.form.get('teamName45')
-        team_name46 = request.form.get('teamName46')
-        team_name47 = request.form.get('teamName47')
-        team_name48 = request.form.get('teamName48')
-        team_name49 = request.form.get('teamName49')
-        team_name50 = request.form.get('teamName50')
-        team_name51 = request.form.get('teamName51')
-        team_name52 = request.form.get('teamName52')
-        team_name53 = request.form.get('teamName53')
-        team_name54 = request.form.get('teamName54')
-        team_name55 = request.form.get('teamName55')
-        team_name56 = request.form.get('teamName56')
-        team_name57 = request.form.get('teamName57')
-        team_name58 = request.form.get('teamName58')
-        team_name59 = request.form.get('teamName59')
-        team_name60 = request.form.get('teamName60')
-        team_name61 = request.form.get('teamName61')
-        team_name62 = request.form.get('teamName62')
-        team_name63 = request.form.get('teamName63')
-        team_name64 = request.form.get('teamName64')
-        
-        # Create Matchup objects to be added to the database.
-        new_matchup1 = Matchup(game=1, team1=team_name1, team2=team_name2)
-        new_matchup2 = Matchup(game=2, team1=team_name3, team2=team_name4)
-        new_matchup3 = Matchup(game=3, team1=team_name5, team2=team_name6)
-        new_matchup4 = Matchup(game=4, team1=team_name7, team2=team_name8)
-        new_matchup5 = Matchup(game=5, team1=team_name9, team2=team_name10)
-        new_matchup6 = Matchup(game=6, team1=team_name11, team2=team_name12)
-        new_matchup7 = Matchup(game=7, team1=team_name13, team2=team_name14)
-        new_matchup8 = Matchup(game=8, team1=team_name15, team2=team_name16)
-        new_matchup9 = Matchup(game=9, team1=team_name17, team2=team_name18)
-        new_matchup10 = Matchup(game=10, team1=team_name19, team2=team_name20)
-        new_matchup11 = Matchup(game=11, team1=team_name21, team2=team_name22)
-        new_matchup12 = Matchup(game=12, team1=team_name23, team2=team_name24)
-        new_matchup13 = Matchup(game=13, team1=team_name25, team2=team_name26)
-        new_matchup14 = Matchup(game=14, team1=team_name27, team2=team_name28)
-        new_matchup15 = Matchup(game=15, team1=team_name29, team2=team_name30)
-        new_matchup16 = Matchup(game=16, team1=team_name31, team2=team_name32)
-        new_matchup17 = Matchup(game=17, team1=team_name33, team2=team_name34)
-        new_matchup18 = Matchup(game=18, team1=team_name35, team2=team_name36)
-        new_matchup19 = Matchup(game=19, team1=team_name37, team2=team_name38)
-        new_matchup20 = Matchup(game=20, team1=team_name39, team2=team_name40)
-        new_matchup21 = Matchup(game=21, team1=team_name41, team2=team_name42)
-        new_matchup22 = Matchup(game=22, team1=team_name43, team2=team_name44)
-        new_matchup23 = Matchup(game=23, team1=team_name45, team2=team_name46)
-        new_matchup24 = Matchup(game=24, team1=team_name47, team2=team_name48)
-        new_matchup25 = Matchup(game=25, team1=team_name49, team2=team_name50)
-        new_matchup26 = Matchup(game=26, team1=team_name51, team2=team_name52)
-        new_matchup27 = Matchup(game=27, team1=team_name53, team2=team_name54)
-        new_matchup28 = Matchup(game=28, team1=team_name55, team2=team_name56)
-        new_matchup29 = Matchup(game=29, team1=team_name57, team2=team_name58)
-        new_matchup30 = Matchup(game=30, team1=team_name59, team2=team_name60)
-        new_matchup31 = Matchup(game=31, team1=team_name61, team2=team_name62)
-        new_matchup32 = Matchup(game=32, team1=team_name63, team2=team_name64)
-        
-        # Create list of all matchups entered.
-        new_matchups = [new_matchup1, new_matchup2, new_matchup3, new_matchup4,
-                        new_matchup5, new_matchup6, new_matchup7, new_matchup8,
-                        new_matchup9, new_matchup10, new_matchup11, new_matchup12,
-                        new_matchup13, new_matchup14, new_matchup15, new_matchup16,
-                        new_matchup17, new_matchup18, new_matchup19, new_matchup20,
-                        new_matchup21, new_matchup22, new_matchup23, new_matchup24,
-                        new_matchup25, new_matchup26, new_matchup27, new_matchup28,
-                        new_matchup29, new_matchup30, new_matchup31, new_matchup32]
-        
-        # List of updated matchups or new matchups to commit to database.
-        needed_matchups = []
-        
-        for new_matchup in new_matchups:
-            # Look for a machup in the database with the same year and game number.
-            matchups = db.session.query(Matchup).filter(Matchup.game == new_matchup.game).all()
-            matchup = None
-            if len(matchups) > 0:
-                if matchups[0].date.year == date.today().year:
-                    matchup = matchups[0]
-            
-            # If there is a matchup in the database, it needs to be updated.
-            if matchup != None:
-                if new_matchup.team1 != '':
-                    matchup.team1 = new_matchup.team1
-                if new_matchup.team2 != '':
-                    matchup.team2 = new_matchup.team2
-                needed_matchups.append(matchup)
-                #TODO: Look in all Picks for the replaced team name and updated them too.
-            # If there is not a matching matchup in the database, add a new one.
-            else:
-                needed_matchups.append(new_matchup)
-
-        db.session.add_all(needed_matchups)
-        db.session.commit()
+        # The field comes from an uploaded CSV or JSON file, or from the
+        # 64 team name boxes of the form.
+        upload = request.files.get('teamsFile')
+        if upload is not None and upload.filename != '':
+            teams, error = importer.parseUpload(upload)
+            if error is not None:
+                flash(error, category='error')
+                return redirect(url_for('views.enter_teams'))
+        else:
+            teams = [importer.teamEntry(request.form.get('teamName' + str(i + 1), ''))
+                     for i in range(importer.TEAMS)]
+        
+        changes = importer.importField(teams)
+        flash('Updated ' + str(len(changes)) + ' teams.', category='success')
             
         return redirect('/admin/test')
     
     if current_user.is_admin:
         return render_template("enter_teams.html", user=current_user)
     else:
-        html_string = '{% extends "base.html" %} {% block title %}Enter Teams' \
-            '{% endblock %} {% block content%} </br>' \
-            '<h1 align="center">Enter Teams</h1></br>' \
-            'Access denied.  Admin access required.' \
-            '{% endblock %}'
-        return render_template_string(html_string, user=current_user)
+        return adminRequired('Enter Teams', 'Enter Teams')
+
+
+@views.route('/admin/import-teams', methods=['POST'])
+@login_required
+def import_teams():
+    # Loads the 64 team field from a JSON or CSV request body (or a file
+    # uploaded as teamsFile) and returns the teams that changed.  Blank
+    # fields leave the stored values unchanged.
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required.'}), 403
+    
+    upload = request.files.get('teamsFile')
+    if upload is not None:
+        teams, error = importer.parseUpload(upload)
+    else:
+        teams, error = importer.parseField(request.get_data(as_text=True),
+                                           'json' if request.is_json else 'csv')
+    if error is not None:
+        return jsonify({'error': error}), 400
+    return jsonify({'changes': importer.importField(teams)})
 
 
 def rounds(currentRound, nextRoundNumber, \
            currentRoundFirstGame, nextRoundFirstGame, \
            currentRoundName, nextRoundName):
     
-    # List of all matchups in current round in current year.
-    # This will need to be used in a GET and POST request.
-    matchups = []
-    
-    for i in range(nextRoundNumber):
-        # Get games for the current round and current year and add them to matchups.
-        matchups.append(getMatchupsByGameNumber(i+currentRoundFirstGame)[0])
-    
     if request.method == 'POST':
+        # Bracket before this commit, used to update the standings.
+        old_snapshot = bracket.getBracket()
+        
+        # Load the current round and the next round with one query.
+        round_matchups = bracket.getMatchups(currentRoundFirstGame,
+                                             nextRoundNumber + int(nextRoundNumber/2))
+        
+        # List of all matchups in current round in current season.
+        matchups = []
+        for i in range(nextRoundNumber):
+            matchups.append(round_matchups[i+currentRoundFirstGame])
+        
         allGamesFinal = True
         for i in range(nextRoundNumber):
             winner = request.form.get('game' + str(i+currentRoundFirstGame))
             if winner == 'team1':
-                matchups[i].winner = matchups[i].team1
+                matchups[i].winner_id = matchups[i].team1_id
             elif winner == 'team2':
-                matchups[i].winner = matchups[i].team2
+                matchups[i].winner_id = matchups[i].team2_id
             else:
                 # Not all games are final yet.
-                matchups[i].winner = None
+                matchups[i].winner_id = None
                 allGamesFinal = False
         
         # Check if a winner is selected for all matchups and create
@@ -732,74 +670,46 @@ def rounds(currentRound, nextRoundNumber, \
             print("Creating matchups for " + nextRoundName + "...")
             for i in range(int(nextRoundNumber/2)):
                 # Check if each game already exists and update instead.
-                update_list = getMatchupsByGameNumber(nextRoundFirstGame+i)
-                if len(update_list) > 0:
-                    update_matchup = update_list[0]
-                    update_matchup.team1 = matchups[2*i].winner
-                    update_matchup.team2 = matchups[2*i+1].winner
-                    update_matchup.winner = None
+                update_matchup = round_matchups.get(nextRoundFirstGame+i)
+                if update_matchup is not None:
+                    update_matchup.team1_id = matchups[2*i].winner_id
+                    update_matchup.team2_id = matchups[2*i+1].winner_id
+                    update_matchup.winner_id = None
                     matchups.append(update_matchup)
                     print('Updated game ' + str(update_matchup.game) + ' - ' \
-                          + update_matchup.team1 + ' - ' + update_matchup.team2)
+                          + str(old_snapshot.teamName(update_matchup.team1_id)) + ' - ' \
+                          + str(old_snapshot.teamName(update_matchup.team2_id)))
                 else:
                     # This game does not exist in the database - create it.
                     new_matchup = Matchup(game=nextRoundFirstGame+i, \
-                                          team1=matchups[2*i].winner, \
-                                          team2=matchups[2*i+1].winner)
+                                          team1_id=matchups[2*i].winner_id, \
+                                          team2_id=matchups[2*i+1].winner_id)
                     matchups.append(new_matchup)
                     print('Added game ' + str(new_matchup.game) + ' - ' \
-                          + new_matchup.team1 + ' - ' + new_matchup.team2)
+                          + str(old_snapshot.teamName(new_matchup.team1_id)) + ' - ' \
+                          + str(old_snapshot.teamName(new_matchup.team2_id)))
         
         db.session.add_all(matchups)
+        versions.bumpVersions([versions.seasonKey()])
         db.session.commit()
+        bracket.invalidateBracket()
+        new_snapshot = bracket.getBracket()
+        publishResults(old_snapshot, new_snapshot, currentRoundFirstGame, nextRoundNumber)
+        standings.applyBracketChange(old_snapshot, new_snapshot)
+        pickcounts.applyBracketChange(old_snapshot, new_snapshot)
         
         return redirect('/admin/round' + str(currentRound))
         
     if current_user.is_admin:
-        html_string = '{% extends "base.html" %} {% block title %}Select Winners' \
-            '{% endblock %} {% block content%} </br>' \
-            '<h1 align="center">Select ' + currentRoundName + ' Winners</h1></br>' \
-            '<form method="POST">'
-
-        for i in range(nextRoundNumber):
-            html_string += '<h4>Game ' + str(i+currentRoundFirstGame) + '</h4>'
-            
-            # Create radio buttons for each team in each matchup with winner checked.
-            if matchups[i].winner == matchups[i].team1:
-                html_string += '<input type="radio" id="team' + str(2*i + 1) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team1" checked>' \
-                               '<label for="team1">&nbsp ' + str(matchups[i].team1) + '</label><br>' \
-                               '<input type="radio" id="team' + str(2*i + 2) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team2">' \
-                               '<label for="team2">&nbsp ' + str(matchups[i].team2) + '</label><br>' \
-                               '<input type="radio" id="none' + str(i+1) + '" name="game' + str(i+currentRoundFirstGame) + '" value="none">' \
-                               '<label for="none">&nbsp None</label><br><br>'
-            elif matchups[i].winner == matchups[i].team2:
-                html_string += '<input type="radio" id="team' + str(2*i + 1) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team1">' \
-                               '<label for="team1">&nbsp ' + str(matchups[i].team1) + '</label><br>' \
-                               '<input type="radio" id="team' + str(2*i + 2) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team2" checked>' \
-                               '<label for="team2">&nbsp ' + str(matchups[i].team2) + '</label><br>' \
-                               '<input type="radio" id="none' + str(i+1) + '" name="game' + str(i+currentRoundFirstGame) + '" value="none">' \
-                               '<label for="none">&nbsp None</label><br><br>'
-            else:
-                html_string += '<input type="radio" id="team' + str(2*i + 1) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team1">' \
-                               '<label for="team1">&nbsp ' + str(matchups[i].team1) + '</label><br>' \
-                               '<input type="radio" id="team' + str(2*i + 2) + '" name="game' + str(i+currentRoundFirstGame) + '" value="team2">' \
-                               '<label for="team2">&nbsp ' + str(matchups[i].team2) + '</label><br>' \
-                               '<input type="radio" id="none' + str(i+1) + '" name="game' + str(i+currentRoundFirstGame) + '" value="none" checked>' \
-                               '<label for="none">&nbsp None</label><br><br>'
-
-        html_string += '<button type="submit" class="btn btn-primary">Submit</button>' \
-                       '</form><br />' \
-                       '{% endblock %}'
-        return render_template_string(html_string, user=current_user)
+        # List of all matchups in current round in current season.
+        matchups = bracket.getBracket().matchups(currentRoundFirstGame, nextRoundNumber)
+        
+        return render_template("select_winners.html", user=current_user, matchups=matchups,
+                               first_game=currentRoundFirstGame, round_name=currentRoundName)
     
     # User is not admin and shouldn't have access to this page.
     else:
-        html_string = '{% extends "base.html" %} {% block title %}Select Winners' \
-            '{% endblock %} {% block content%} </br>' \
-            '<h1 align="center">Select Winners</h1></br>' \
-            'Access denied.  Admin access required.' \
-            '{% endblock %}'
-        return render_template_string(html_string, user=current_user)
+        return adminRequired('Select Winners', 'Select Winners')
 
 
 @views.route('/admin/round1', methods=['GET', 'POST'])
@@ -847,22 +757,30 @@ def round6():
 @views.route('/admin/test', methods=['GET'])
 @login_required
 def test():
-    if current_user.is_admin:
-        html_string = '{% extends "base.html" %} {% block title %}Test' \
-            '{% endblock %} {% block content%} </br>' \
-            '<h1 align="center">Test</h1></br>'
-        
-        matchups = db.session.query(Matchup)
-        for each in matchups:
-            html_string += str(each.game) + ' | ' \
-                           + str(each.date.year) + ' | '\
-                           + str(each.team1) + ' | ' \
-                           + str(each.team2) + ' | ' \
-                           + str(each.winner) + '</br>'
-        
-        html_string += '</br></br>{% endblock %}'
-        
-        return render_template_string(html_string, user=current_user)
+    # Matchup browser.  Pages are keyed by the (season, game) of the last row
+    # and streamed as they are read, ?format=csv or ndjson downloads every
+    # matching row.
+    if not current_user.is_admin:
+        return adminRequired('Data', 'Data')
+    season = request.args.get('season', None, type=int)
+    round_number = request.args.get('round', None, type=int)
+    game = request.args.get('game', None, type=int)
+    matchups = queries.matchupQuery(season, round_number, game)
+
+    format = request.args.get('format')
+    if format in export.FORMATS:
+        return export.streamRows(['season', 'game', 'team1', 'team2', 'winner'],
+                                 matchups.yield_per(export.CHUNK_ROWS), format, 'matchups')
+
+    after_season = request.args.get('after_season', None, type=int)
+    after_game = request.args.get('after_game', None, type=int)
+    after = (after_season, after_game) if after_season is not None and after_game is not None else None
+    page = queries.KeysetPage(matchups, [Matchup.season, Matchup.game], after)
+    seasons = [row[0] for row in db.session.query(Matchup.season).distinct().order_by(Matchup.season)]
+    filters = dict((key, value) for key, value in [('season', season), ('round', round_number),
+                                                   ('game', game)] if value is not None)
+    return export.streamTemplate("admin_test.html", user=current_user, page=page, seasons=seasons,
+                                 filters=filters, round_names=scoring.ROUND_NAMES)
 
 
 # @views.route('/delete-note', methods=['POST'])